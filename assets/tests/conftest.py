@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The add-on package is imported as "vpcloader", the bpy free modules work outside Blender
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vpcloader import ModelCache
+
+
+@pytest.fixture(autouse=True)
+def cacheRoot(tmp_path, monkeypatch):
+    # Every test gets its own cache folder
+    monkeypatch.setattr(ModelCache, "CACHE_ROOT", str(tmp_path / "cache"))
+    return ModelCache.CACHE_ROOT
@@ -0,0 +1,29 @@
+import json
+import os
+
+from vpcloader import CatalogUtils
+
+
+def writeCatalog(path, partModel, mtime):
+    catalog = {"products": [
+        {"id": "table", "template": {"parts": [{"ref": "top"}]}},
+        {"id": "top", "modelURI": partModel},
+    ]}
+    with open(path, 'w') as json_file:
+        json.dump(catalog, json_file)
+    os.utime(path, (mtime, mtime))
+
+
+def test_assembly_parts_follow_catalog_version(tmp_path):
+    path = str(tmp_path / "catalog.json")
+
+    writeCatalog(path, "https://example.com/top-v1.glb", 1000)
+    parts = CatalogUtils.resolveAssembly("table", CatalogUtils.loadCatalog(path))
+    assert [uri for _, uri, _ in parts] == ["https://example.com/top-v1.glb"]
+
+    writeCatalog(path, "https://example.com/top-v2.glb", 2000)
+    parts = CatalogUtils.resolveAssembly("table", CatalogUtils.loadCatalog(path))
+    assert [uri for _, uri, _ in parts] == ["https://example.com/top-v2.glb"]
+
+    # The first version's parts were dropped along with it
+    assert all(key[0][1] == 2000 for key in CatalogUtils.assemblyParts if key[0][0] == os.path.abspath(path))
@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+from vpcloader import GLBPreprocess
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scene", "models")
+# Long and flat, the bounds are far from a cube
+MODEL_PATH = os.path.join(MODELS_DIR, "c20pzu37els9.glb")
+
+
+def readPrimitives(path):
+    # (node matrix, [(positions, normals)]) of a normalized GLB
+    gltf, binChunk = GLBPreprocess.readGLB(path)
+    assert len(gltf["nodes"]) == 1
+    matrix = GLBPreprocess.getNodeMatrix(gltf["nodes"][0])
+
+    primitives = []
+    for primitive in gltf["meshes"][0]["primitives"]:
+        attributes = primitive["attributes"]
+        positions = GLBPreprocess.readAccessor(gltf, binChunk, attributes["POSITION"])
+        normals = GLBPreprocess.readAccessor(gltf, binChunk, attributes["NORMAL"]) if "NORMAL" in attributes else None
+        primitives.append((positions, normals))
+    return matrix, primitives
+
+
+def normalize(tmp_path, quantize):
+    path = str(tmp_path / ("quantized.glb" if quantize else "plain.glb"))
+    GLBPreprocess.normalizeGLB(MODEL_PATH, path, quantize=quantize)
+    return readPrimitives(path)
+
+
+def test_quantized_positions_round_trip(tmp_path):
+    plainMatrix, plain = normalize(tmp_path, False)
+    matrix, quantized = normalize(tmp_path, True)
+    assert np.allclose(plainMatrix, np.identity(4))
+
+    # Uniform scale, so the normals stay undistorted
+    scale = np.linalg.norm(matrix[:3, :3], axis=0)
+    assert np.allclose(scale, scale[0])
+
+    tolerance = scale[0] / 32767 * 1.01 + 1e-6
+    for (plainPositions, _), (positions, _) in zip(plain, quantized):
+        world = positions @ matrix[:3, :3].T + matrix[:3, 3]
+        assert np.abs(world - plainPositions).max() <= tolerance
+
+
+def test_normals_unit_length_after_node_transform(tmp_path):
+    _, plain = normalize(tmp_path, False)
+    matrix, quantized = normalize(tmp_path, True)
+
+    # Renderers move the normals through the node scale, for a uniform scale the
+    # direction and, after the per axis scale is taken out, the length are kept
+    normalMatrix = np.linalg.inv(matrix[:3, :3]).T * np.linalg.norm(matrix[:3, :3], axis=0)
+
+    checked = 0
+    for (_, plainNormals), (_, normals) in zip(plain, quantized):
+        if normals is None:
+            continue
+        transformed = normals @ normalMatrix.T
+        assert np.allclose(np.linalg.norm(transformed, axis=1), 1, atol=0.02)
+        assert np.min(np.sum(transformed * plainNormals, axis=1)) > 0.99
+        checked += 1
+    assert checked > 0
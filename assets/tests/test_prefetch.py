@@ -0,0 +1,18 @@
+from vpcloader import Prefetch
+
+
+def test_assembly_parts_are_prefetched():
+    catalog = {
+        "table": {"id": "table", "template": {"parts": [{"ref": "top"}, {"ref": "leg"}]}},
+        "top": {"id": "top", "modelURI": "https://example.com/top.glb"},
+        "leg": {"id": "leg", "modelURI": "https://example.com/leg.glb"},
+        "lamp": {"id": "lamp", "modelURI": "https://example.com/lamp.glb"},
+    }
+    vpcJSON = {"configuration": {"content": {"entities": [
+        {"id": "1", "ref": "table"},
+        {"id": "2", "ref": "lamp"},
+    ]}}}
+
+    assert Prefetch.collectUrls(vpcJSON, catalog) == {
+        "https://example.com/top.glb", "https://example.com/leg.glb", "https://example.com/lamp.glb",
+    }
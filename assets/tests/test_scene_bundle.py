@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import zipfile
+
+from vpcloader import ModelCache
+from vpcloader import SceneBundleExport
+
+ASSETS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_NAME = "bb2a38ftb616.glb"
+MODEL_PATH = os.path.join(ASSETS_DIR, "scene", "models", MODEL_NAME)
+
+
+def writeExplorerZip(path):
+    # Same layout as exportSceneAsZip in src/explorer/exportSceneZip.js: scene.json at
+    # the root, node.asset is the bare file name and the file goes into models/
+    sceneJSON = {
+        "version": 1,
+        "generator": "vpc-display-export",
+        "rootName": "Products",
+        "nodes": [{
+            "name": "Products", "type": "Group",
+            "transform": {"position": [0, 0, 0], "quaternion": [0, 0, 0, 1], "scale": [1, 1, 1]},
+            "userData": {},
+            "children": [{
+                "name": "product", "type": "Group",
+                "transform": {"position": [1, 0, 0], "quaternion": [0, 0, 0, 1], "scale": [1, 1, 1]},
+                "userData": {"entityId": "94", "catalogRef": "30326766"},
+                "children": [],
+                "asset": MODEL_NAME,
+                "assetOriginalUrl": "https://example.com/models/" + MODEL_NAME,
+            }],
+        }],
+    }
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr("scene.json", json.dumps(sceneJSON, indent=2))
+        zip_file.write(MODEL_PATH, "models/" + MODEL_NAME)
+
+
+def getAssets(nodes):
+    for node in nodes:
+        if node.get("asset"):
+            yield node["asset"]
+        yield from getAssets(node.get("children", []))
+
+
+def test_explorer_zip_assets_resolve(tmp_path):
+    zipPath = str(tmp_path / "vpc-scene-export.zip")
+    writeExplorerZip(zipPath)
+
+    bundleDir = SceneBundleExport.openBundle(zipPath)
+    sceneFile = SceneBundleExport.findSceneFile(bundleDir)
+    assert os.path.basename(sceneFile) == "scene.json"
+
+    with open(sceneFile) as json_file:
+        assets = list(getAssets(json.load(json_file)["nodes"]))
+    assert assets == [MODEL_NAME]
+
+    assetPath = SceneBundleExport.getAssetPath(os.path.dirname(sceneFile), assets[0])
+    assert assetPath == os.path.join(bundleDir, "models", MODEL_NAME)
+    with open(assetPath, 'rb') as extracted, open(MODEL_PATH, 'rb') as original:
+        assert extracted.read() == original.read()
+
+
+def test_saved_bundle_assets_resolve():
+    # scene_<code>.json bundles name their assets "models/<file>"
+    bundleDir = os.path.join(ASSETS_DIR, "scene")
+    sceneFile = SceneBundleExport.findSceneFile(bundleDir)
+    with open(sceneFile) as json_file:
+        assets = list(getAssets(json.load(json_file)["nodes"]))
+
+    assert len(assets) > 0
+    for asset in assets:
+        assert SceneBundleExport.getAssetPath(bundleDir, asset) == os.path.join(bundleDir, asset)
+
+
+def test_missing_asset(tmp_path):
+    assert SceneBundleExport.getAssetPath(str(tmp_path), "missing.glb") is None
+
+
+def test_failed_download_skips_only_that_model():
+    cachedUrl = "https://example.com/models/" + MODEL_NAME
+    shutil.copyfile(MODEL_PATH, ModelCache.getCachedModelPath(cachedUrl))
+    failingUrl = "https://example.invalid/missing.glb"
+
+    paths = SceneBundleExport.getLocalModels([cachedUrl, failingUrl])
+    assert paths == {cachedUrl: ModelCache.getCachedModelPath(cachedUrl)}
@@ -0,0 +1,65 @@
+import json
+import os
+import stat
+import sys
+
+from vpcloader import ThumbnailRenderer
+
+
+def writeCatalog(path, count):
+    products = [{"id": "product-%d" % i, "modelURI": "https://example.com/product-%d.glb" % i} for i in range(count)]
+    with open(path, 'w') as json_file:
+        json.dump({"products": products}, json_file)
+
+
+def writeBlender(path, idsLog, render):
+    # Stands in for Blender: logs the ids it got and, if render, writes their cached thumbnails
+    script = [
+        "#!" + sys.executable,
+        "import json, os, sys",
+        "sys.path.insert(0, %r)" % os.path.dirname(os.path.dirname(os.path.abspath(ThumbnailRenderer.__file__))),
+        "from vpcloader import CatalogUtils, ModelCache, ThumbnailRenderer",
+        "ModelCache.CACHE_ROOT = %r" % ThumbnailRenderer.ModelCache.CACHE_ROOT,
+        "args = sys.argv[sys.argv.index('--') + 1:]",
+        "ids = json.load(open(args[args.index('--ids') + 1]))",
+        "settings = json.loads(args[args.index('--settings') + 1])",
+        "catalog = CatalogUtils.loadCatalog(args[args.index('--catalog') + 1])",
+        "open(%r, 'a').write(json.dumps(ids) + '\\n')" % idsLog,
+        "if %r:" % render,
+        "    for productId in ids:",
+        "        open(ThumbnailRenderer.getCachedThumbnailPath(catalog[productId], settings), 'wb').close()",
+    ]
+    with open(path, 'w') as file:
+        file.write("\n".join(script) + "\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def runDriver(tmp_path, monkeypatch, render):
+    # The driver side, also where the bpy module is installed
+    monkeypatch.setattr(ThumbnailRenderer, "bpy", None)
+    catalogPath = str(tmp_path / "catalog.json")
+    writeCatalog(catalogPath, 7)
+    idsLog = str(tmp_path / "ids.log")
+    blenderPath = str(tmp_path / "blender")
+    writeBlender(blenderPath, idsLog, render)
+
+    result = ThumbnailRenderer.main(["--catalog", catalogPath, "--out", str(tmp_path / "thumbs"),
+                                     "--workers", "3", "--blender", blenderPath])
+    with open(idsLog) as log:
+        shards = [json.loads(line) for line in log]
+    return result, shards
+
+
+def test_shards_split_pending_ids_once(tmp_path, monkeypatch):
+    result, shards = runDriver(tmp_path, monkeypatch, render=True)
+    assert result == 0
+    assert len(shards) == 3
+    assert sorted(sum(shards, [])) == ["product-%d" % i for i in range(7)]
+    assert len(os.listdir(tmp_path / "thumbs")) == 7
+
+
+def test_missing_thumbnails_fail_the_driver(tmp_path, monkeypatch):
+    # The shards exit 0 without rendering anything
+    result, shards = runDriver(tmp_path, monkeypatch, render=False)
+    assert result == 1
+    assert os.listdir(tmp_path / "thumbs") == []
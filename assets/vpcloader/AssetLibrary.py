@@ -0,0 +1,252 @@
+import json
+import os
+import re
+
+import bpy
+from bpy_types import Operator
+from mathutils import Euler, Matrix, Vector
+
+from . import CatalogUtils
+from . import LoadSession
+from . import ModelCache
+from . import SceneBuildContext
+
+# Bump when the way products are baked changes, forces a rebuild of every entry
+LIBRARY_VERSION = 1
+MANIFEST_NAME = "library_manifest.json"
+
+# Meshes already pulled into this Blender session, keyed by (libraryDir, productId, link)
+loadedMeshes = {}
+
+
+def getLibraryDir(libraryPath=""):
+    if libraryPath:
+        os.makedirs(libraryPath, exist_ok=True)
+        return libraryPath
+    return ModelCache.getCacheDir("library")
+
+
+def loadManifest(libraryDir):
+    manifestPath = os.path.join(libraryDir, MANIFEST_NAME)
+    if not os.path.exists(manifestPath):
+        return {"version": LIBRARY_VERSION, "products": {}}
+
+    with open(manifestPath) as json_file:
+        manifest = json.load(json_file)
+
+    if manifest.get("version") != LIBRARY_VERSION:
+        return {"version": LIBRARY_VERSION, "products": {}}
+    return manifest
+
+
+def saveManifest(libraryDir, manifest):
+    manifestPath = os.path.join(libraryDir, MANIFEST_NAME)
+    tmpPath = manifestPath + ".part"
+    with open(tmpPath, 'w') as json_file:
+        json.dump(manifest, json_file, indent=2)
+    os.replace(tmpPath, manifestPath)
+
+
+def getMeshName(productId):
+    return "vpc-" + productId
+
+
+def getLibraryFileName(productId):
+    return re.sub(r'[^a-zA-Z0-9._-]+', '_', productId) + ".blend"
+
+
+def isEntryCurrent(entry, catalogProduct, libraryDir):
+    if entry is None:
+        return False
+    if entry["modelURI"] != CatalogUtils.get3DModelPath(catalogProduct):
+        return False
+    if entry["modelTransform"] != CatalogUtils.getModelTransformComponentData(catalogProduct):
+        return False
+    return os.path.exists(os.path.join(libraryDir, entry["file"]))
+
+
+def importJoinedModel(filepath):
+    # Imports a glTF file and joins all of its meshes into one object with
+    # identity transform. Returns the joined object or None.
+    if SceneBuildContext.isDeferred():
+        # Joined from the mesh arrays, without selection changes
+        return SceneBuildContext.importJoinedModel(filepath)
+
+    bpy.ops.object.select_all(action='DESELECT')
+    bpy.ops.import_scene.gltf(filepath=filepath)
+
+    imported = list(bpy.context.selected_objects)
+    loaded_meshes = [obj for obj in imported if obj.type == 'MESH']
+
+    bpy.ops.object.select_all(action='DESELECT')
+
+    if len(loaded_meshes) == 0:
+        for obj in imported:
+            bpy.data.objects.remove(obj)
+        return None
+
+    for obj in loaded_meshes:
+        obj.select_set(True)
+
+    bpy.context.view_layer.objects.active = loaded_meshes[0]
+    bpy.ops.object.join()
+
+    bpy.ops.object.parent_clear(type='CLEAR_KEEP_TRANSFORM')
+    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+
+    joined = bpy.context.object
+
+    # Removing the empties the importer created for the node hierarchy
+    for obj in imported:
+        if LoadSession.isAlive(obj) and obj != joined and obj.type != 'MESH':
+            bpy.data.objects.remove(obj)
+
+    bpy.ops.object.select_all(action='DESELECT')
+    return joined
+
+
+def getModelTransformMatrix(catalogProduct):
+    transformData = CatalogUtils.getModelTransformComponentData(catalogProduct)
+
+    location = Matrix.Translation(Vector(transformData["position"]))
+    rotation = Euler(transformData["rotation"], 'XYZ').to_matrix().to_4x4()
+    scale = Matrix.Diagonal(Vector(transformData["scale"])).to_4x4()
+    return location @ rotation @ scale
+
+
+def bakeModelTransform(obj, catalogProduct):
+    # Same result as setting the ModelTransformComponent on the object and
+    # applying it, but without touching the active object
+    matrix = getModelTransformMatrix(catalogProduct)
+    obj.data.transform(matrix)
+    if matrix.is_negative:
+        obj.data.flip_normals()
+    obj.data.update()
+
+
+def buildProduct(productId, catalogProduct, libraryDir):
+    modelPath = CatalogUtils.get3DModelPath(catalogProduct)
+    local_path = ModelCache.getLocalModelPath(modelPath)
+
+    materialsBefore = set(bpy.data.materials)
+    imagesBefore = set(bpy.data.images)
+
+    obj = importJoinedModel(local_path)
+    if obj is None:
+        print("No meshes found in model for product:", productId)
+        return None
+
+    bakeModelTransform(obj, catalogProduct)
+
+    mesh = obj.data
+    mesh.name = getMeshName(productId)
+    mesh["vpcloaderProduct"] = productId
+
+    fileName = getLibraryFileName(productId)
+    bpy.data.libraries.write(os.path.join(libraryDir, fileName), {mesh}, fake_user=True)
+
+    # The library file now owns the data, removing it from the current file
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(mesh)
+    for mat in set(bpy.data.materials) - materialsBefore:
+        if mat.users == 0:
+            bpy.data.materials.remove(mat)
+    for img in set(bpy.data.images) - imagesBefore:
+        if img.users == 0:
+            bpy.data.images.remove(img)
+
+    return {
+        "modelURI": modelPath,
+        "modelTransform": CatalogUtils.getModelTransformComponentData(catalogProduct),
+        "file": fileName,
+        "mesh": getMeshName(productId),
+    }
+
+
+def buildLibrary(hashedCatalogProducts, productIds=None, libraryPath=""):
+    # Builds (or incrementally updates) the library for the given product ids,
+    # or for every catalog product with a 3D model when productIds is None
+    libraryDir = getLibraryDir(libraryPath)
+    manifest = loadManifest(libraryDir)
+
+    if productIds is None:
+        productIds = hashedCatalogProducts.keys()
+
+    built = 0
+    for productId in productIds:
+        if productId not in hashedCatalogProducts:
+            continue
+
+        catalogProduct = hashedCatalogProducts[productId]
+        if not CatalogUtils.has3DModel(catalogProduct):
+            continue
+
+        entry = manifest["products"].get(productId)
+        if isEntryCurrent(entry, catalogProduct, libraryDir):
+            continue
+
+        print("Building library entry for product:", productId)
+        try:
+            entry = buildProduct(productId, catalogProduct, libraryDir)
+        except Exception as e:
+            print("Failed to build library entry for product:", productId, e)
+            continue
+
+        if entry is None:
+            continue
+
+        manifest["products"][productId] = entry
+        # Dropping any mesh loaded from the outdated file
+        for key in [k for k in loadedMeshes if k[0] == libraryDir and k[1] == productId]:
+            del loadedMeshes[key]
+        built += 1
+
+        # Saving as we go so an interrupted build keeps what it has done
+        saveManifest(libraryDir, manifest)
+
+    return built
+
+
+def getProductMesh(productId, link=False, libraryPath=""):
+    libraryDir = getLibraryDir(libraryPath)
+
+    key = (libraryDir, productId, link)
+    if key in loadedMeshes:
+        mesh = loadedMeshes[key]
+        if LoadSession.isAlive(mesh):
+            return mesh
+        # Removed since it was loaded
+        del loadedMeshes[key]
+
+    entry = loadManifest(libraryDir)["products"].get(productId)
+    if entry is None:
+        return None
+
+    with bpy.data.libraries.load(os.path.join(libraryDir, entry["file"]), link=link) as (data_from, data_to):
+        data_to.meshes = [entry["mesh"]]
+
+    mesh = data_to.meshes[0]
+    if mesh is None:
+        return None
+
+    loadedMeshes[key] = mesh
+    return mesh
+
+
+class BuildAssetLibraryOperator(Operator):
+    "Import every catalog product once and store it in the .blend asset library"
+    bl_idname = "object.rex_build_asset_library_operator"
+    bl_label = "Build asset library"
+
+    def execute(self, context):
+        catalogPath = context.scene.rexTool.catalogPath
+        if not catalogPath:
+            self.report({'ERROR'}, "Catalog path is not set.")
+            return {'CANCELLED'}
+
+        hashedCatalogProducts = CatalogUtils.loadCatalog(catalogPath)
+
+        built = buildLibrary(hashedCatalogProducts, None, context.scene.rexTool.assetLibraryPath)
+
+        self.report({'INFO'}, f"Asset library updated, {built} products built")
+        return {'FINISHED'}
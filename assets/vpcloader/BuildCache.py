@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+
+import bpy
+
+from . import bl_info
+from . import LoadSession
+from . import ModelCache
+
+# Bump when the stored build layout changes
+BUILD_CACHE_VERSION = 2
+
+# Collections that make up a built configuration
+BUILD_COLLECTIONS = ("Products", "Room", "BooleanCollection", "Collision", "Placeholders", "Prototypes")
+
+# RexProperties that don't change what gets built: the inputs (hashed as content),
+# export and report paths, and how loads are cached and cleared. The region settings
+# go in as the resolved entity ids instead.
+NON_BUILD_OPTIONS = {
+    "vpcCode", "vpcFile", "catalogPath", "assetLibraryPath",
+    "collisionExportPath", "validationReportPath", "sceneBundlePath", "renderOutputPath", "renderOverridesPath",
+    "useBuildCache", "clearPreviousLoad",
+    "regionMode", "regionMin", "regionMax", "regionSurfaceId", "regionMargin",
+}
+
+
+def getReferencedCatalogProducts(vpcJSON, hashedCatalogProducts):
+    referenced = {}
+    for entity in vpcJSON["configuration"]["content"]["entities"]:
+        ref = entity.get("ref", "")
+        if ref in hashedCatalogProducts:
+            referenced[ref] = hashedCatalogProducts[ref]
+    return referenced
+
+
+def getBuildOptions(rexTool):
+    # Every RexProperties option that changes the build, new options are included by default
+    from .VPCLoaderPanel import RexProperties
+
+    options = {}
+    for name in sorted(RexProperties.__annotations__):
+        if name in NON_BUILD_OPTIONS:
+            continue
+        value = getattr(rexTool, name)
+        if not isinstance(value, (bool, int, float, str)):
+            # Vector properties
+            value = list(value)
+        options[name] = value
+    return options
+
+
+def getFingerprint(vpcJSON, hashedCatalogProducts, **options):
+    # Stable over key order, changes whenever anything that ends up in the build does.
+    # Options are the build settings, see getBuildOptions.
+    data = {
+        "content": vpcJSON["configuration"]["content"],
+        "catalog": getReferencedCatalogProducts(vpcJSON, hashedCatalogProducts),
+        "addonVersion": list(bl_info["version"]),
+        "cacheVersion": BUILD_CACHE_VERSION,
+    }
+    data.update(options)
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':')).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def getBuildPath(fingerprint):
+    return os.path.join(ModelCache.getCacheDir("builds"), fingerprint + ".blend")
+
+
+def hasBuild(fingerprint):
+    return os.path.exists(getBuildPath(fingerprint))
+
+
+def loadBuild(fingerprint):
+    # Links the cached build into the scene, returns False on a cache miss
+    path = getBuildPath(fingerprint)
+    if not os.path.exists(path):
+        return False
+
+    with bpy.data.libraries.load(path, link=True) as (data_from, data_to):
+        data_to.collections = [name for name in data_from.collections if name in BUILD_COLLECTIONS]
+
+    for collection in data_to.collections:
+        if collection is not None:
+            bpy.context.scene.collection.children.link(collection)
+
+    print("Build cache hit:", fingerprint)
+    return True
+
+
+def storeBuild(fingerprint, sid):
+    # Only objects the load session sid created are stored, not leftovers from earlier loads
+    # in the same collections. Those collections are written as filtered copies with the same
+    # name, the scene's own collection is renamed out of the way while writing.
+    stored = set()
+    temporary = []
+    renamed = []
+    try:
+        for name in BUILD_COLLECTIONS:
+            collection = bpy.data.collections.get(name)
+            if collection is None:
+                continue
+
+            objects = [obj for obj in collection.objects if obj.get(LoadSession.SESSION_KEY) == sid]
+            if len(objects) == 0:
+                continue
+            if len(objects) == len(collection.all_objects):
+                stored.add(collection)
+                continue
+
+            collection.name = name + "-previous"
+            renamed.append((collection, name))
+            copy = bpy.data.collections.new(name)
+            for obj in objects:
+                copy.objects.link(obj)
+            temporary.append(copy)
+            stored.add(copy)
+
+        if len(stored) == 0:
+            return None
+
+        # Objects, meshes and materials come along as dependencies of the collections
+        path = getBuildPath(fingerprint)
+        tmpPath = path + ".part.blend"
+        bpy.data.libraries.write(tmpPath, stored, fake_user=True)
+        os.replace(tmpPath, path)
+    finally:
+        bpy.data.batch_remove(temporary)
+        for collection, name in renamed:
+            collection.name = name
+
+    print("Build cached:", fingerprint)
+    return path
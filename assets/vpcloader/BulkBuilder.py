@@ -0,0 +1,106 @@
+import bpy
+from mathutils import Matrix, Quaternion, Vector
+
+# Creates helper objects (empties, cutter cubes, obstacle boxes) straight through
+# bpy.data, without operators, selection or active object changes.
+#
+# A spec is a dict:
+#   {"name": ..., "location": (x, y, z), "rotation": Quaternion, "scale": (x, y, z),
+#    "hide_viewport": bool, "hide_render": bool}
+
+UNIT_CUBE_NAME = "vpc-unit-cube"
+
+# Same color the door cutters always had
+DOOR_MATERIAL_NAME = "DoorMtrl"
+DOOR_MATERIAL_COLOR = (0.9, 0.9, 1.0, 1.0)
+
+
+def getUnitCubeMesh():
+    # One shared cube, size 1 centered on the origin like primitive_cube_add(size=1).
+    # Every box gets its size from the object matrix.
+    mesh = bpy.data.meshes.get(UNIT_CUBE_NAME)
+    if mesh is not None:
+        return mesh
+
+    verts = [
+        (-0.5, -0.5, -0.5), (-0.5, 0.5, -0.5), (0.5, 0.5, -0.5), (0.5, -0.5, -0.5),
+        (-0.5, -0.5, 0.5), (-0.5, 0.5, 0.5), (0.5, 0.5, 0.5), (0.5, -0.5, 0.5),
+    ]
+    faces = [
+        (0, 1, 2, 3), (4, 7, 6, 5), (0, 4, 5, 1),
+        (1, 5, 6, 2), (2, 6, 7, 3), (3, 7, 4, 0),
+    ]
+
+    mesh = bpy.data.meshes.new(UNIT_CUBE_NAME)
+    mesh.from_pydata(verts, [], faces)
+    mesh.update()
+    return mesh
+
+
+def getSharedMaterial(name, color):
+    mat = bpy.data.materials.get(name)
+    if mat is not None:
+        return mat
+
+    mat = bpy.data.materials.new(name=name)
+    mat.use_nodes = True
+
+    bsdf = mat.node_tree.nodes.get("Principled BSDF")
+    if bsdf:
+        bsdf.inputs["Base Color"].default_value = color
+    return mat
+
+
+def getDoorMaterial():
+    return getSharedMaterial(DOOR_MATERIAL_NAME, DOOR_MATERIAL_COLOR)
+
+
+def getCollection(collection_name):
+    if collection_name in bpy.data.collections:
+        return bpy.data.collections[collection_name]
+
+    collection = bpy.data.collections.new(collection_name)
+    bpy.context.scene.collection.children.link(collection)
+    return collection
+
+
+def getSpecMatrix(spec):
+    return Matrix.LocRotScale(
+        Vector(spec.get("location", (0, 0, 0))),
+        spec.get("rotation", Quaternion()),
+        Vector(spec.get("scale", (1, 1, 1))),
+    )
+
+
+def createObjects(specs, data, collection_name):
+    collection = getCollection(collection_name)
+
+    objects = []
+    for spec in specs:
+        obj = bpy.data.objects.new(spec["name"], data)
+        obj.matrix_world = getSpecMatrix(spec)
+        obj.hide_viewport = spec.get("hide_viewport", False)
+        obj.hide_render = spec.get("hide_render", False)
+        objects.append(obj)
+
+    for obj in objects:
+        collection.objects.link(obj)
+
+    return objects
+
+
+def createBoxes(specs, collection_name):
+    mesh = getUnitCubeMesh()
+
+    # The material lives on the shared mesh, so every box uses the same one
+    if len(mesh.materials) == 0:
+        mesh.materials.append(getDoorMaterial())
+
+    return createObjects(specs, mesh, collection_name)
+
+
+def createEmpties(specs, collection_name):
+    empties = createObjects(specs, None, collection_name)
+    for obj in empties:
+        obj.empty_display_type = 'PLAIN_AXES'
+    return empties
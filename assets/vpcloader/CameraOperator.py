@@ -1,6 +1,19 @@
+import argparse
+import json
+import os
+import sys
+import time
+
 import bpy
 from bpy_types import Operator
 
+from . import LoadSession
+
+# Cameras found by get_cameras and the scene signature they were collected at
+cameraList = []
+cameraListSignature = None
+
+
 class CameraOperator(Operator):
     bl_idname = "object.rex_camera_operator"
     bl_label = "Next camera"
@@ -15,16 +28,39 @@ class CameraOperator(Operator):
         
 
 
+def get_camera_signature():
+    # Changes when objects come or go or a camera datablock gets or loses an object,
+    # without walking every object
+    return (len(bpy.data.objects), tuple((cam.name, cam.users) for cam in bpy.data.cameras))
+
+
+def get_cameras():
+    # Sorted camera objects, only rescanned when the signature or a cached camera changed
+    global cameraList, cameraListSignature
+
+    # A cached camera may have been removed
+    valid = all(LoadSession.isAlive(cam) for cam in cameraList)
+    if valid:
+        names = [cam.name for cam in cameraList]
+        valid = (cameraListSignature == get_camera_signature() and names == sorted(names)
+                 and all(cam.type == 'CAMERA' for cam in cameraList))
+
+    if not valid:
+        cameraList = [obj for obj in bpy.data.objects if obj.type == 'CAMERA']
+
+        # Sort cameras to have a consistent order
+        cameraList.sort(key=lambda cam: cam.name)
+        cameraListSignature = get_camera_signature()
+
+    return cameraList
+
+
 def cycle_cameras():
-    # Get all camera objects
-    cameras = [obj for obj in bpy.data.objects if obj.type == 'CAMERA']
+    cameras = get_cameras()
     if not cameras:
         print("No cameras found.")
         return
 
-    # Sort cameras to have a consistent order
-    cameras.sort(key=lambda cam: cam.name)
-
     current_camera = bpy.context.scene.camera
     try:
         current_index = cameras.index(current_camera)
@@ -42,4 +78,143 @@ def cycle_cameras():
         if area.type == 'VIEW_3D':
             for space in area.spaces:
                 if space.type == 'VIEW_3D':
-                    space.region_3d.view_perspective = 'CAMERA'
\ No newline at end of file
+                    space.region_3d.view_perspective = 'CAMERA'
+
+
+# Per camera overrides, as custom properties on the camera object or in an overrides json
+# {"Camera.001": {"resolution_x": 1920, "resolution_y": 1080, "samples": 256}}
+OVERRIDE_KEYS = ("resolution_x", "resolution_y", "samples")
+OVERRIDE_PROPERTY_PREFIX = "vpcRender_"
+
+
+def get_samples(scene):
+    if scene.render.engine == 'CYCLES':
+        return scene.cycles.samples
+    return scene.eevee.taa_render_samples
+
+
+def set_samples(scene, samples):
+    if scene.render.engine == 'CYCLES':
+        scene.cycles.samples = samples
+    else:
+        scene.eevee.taa_render_samples = samples
+
+
+def get_render_settings(scene):
+    return {
+        "resolution_x": scene.render.resolution_x,
+        "resolution_y": scene.render.resolution_y,
+        "samples": get_samples(scene),
+    }
+
+
+def apply_render_settings(scene, settings):
+    scene.render.resolution_x = settings["resolution_x"]
+    scene.render.resolution_y = settings["resolution_y"]
+    set_samples(scene, settings["samples"])
+
+
+def get_camera_settings(camera, defaults, overrides):
+    settings = dict(defaults)
+    for key in OVERRIDE_KEYS:
+        if OVERRIDE_PROPERTY_PREFIX + key in camera:
+            settings[key] = int(camera[OVERRIDE_PROPERTY_PREFIX + key])
+    settings.update(overrides.get(camera.name, {}))
+    return settings
+
+
+def render_cameras(scene, output_dir, overrides=None, camera_names=None):
+    # Renders every camera once into output_dir/<camera>.<ext> and writes a timing manifest.
+    # Persistent data keeps the synced scene and BVH between the cameras.
+    overrides = overrides or {}
+    cameras = get_cameras()
+    if camera_names:
+        cameras = [cam for cam in cameras if cam.name in camera_names]
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    defaults = get_render_settings(scene)
+    previous_camera = scene.camera
+    previous_filepath = scene.render.filepath
+    previous_persistent = scene.render.use_persistent_data
+    scene.render.use_persistent_data = True
+
+    manifest = {"cameras": [], "engine": scene.render.engine}
+    start = time.perf_counter()
+    try:
+        for camera in cameras:
+            settings = get_camera_settings(camera, defaults, overrides)
+            apply_render_settings(scene, settings)
+
+            scene.camera = camera
+            filename = bpy.path.clean_name(camera.name)
+            scene.render.filepath = os.path.join(output_dir, filename)
+            # write_still adds the extension to the filepath as it is, frame_path would add a frame number
+            if scene.render.use_file_extension:
+                filename += scene.render.file_extension
+
+            t = time.perf_counter()
+            bpy.ops.render.render(write_still=True)
+            seconds = time.perf_counter() - t
+
+            print("Rendered camera", camera.name, "in %.1f s" % seconds)
+            manifest["cameras"].append({
+                "name": camera.name,
+                "file": filename,
+                "seconds": round(seconds, 3),
+                **settings,
+            })
+    finally:
+        apply_render_settings(scene, defaults)
+        scene.camera = previous_camera
+        scene.render.filepath = previous_filepath
+        scene.render.use_persistent_data = previous_persistent
+
+    manifest["totalSeconds"] = round(time.perf_counter() - start, 3)
+    with open(os.path.join(output_dir, "render_manifest.json"), 'w') as json_file:
+        json.dump(manifest, json_file, indent=2)
+
+    return manifest
+
+
+def load_overrides(path):
+    if not path:
+        return {}
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+class RenderQueueOperator(Operator):
+    "Render every camera in the scene with persistent render data and write a timing manifest"
+    bl_idname = "object.rex_render_queue_operator"
+    bl_label = "Render all cameras"
+
+    def execute(self, context):
+        output_dir = bpy.path.abspath(context.scene.rexTool.renderOutputPath)
+        if not output_dir:
+            self.report({'ERROR'}, "Render output path is not set.")
+            return {'CANCELLED'}
+
+        overrides = load_overrides(bpy.path.abspath(context.scene.rexTool.renderOverridesPath))
+        manifest = render_cameras(context.scene, output_dir, overrides)
+
+        self.report({'INFO'}, f"Rendered {len(manifest['cameras'])} cameras in {manifest['totalSeconds']} s")
+        return {'FINISHED'}
+
+
+def main(argv=None):
+    # blender -b scene.blend --python-expr "from vpcloader import CameraOperator; CameraOperator.main()" -- --out renders
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="Render every camera of the open scene")
+    parser.add_argument("--out", required=True, help="Output folder for the renders and render_manifest.json")
+    parser.add_argument("--overrides", default="", help="Per camera overrides json")
+    parser.add_argument("--cameras", default="", help="Comma separated camera names, all cameras if empty")
+    args = parser.parse_args(argv)
+
+    camera_names = [name for name in args.cameras.split(",") if name]
+    manifest = render_cameras(bpy.context.scene, os.path.abspath(args.out), load_overrides(args.overrides), camera_names)
+
+    print("Rendered", len(manifest["cameras"]), "cameras in", manifest["totalSeconds"], "s")
+    return 0
@@ -1,5 +1,42 @@
 
+import json
 import math
+import os
+
+# Hashed catalog products keyed by (path, modification time)
+loadedCatalogs = {}
+
+
+def loadCatalog(catalogPath):
+    # Catalog products by id, parsed once per file version
+    key = (os.path.abspath(catalogPath), os.path.getmtime(catalogPath))
+    if key in loadedCatalogs:
+        return loadedCatalogs[key]
+
+    with open(catalogPath) as json_file:
+        catalogJSON = json.load(json_file)
+
+    hashedCatalogProducts = {}
+    for product in catalogJSON["products"]:
+        hashedCatalogProducts[product["id"]] = product
+
+    # Dropping older versions of the same file, and what was memoized from them
+    for oldKey in [k for k in loadedCatalogs if k[0] == key[0]]:
+        del loadedCatalogs[oldKey]
+        for memoKey in [k for k in assemblyParts if k[0] == oldKey]:
+            del assemblyParts[memoKey]
+
+    loadedCatalogs[key] = hashedCatalogProducts
+    return hashedCatalogProducts
+
+
+def getCatalogKey(hashedCatalogProducts):
+    # The (path, modification time) the products were loaded from, for memos that
+    # must not outlive a catalog version. Catalogs not from loadCatalog go by identity.
+    for key, products in loadedCatalogs.items():
+        if products is hashedCatalogProducts:
+            return key
+    return id(hashedCatalogProducts)
 
 
 def isAssembly(catalogProduct):
@@ -60,4 +97,131 @@ def getModelTransformComponentData(catalogProduct):
                     transformData["scale"][2] = catalogProduct["template"]["modelTransform"]["s"]["y"]
                 if "z" in catalogProduct["template"]["modelTransform"]["s"] :
                     transformData["scale"][1] = catalogProduct["template"]["modelTransform"]["s"]["z"] 
-    return transformData
\ No newline at end of file
+    return transformData
+
+
+def getProductSize(catalogProduct):
+    # Bounding size in meters in Blender axes (x, y, z), or None if the catalog doesn't say.
+    # Sizes are in mm, three.js axes, under a few different names depending on the export.
+    template = catalogProduct.get("template", {})
+    for source in (template, catalogProduct):
+        for key in ("size", "dimensions", "boundingBox"):
+            if key not in source or not isinstance(source[key], dict):
+                continue
+            size = source[key]
+            x = size.get("x", size.get("X", size.get("width")))
+            y = size.get("y", size.get("Y", size.get("height")))
+            z = size.get("z", size.get("Z", size.get("depth")))
+            if x is None or y is None or z is None:
+                continue
+            return (x/1000, z/1000, y/1000)
+    return None
+
+
+# Flattened part lists keyed by (catalog key, assembly product id)
+assemblyParts = {}
+
+# Keys naming the part's catalog product. "id" is left out, it is usually the part's own instance id.
+PART_REF_KEYS = ("ref", "productId", "catalogRef")
+PART_TRANSFORM_KEYS = ("transform", "modelTransform", "t")
+
+
+def getPartEntries(catalogProduct):
+    template = catalogProduct.get("template", {})
+    parts = template.get("parts", [])
+    if isinstance(parts, dict):
+        parts = list(parts.values())
+    return parts
+
+
+def getPartRef(part):
+    if isinstance(part, str):
+        return part
+    for key in PART_REF_KEYS:
+        if part.get(key, "") != "":
+            return part[key]
+    print("Part without a recognised catalog ref:", part)
+    return ""
+
+
+def getPartTransformData(part):
+    # Same p/r/s layout as the template modelTransform
+    transform = {}
+    if isinstance(part, dict):
+        for key in PART_TRANSFORM_KEYS:
+            if isinstance(part.get(key), dict):
+                transform = part[key]
+                break
+    return getModelTransformComponentData({"template": {"modelTransform": transform}})
+
+
+def getTransformMatrix(transformData):
+    # Translation @ Euler XYZ @ Scale as a 4x4 row-major tuple, like AssetLibrary.getModelTransformMatrix
+    rx, ry, rz = transformData["rotation"]
+    cx, sx = math.cos(rx), math.sin(rx)
+    cy, sy = math.cos(ry), math.sin(ry)
+    cz, sz = math.cos(rz), math.sin(rz)
+    rotation = (
+        (cy*cz, sx*sy*cz - cx*sz, cx*sy*cz + sx*sz),
+        (cy*sz, sx*sy*sz + cx*cz, cx*sy*sz - sx*cz),
+        (-sy, sx*cy, cx*cy),
+    )
+    scale = transformData["scale"]
+    position = transformData["position"]
+    return tuple(
+        tuple(rotation[i][j] * scale[j] for j in range(3)) + (position[i],) for i in range(3)
+    ) + ((0.0, 0.0, 0.0, 1.0),)
+
+
+def multiplyMatrices(a, b):
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(4)) for j in range(4)) for i in range(4))
+
+
+def isAssemblyProduct(catalogProduct):
+    # isAssembly only looks at products with a modelPath, parts without a model count too
+    if len(getPartEntries(catalogProduct)) == 0:
+        return False
+    return isAssembly(catalogProduct) or not has3DModel(catalogProduct)
+
+
+IDENTITY_MATRIX = ((1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (0.0, 0.0, 0.0, 1.0))
+
+
+def resolveAssembly(productId, hashedCatalogProducts, _resolving=None):
+    # Flattens an assembly into [(part product id, model uri, 4x4 matrix)] relative to the
+    # assembly's origin, with the assembly level modelTransforms composed in. The matrix
+    # places the part model with its own modelTransform already baked in, like library meshes.
+    memoKey = (getCatalogKey(hashedCatalogProducts), productId)
+    if memoKey in assemblyParts:
+        return assemblyParts[memoKey]
+
+    resolving = _resolving or set()
+    if productId in resolving:
+        print("Assembly refers to itself:", productId)
+        return []
+
+    catalogProduct = hashedCatalogProducts.get(productId)
+    if catalogProduct is None:
+        print("Part not found in catalog:", productId)
+        return []
+
+    if not isAssemblyProduct(catalogProduct):
+        if not has3DModel(catalogProduct):
+            return []
+        return [(productId, get3DModelPath(catalogProduct), IDENTITY_MATRIX)]
+
+    modelMatrix = getTransformMatrix(getModelTransformComponentData(catalogProduct))
+
+    resolving.add(productId)
+    parts = []
+    for part in getPartEntries(catalogProduct):
+        partRef = getPartRef(part)
+        if partRef == "":
+            continue
+        placement = multiplyMatrices(modelMatrix, getTransformMatrix(getPartTransformData(part)))
+        for partId, uri, matrix in resolveAssembly(partRef, hashedCatalogProducts, resolving):
+            parts.append((partId, uri, multiplyMatrices(placement, matrix)))
+    resolving.discard(productId)
+
+    assemblyParts[memoKey] = parts
+    return parts
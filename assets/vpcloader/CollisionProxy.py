@@ -0,0 +1,304 @@
+import json
+
+import bmesh
+import bpy
+import numpy as np
+from mathutils import Matrix, Vector
+
+from . import BulkBuilder
+from . import InstancerBuilder
+from . import RoomTopology
+
+COLLECTION_NAME = "Collision"
+
+# Thickness of the wall, floor and ceiling slabs, same as the collision wall extrusion
+SLAB_THICKNESS = 0.1
+
+# How far from a wall plane an opening can be and still count as being in it
+OPENING_TOLERANCE = 0.3
+
+EPSILON = 1e-4
+
+
+def getOpenings(entities):
+    openings = []
+    for entity in entities:
+        if "c" not in entity or "kv-parametric-object" not in entity["c"]:
+            continue
+        size = entity["c"]["kv-parametric-object"]["size"]
+        openings.append({
+            "center": RoomTopology.getCornerPosition(entity),
+            "width": size["X"]/1000,
+            "height": size["Y"]/1000,
+        })
+    return openings
+
+
+def subtractIntervals(low, high, holes):
+    # Parts of [low, high] not covered by any of the hole intervals
+    result = []
+    current = low
+    for a, b in sorted(holes):
+        if a > current + EPSILON:
+            result.append((current, min(a, high)))
+        current = max(current, b)
+        if current >= high - EPSILON:
+            break
+    if current < high - EPSILON:
+        result.append((current, high))
+    return result
+
+
+def splitRect(u0, u1, v0, v1, holes):
+    # Splits the rectangle into boxes around the hole rectangles (column by column).
+    # Returns [(u0, u1, v0, v1)].
+    clipped = []
+    for a0, a1, b0, b1 in holes:
+        a0, a1 = max(a0, u0), min(a1, u1)
+        b0, b1 = max(b0, v0), min(b1, v1)
+        if a1 - a0 > EPSILON and b1 - b0 > EPSILON:
+            clipped.append((a0, a1, b0, b1))
+
+    if len(clipped) == 0:
+        return [(u0, u1, v0, v1)]
+
+    columns = sorted(set([u0, u1] + [h[0] for h in clipped] + [h[1] for h in clipped]))
+
+    rects = []
+    previous = None
+    for a, b in zip(columns, columns[1:]):
+        if b - a < EPSILON:
+            continue
+        covering = [(h[2], h[3]) for h in clipped if h[0] <= a + EPSILON and h[1] >= b - EPSILON]
+        spans = subtractIntervals(v0, v1, covering)
+
+        # Merging with the previous column when the spans are the same
+        if previous is not None and previous[1] == spans and abs(previous[0] - a) < EPSILON:
+            start = rects[-len(spans)][0] if spans else a
+            rects = rects[:len(rects) - len(spans)]
+            rects.extend((start, b, c, d) for c, d in spans)
+        else:
+            rects.extend((a, b, c, d) for c, d in spans)
+        previous = (b, spans)
+
+    return rects
+
+
+def getSurfaceSlabs(topology, surfaceIndex, openings):
+    # Oriented boxes for one surface, placed behind it so they don't eat into the room
+    surface = topology["surfaces"][surfaceIndex]
+    frame = RoomTopology.getSurfaceFrame(topology, surfaceIndex)
+    origin, u, v, normal = frame
+
+    coords = [RoomTopology.projectOnSurface(topology, surfaceIndex, p, frame)
+              for p in RoomTopology.getSurfacePoints(topology, surfaceIndex)]
+    u0, u1 = min(c[0] for c in coords), max(c[0] for c in coords)
+    v0, v1 = min(c[1] for c in coords), max(c[1] for c in coords)
+
+    holes = []
+    if surface["kind"] == "wall":
+        for opening in openings:
+            pu, pv, pd = RoomTopology.projectOnSurface(topology, surfaceIndex, opening["center"], frame)
+            if abs(pd) > OPENING_TOLERANCE:
+                continue
+            holes.append((pu - opening["width"]/2, pu + opening["width"]/2,
+                          pv - opening["height"]/2, pv + opening["height"]/2))
+
+    rotation = Matrix((u, v, normal)).transposed().to_quaternion()
+
+    slabs = []
+    for i, (a, b, c, d) in enumerate(splitRect(u0, u1, v0, v1, holes)):
+        center = (Vector(origin) + Vector(u) * ((a + b)/2) + Vector(v) * ((c + d)/2)
+                  - Vector(normal) * (SLAB_THICKNESS/2))
+        slabs.append({
+            "name": "collision-%s-%d" % (surface["id"], i),
+            "location": tuple(center),
+            "rotation": rotation,
+            "scale": (b - a, d - c, SLAB_THICKNESS),
+            "hide_render": True,
+            "kind": surface["kind"],
+            "entityId": surface["entityId"],
+        })
+    return slabs
+
+
+def getProductBox(name, obj, matrix, entityId):
+    # Oriented box in the product's own frame from the local bounds of its mesh
+    corners = [Vector(c) for c in obj.bound_box]
+    low = Vector((min(c.x for c in corners), min(c.y for c in corners), min(c.z for c in corners)))
+    high = Vector((max(c.x for c in corners), max(c.y for c in corners), max(c.z for c in corners)))
+
+    location, rotation, scale = matrix.decompose()
+    size = high - low
+    return {
+        "name": "collision-" + name,
+        "location": tuple(matrix @ ((low + high) / 2)),
+        "rotation": rotation,
+        "scale": (abs(size.x * scale.x), abs(size.y * scale.y), abs(size.z * scale.z)),
+        "hide_render": True,
+        "kind": "product",
+        "entityId": entityId,
+    }
+
+
+def createProductHull(name, obj, matrix, entityId, collection):
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3)
+    if len(co) < 4:
+        return None
+
+    matrix = np.array(matrix)
+    world = co @ matrix[:3, :3].T + matrix[:3, 3]
+
+    bm = bmesh.new()
+    for p in world:
+        bm.verts.new(p)
+    hull = bmesh.ops.convex_hull(bm, input=bm.verts)
+
+    # Dropping the interior points the hull didn't use
+    unused = [ele for ele in hull["geom_interior"] + hull["geom_unused"] if isinstance(ele, bmesh.types.BMVert)]
+    bmesh.ops.delete(bm, geom=unused, context='VERTS')
+
+    hullMesh = bpy.data.meshes.new("collision-" + name)
+    bm.to_mesh(hullMesh)
+    bm.free()
+
+    hullObj = bpy.data.objects.new("collision-" + name, hullMesh)
+    hullObj.display_type = 'WIRE'
+    hullObj.hide_render = True
+    hullObj["vpcProxyKind"] = "product"
+    hullObj["vpcEntityId"] = entityId
+    collection.objects.link(hullObj)
+    return hullObj
+
+
+def clearProxies():
+    collection = bpy.data.collections.get(COLLECTION_NAME)
+    if collection is None:
+        return
+    for obj in list(collection.objects):
+        bpy.data.objects.remove(obj)
+
+
+def build(json_response, useHulls=False, products_collection="Products"):
+    # Collision proxies for the room and the placed products in their own collection.
+    # Returns the created objects.
+    entities = json_response["configuration"]["content"]["entities"]
+
+    clearProxies()
+
+    topology = RoomTopology.buildTopology(entities)
+    openings = getOpenings(entities)
+
+    specs = []
+    for surfaceIndex in range(len(topology["surfaces"])):
+        specs.extend(getSurfaceSlabs(topology, surfaceIndex, openings))
+
+    products = InstancerBuilder.getProductPlacements(products_collection)
+
+    if not useHulls:
+        specs.extend(getProductBox(name, obj, matrix, entityId) for name, obj, matrix, entityId, ref in products)
+
+    objects = BulkBuilder.createBoxes(specs, COLLECTION_NAME)
+    for obj, spec in zip(objects, specs):
+        obj.display_type = 'WIRE'
+        obj["vpcProxyKind"] = spec["kind"]
+        obj["vpcEntityId"] = spec["entityId"]
+
+    if useHulls:
+        collection = BulkBuilder.getCollection(COLLECTION_NAME)
+        for name, obj, matrix, entityId, ref in products:
+            hullObj = createProductHull(name, obj, matrix, entityId, collection)
+            if hullObj is not None:
+                objects.append(hullObj)
+
+    print("Created", len(objects), "collision proxies")
+    return objects
+
+
+def toThreeVector(v):
+    # Blender Z-up to three.js Y-up
+    return [v[0], v[2], -v[1]]
+
+
+def toThreeQuaternion(q):
+    return [q.x, q.z, -q.y, q.w]
+
+
+def getProxyData():
+    collection = bpy.data.collections.get(COLLECTION_NAME)
+    data = {"version": 1, "units": "meters", "upAxis": "Y", "boxes": [], "hulls": []}
+    if collection is None:
+        return data
+
+    for obj in collection.objects:
+        if obj.type != 'MESH':
+            continue
+
+        if obj.data.name == BulkBuilder.UNIT_CUBE_NAME:
+            location, rotation, scale = obj.matrix_world.decompose()
+            data["boxes"].append({
+                "name": obj.name,
+                "kind": obj.get("vpcProxyKind", ""),
+                "entityId": obj.get("vpcEntityId", ""),
+                "center": toThreeVector(location),
+                "quaternion": toThreeQuaternion(rotation),
+                "halfExtents": [scale.x/2, scale.z/2, scale.y/2],
+            })
+        else:
+            vertices = []
+            for vert in obj.data.vertices:
+                vertices.extend(toThreeVector(obj.matrix_world @ vert.co))
+            indices = []
+            obj.data.calc_loop_triangles()
+            for tri in obj.data.loop_triangles:
+                indices.extend(tri.vertices)
+            data["hulls"].append({
+                "name": obj.name,
+                "kind": obj.get("vpcProxyKind", ""),
+                "entityId": obj.get("vpcEntityId", ""),
+                "vertices": [round(value, 5) for value in vertices],
+                "indices": indices,
+            })
+
+    return data
+
+
+def exportProxies(filepath):
+    # .glb exports the collection through the glTF exporter, anything else as json
+    if filepath.lower().endswith(".glb"):
+        view_layer = bpy.context.view_layer
+        previous = view_layer.active_layer_collection
+        view_layer.active_layer_collection = view_layer.layer_collection.children[COLLECTION_NAME]
+        try:
+            bpy.ops.export_scene.gltf(filepath=filepath, export_format='GLB', use_active_collection=True,
+                                      export_materials='NONE')
+        finally:
+            view_layer.active_layer_collection = previous
+        return
+
+    with open(filepath, 'w') as json_file:
+        json.dump(getProxyData(), json_file, separators=(',', ':'))
+
+
+class ExportCollisionProxiesOperator(bpy.types.Operator):
+    "Export the collision proxies as compact json, or as GLB when the path ends with .glb"
+    bl_idname = "object.rex_export_collision_proxies_operator"
+    bl_label = "Export collision proxies"
+
+    @classmethod
+    def poll(cls, context):
+        return bpy.data.collections.get(COLLECTION_NAME) is not None
+
+    def execute(self, context):
+        filepath = bpy.path.abspath(context.scene.rexTool.collisionExportPath)
+        if not filepath:
+            self.report({'ERROR'}, "Collision export path is not set.")
+            return {'CANCELLED'}
+
+        exportProxies(filepath)
+
+        self.report({'INFO'}, f"Exported collision proxies to {filepath}")
+        return {'FINISHED'}
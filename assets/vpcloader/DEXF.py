@@ -1,3 +1,5 @@
+import json
+import os
 import requests
 
 DEXF_API_KEY = "8eddfe53-9b0f-4d10-bc8f-f380c821664b"
@@ -9,8 +11,8 @@ def cacheProducts(products) :
     for prod in products :
         hashedData[prod["itemId"]] = prod
 
-def loadProduct(product):
-    response = requests.get(
+def loadProduct(product, session=None):
+    response = (session or requests).get(
     DEXF_PRODUCT_URL + "?filter.itemId=" + product + "&fields=assetV2",
     params={},
     headers={'DEXF-API-KEY': DEXF_API_KEY},
@@ -31,11 +33,22 @@ def loadVPCCode(code):
     json_response = response.json()
     return json_response
 
-def getProduct(productId) :
+def loadVPCFile(path):
+    with open(path) as json_file:
+        json_response = json.load(json_file)
+    return json_response
+
+def loadVPC(codeOrFile):
+    # Accepts either a VPC code or a path to a saved VPC json
+    if os.path.isfile(codeOrFile):
+        return loadVPCFile(codeOrFile)
+    return loadVPCCode(codeOrFile)
+
+def getProduct(productId, session=None) :
     if (productId in hashedData) :
         return hashedData[productId]
     
-    loadProduct(productId)
+    loadProduct(productId, session)
 
     if (productId in hashedData) :
         return hashedData[productId]
@@ -59,8 +72,8 @@ def getProductContent(productId) :
                 return productData["content"]
     return None
 
-def getAssetV2Content(productId, assetName, levelOfDetail="rt") :
-    productData = getProduct(productId)
+def getAssetV2Content(productId, assetName, levelOfDetail="rt", session=None) :
+    productData = getProduct(productId, session)
     if productData is not None :
         if "valid" in productData :
             if productData["valid"] == True :
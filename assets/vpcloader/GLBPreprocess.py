@@ -0,0 +1,649 @@
+# Standalone GLB preprocessing, uses only the standard library and NumPy so it
+# can run outside Blender and across a process pool.
+#
+# Every product GLB is flattened into a single node with one primitive per
+# material, with the catalog ModelTransformComponent baked into the vertices.
+#
+#   python -m vpcloader.GLBPreprocess catalog.json [--workers N]
+
+import argparse
+import json
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from . import CatalogUtils
+from . import ModelCache
+
+# Bump when the output format changes, invalidates the normalized cache
+PREPROCESS_VERSION = 1
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+COMPONENT_DTYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+
+# Divisors for normalized integer accessors
+NORMALIZED_DIVISORS = {
+    5120: 127.0,
+    5121: 255.0,
+    5122: 32767.0,
+    5123: 65535.0,
+}
+
+TYPE_SIZES = {
+    "SCALAR": 1,
+    "VEC2": 2,
+    "VEC3": 3,
+    "VEC4": 4,
+    "MAT2": 4,
+    "MAT3": 9,
+    "MAT4": 16,
+}
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# Compression extensions we can't decode without their native decoders
+UNSUPPORTED_EXTENSIONS = {"KHR_draco_mesh_compression", "EXT_meshopt_compression"}
+
+# Extensions that only make sense on the source geometry, dropped from the output
+GEOMETRY_EXTENSIONS = UNSUPPORTED_EXTENSIONS | {"KHR_mesh_quantization", "EXT_mesh_gpu_instancing", "KHR_materials_variants"}
+
+# glTF is Y-up, Blender Z-up. This is the axis conversion the Blender glTF importer does.
+GLTF_TO_BLENDER = np.array([
+    [1, 0, 0, 0],
+    [0, 0, -1, 0],
+    [0, 1, 0, 0],
+    [0, 0, 0, 1],
+], dtype=np.float64)
+
+
+class UnsupportedGLBError(Exception):
+    pass
+
+
+def readGLB(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    return parseGLB(data)
+
+
+def parseGLB(data):
+    view = memoryview(data)
+    if len(view) < 12:
+        raise UnsupportedGLBError("File too short to be a GLB")
+
+    magic, version, length = struct.unpack_from("<III", view, 0)
+    if magic != GLB_MAGIC:
+        raise UnsupportedGLBError("Not a GLB file")
+    if version != 2:
+        raise UnsupportedGLBError("Unsupported GLB version: " + str(version))
+
+    gltf = None
+    binChunk = memoryview(b"")
+
+    offset = 12
+    while offset + 8 <= length:
+        chunkLength, chunkType = struct.unpack_from("<II", view, offset)
+        chunk = view[offset + 8:offset + 8 + chunkLength]
+        if chunkType == CHUNK_JSON:
+            gltf = json.loads(bytes(chunk).decode("utf-8"))
+        elif chunkType == CHUNK_BIN and len(binChunk) == 0:
+            binChunk = chunk
+        offset += 8 + chunkLength
+
+    if gltf is None:
+        raise UnsupportedGLBError("GLB has no JSON chunk")
+
+    return gltf, binChunk
+
+
+def checkSupported(gltf):
+    for ext in gltf.get("extensionsUsed", []):
+        if ext in UNSUPPORTED_EXTENSIONS:
+            raise UnsupportedGLBError("Compressed geometry (" + ext + ")")
+
+    buffers = gltf.get("buffers", [])
+    if len(buffers) > 1 or (len(buffers) == 1 and "uri" in buffers[0]):
+        raise UnsupportedGLBError("External buffers are not supported")
+
+
+def readAccessor(gltf, binChunk, index, asFloat=True):
+    accessor = gltf["accessors"][index]
+    if "sparse" in accessor or "bufferView" not in accessor:
+        raise UnsupportedGLBError("Sparse or empty accessors are not supported")
+
+    componentType = accessor["componentType"]
+    dtype = np.dtype(COMPONENT_DTYPES[componentType])
+    components = TYPE_SIZES[accessor["type"]]
+    count = accessor["count"]
+
+    bufferView = gltf["bufferViews"][accessor["bufferView"]]
+    if bufferView.get("buffer", 0) != 0:
+        raise UnsupportedGLBError("External buffers are not supported")
+
+    start = bufferView.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    stride = bufferView.get("byteStride", 0) or dtype.itemsize * components
+
+    # Reading straight out of the binary chunk, interleaved data through strides
+    array = np.ndarray(shape=(count, components), dtype=dtype, buffer=binChunk,
+                       offset=start, strides=(stride, dtype.itemsize))
+
+    if not asFloat:
+        return array.astype(np.uint32)
+
+    array = array.astype(np.float64)
+    if accessor.get("normalized", False) and componentType in NORMALIZED_DIVISORS:
+        array = np.maximum(array / NORMALIZED_DIVISORS[componentType], -1.0)
+    return array
+
+
+def getNodeMatrix(node):
+    if "matrix" in node:
+        # glTF matrices are column-major
+        return np.array(node["matrix"], dtype=np.float64).reshape(4, 4).T
+
+    translation = node.get("translation", [0, 0, 0])
+    x, y, z, w = node.get("rotation", [0, 0, 0, 1])
+    scale = node.get("scale", [1, 1, 1])
+
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ], dtype=np.float64)
+
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation * np.array(scale, dtype=np.float64)
+    matrix[:3, 3] = translation
+    return matrix
+
+
+def getModelTransformMatrix(transformData):
+    # Same matrix as the Blender loader builds from getModelTransformComponentData
+    # (location @ euler XYZ @ scale), converted into glTF space
+    rx, ry, rz = transformData["rotation"]
+
+    cx, sx = np.cos(rx), np.sin(rx)
+    cy, sy = np.cos(ry), np.sin(ry)
+    cz, sz = np.cos(rz), np.sin(rz)
+
+    rotX = np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]])
+    rotY = np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+    rotZ = np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotZ @ rotY @ rotX @ np.diag(transformData["scale"])
+    matrix[:3, 3] = transformData["position"]
+
+    return np.linalg.inv(GLTF_TO_BLENDER) @ matrix @ GLTF_TO_BLENDER
+
+
+def iterateMeshNodes(gltf):
+    nodes = gltf.get("nodes", [])
+
+    if "scenes" in gltf and len(gltf["scenes"]) > 0:
+        roots = gltf["scenes"][gltf.get("scene", 0)].get("nodes", [])
+    else:
+        children = set()
+        for node in nodes:
+            children.update(node.get("children", []))
+        roots = [i for i in range(len(nodes)) if i not in children]
+
+    stack = [(index, np.identity(4)) for index in roots]
+    while stack:
+        index, parentMatrix = stack.pop()
+        node = nodes[index]
+        world = parentMatrix @ getNodeMatrix(node)
+        if "mesh" in node:
+            yield node["mesh"], world
+        for child in node.get("children", []):
+            stack.append((child, world))
+
+
+def flattenGLB(gltf, binChunk, matrix=None):
+    # Collects every triangle primitive in the scene, in the space given by
+    # matrix, grouped by material index (-1 for no material)
+    checkSupported(gltf)
+
+    if matrix is None:
+        matrix = np.identity(4)
+
+    groups = {}
+    for meshIndex, world in iterateMeshNodes(gltf):
+        world = matrix @ world
+        linear = world[:3, :3]
+        normalMatrix = np.linalg.inv(linear).T
+        flip = np.linalg.det(linear) < 0
+
+        for primitive in gltf["meshes"][meshIndex]["primitives"]:
+            if primitive.get("mode", 4) != 4:
+                # Points and lines are not part of what we render
+                continue
+            if "extensions" in primitive:
+                for ext in primitive["extensions"]:
+                    if ext in UNSUPPORTED_EXTENSIONS:
+                        raise UnsupportedGLBError("Compressed geometry (" + ext + ")")
+
+            attributes = primitive["attributes"]
+            if "POSITION" not in attributes:
+                continue
+
+            positions = readAccessor(gltf, binChunk, attributes["POSITION"])
+            positions = positions @ world[:3, :3].T + world[:3, 3]
+
+            part = {"POSITION": positions}
+
+            if "NORMAL" in attributes:
+                normals = readAccessor(gltf, binChunk, attributes["NORMAL"]) @ normalMatrix.T
+                lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+                lengths[lengths == 0] = 1
+                part["NORMAL"] = normals / lengths
+
+            for name in attributes:
+                if name.startswith("TEXCOORD_"):
+                    part[name] = readAccessor(gltf, binChunk, attributes[name])
+
+            if "indices" in primitive:
+                indices = readAccessor(gltf, binChunk, primitive["indices"], asFloat=False).reshape(-1)
+            else:
+                indices = np.arange(len(positions), dtype=np.uint32)
+
+            triangles = indices[:len(indices) - len(indices) % 3].reshape(-1, 3)
+            if flip:
+                # Mirroring transforms turn the faces inside out
+                triangles = triangles[:, ::-1]
+            part["indices"] = triangles.reshape(-1)
+
+            groups.setdefault(primitive.get("material", -1), []).append(part)
+
+    return groups
+
+
+def mergeParts(parts):
+    # NORMAL is only kept if every part has it, missing texture coordinates are zero filled
+    merged = {}
+    names = set()
+    for part in parts:
+        names.update(name for name in part if name.startswith("TEXCOORD_"))
+
+    merged["POSITION"] = np.concatenate([part["POSITION"] for part in parts])
+
+    if all("NORMAL" in part for part in parts):
+        merged["NORMAL"] = np.concatenate([part["NORMAL"] for part in parts])
+
+    for name in sorted(names):
+        merged[name] = np.concatenate([
+            part[name] if name in part else np.zeros((len(part["POSITION"]), 2))
+            for part in parts
+        ])
+
+    offset = 0
+    indices = []
+    for part in parts:
+        indices.append(part["indices"] + offset)
+        offset += len(part["POSITION"])
+    merged["indices"] = np.concatenate(indices).astype(np.uint32)
+
+    return merged
+
+
+class BinaryWriter:
+    def __init__(self):
+        self.data = bytearray()
+        self.bufferViews = []
+
+    def addView(self, data, target=None, stride=None):
+        while len(self.data) % 4 != 0:
+            self.data.append(0)
+
+        bufferView = {"buffer": 0, "byteOffset": len(self.data), "byteLength": len(data)}
+        if target is not None:
+            bufferView["target"] = target
+        if stride is not None:
+            bufferView["byteStride"] = stride
+
+        self.data.extend(data)
+        self.bufferViews.append(bufferView)
+        return len(self.bufferViews) - 1
+
+
+def collectTextureIndices(value, found):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("Texture") and isinstance(item, dict) and "index" in item:
+                found.add(item["index"])
+            collectTextureIndices(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            collectTextureIndices(item, found)
+
+
+def remapTextureIndices(value, textureMap):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key.endswith("Texture") and isinstance(item, dict) and "index" in item:
+                item["index"] = textureMap[item["index"]]
+            remapTextureIndices(item, textureMap)
+    elif isinstance(value, list):
+        for item in value:
+            remapTextureIndices(item, textureMap)
+
+
+def copyMaterials(gltf, binChunk, output, writer, materialIndices):
+    # Copies only the materials in use and the textures, images and samplers they reference
+    sourceMaterials = gltf.get("materials", [])
+    sourceTextures = gltf.get("textures", [])
+    sourceImages = gltf.get("images", [])
+    sourceSamplers = gltf.get("samplers", [])
+
+    materialMap = {}
+    materials = []
+    for index in materialIndices:
+        materialMap[index] = len(materials)
+        materials.append(json.loads(json.dumps(sourceMaterials[index])))
+
+    usedTextures = set()
+    collectTextureIndices(materials, usedTextures)
+
+    textureMap = {}
+    imageMap = {}
+    samplerMap = {}
+    textures = []
+    images = []
+    samplers = []
+
+    def mapImage(index):
+        if index not in imageMap:
+            image = dict(sourceImages[index])
+            if "bufferView" in image:
+                bufferView = gltf["bufferViews"][image["bufferView"]]
+                start = bufferView.get("byteOffset", 0)
+                image["bufferView"] = writer.addView(binChunk[start:start + bufferView["byteLength"]])
+            imageMap[index] = len(images)
+            images.append(image)
+        return imageMap[index]
+
+    for index in sorted(usedTextures):
+        texture = json.loads(json.dumps(sourceTextures[index]))
+        if "source" in texture:
+            texture["source"] = mapImage(texture["source"])
+        for ext in texture.get("extensions", {}).values():
+            if isinstance(ext, dict) and "source" in ext:
+                ext["source"] = mapImage(ext["source"])
+        if "sampler" in texture:
+            if texture["sampler"] not in samplerMap:
+                samplerMap[texture["sampler"]] = len(samplers)
+                samplers.append(sourceSamplers[texture["sampler"]])
+            texture["sampler"] = samplerMap[texture["sampler"]]
+        textureMap[index] = len(textures)
+        textures.append(texture)
+
+    remapTextureIndices(materials, textureMap)
+
+    if materials:
+        output["materials"] = materials
+    if textures:
+        output["textures"] = textures
+    if images:
+        output["images"] = images
+    if samplers:
+        output["samplers"] = samplers
+
+    return materialMap
+
+
+def addAccessor(output, writer, array, componentType, accessorType, target=None, normalized=False, bounds=False, stride=None):
+    bufferView = writer.addView(array.tobytes(), target, stride)
+    accessor = {
+        "bufferView": bufferView,
+        "componentType": componentType,
+        "count": int(array.shape[0]),
+        "type": accessorType,
+    }
+    if normalized:
+        accessor["normalized"] = True
+    if bounds:
+        components = TYPE_SIZES[accessorType]
+        values = array[:, :components]
+        if componentType == 5126:
+            accessor["min"] = [float(v) for v in values.min(axis=0)]
+            accessor["max"] = [float(v) for v in values.max(axis=0)]
+        else:
+            accessor["min"] = [int(v) for v in values.min(axis=0)]
+            accessor["max"] = [int(v) for v in values.max(axis=0)]
+
+    output["accessors"].append(accessor)
+    return len(output["accessors"]) - 1
+
+
+def quantizePositions(groups):
+    # Positions as normalized shorts, dequantized through the node translation and scale.
+    # The scale is the same on every axis, the normals are written unscaled and a
+    # non-uniform node scale would skew them.
+    allPositions = np.concatenate([merged["POSITION"] for merged in groups.values()])
+    low = allPositions.min(axis=0)
+    high = allPositions.max(axis=0)
+    center = (low + high) / 2
+    extent = float((high - low).max()) / 2 or 1.0
+    return center, np.full(3, extent)
+
+
+def writePrimitiveAttributes(output, writer, merged, quantize, center, extent):
+    attributes = {}
+
+    if quantize:
+        positions = np.zeros((len(merged["POSITION"]), 4), dtype=np.int16)
+        positions[:, :3] = np.round((merged["POSITION"] - center) / extent * 32767)
+        attributes["POSITION"] = addAccessor(output, writer, positions, 5122, "VEC3", ARRAY_BUFFER,
+                                             normalized=True, bounds=True, stride=8)
+    else:
+        attributes["POSITION"] = addAccessor(output, writer, merged["POSITION"].astype(np.float32), 5126, "VEC3",
+                                             ARRAY_BUFFER, bounds=True)
+
+    if "NORMAL" in merged:
+        if quantize:
+            normals = np.zeros((len(merged["NORMAL"]), 4), dtype=np.int8)
+            normals[:, :3] = np.round(np.clip(merged["NORMAL"], -1, 1) * 127)
+            attributes["NORMAL"] = addAccessor(output, writer, normals, 5120, "VEC3", ARRAY_BUFFER,
+                                               normalized=True, stride=4)
+        else:
+            attributes["NORMAL"] = addAccessor(output, writer, merged["NORMAL"].astype(np.float32), 5126, "VEC3",
+                                               ARRAY_BUFFER)
+
+    for name in sorted(n for n in merged if n.startswith("TEXCOORD_")):
+        uvs = merged[name]
+        if quantize and uvs.size > 0 and uvs.min() >= 0 and uvs.max() <= 1:
+            # Only coordinates inside 0..1 can be stored as normalized shorts
+            quantized = np.round(uvs * 65535).astype(np.uint16)
+            attributes[name] = addAccessor(output, writer, quantized, 5123, "VEC2", ARRAY_BUFFER, normalized=True)
+        else:
+            attributes[name] = addAccessor(output, writer, uvs.astype(np.float32), 5126, "VEC2", ARRAY_BUFFER)
+
+    vertexCount = len(merged["POSITION"])
+    indices = merged["indices"]
+    if vertexCount <= 65535:
+        indexAccessor = addAccessor(output, writer, indices.astype(np.uint16).reshape(-1, 1), 5123, "SCALAR",
+                                    ELEMENT_ARRAY_BUFFER)
+    else:
+        indexAccessor = addAccessor(output, writer, indices.astype(np.uint32).reshape(-1, 1), 5125, "SCALAR",
+                                    ELEMENT_ARRAY_BUFFER)
+
+    return attributes, indexAccessor
+
+
+def buildGLB(gltf, binChunk, groups, quantize=False, name="product"):
+    # Writes a single node, single mesh glTF from flattened groups.
+    # Unused nodes, accessors, materials and textures are left behind.
+    writer = BinaryWriter()
+    output = {
+        "asset": {"version": "2.0", "generator": "vpcloader GLBPreprocess"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"name": name, "mesh": 0}],
+        "meshes": [{"name": name, "primitives": []}],
+        "accessors": [],
+    }
+
+    materialMap = copyMaterials(gltf, binChunk, output, writer, sorted(m for m in groups if m >= 0))
+
+    merged = {}
+    for material, parts in groups.items():
+        merged[material] = mergeParts(parts)
+
+    center = np.zeros(3)
+    extent = np.ones(3)
+    if quantize and merged:
+        center, extent = quantizePositions(merged)
+        output["nodes"][0]["translation"] = [float(v) for v in center]
+        output["nodes"][0]["scale"] = [float(v) for v in extent]
+
+    for material in sorted(merged):
+        attributes, indexAccessor = writePrimitiveAttributes(output, writer, merged[material], quantize, center, extent)
+        primitive = {"attributes": attributes, "indices": indexAccessor, "mode": 4}
+        if material >= 0:
+            primitive["material"] = materialMap[material]
+        output["meshes"][0]["primitives"].append(primitive)
+
+    extensionsUsed = [ext for ext in gltf.get("extensionsUsed", []) if ext not in GEOMETRY_EXTENSIONS]
+    extensionsRequired = [ext for ext in gltf.get("extensionsRequired", []) if ext in extensionsUsed]
+    if quantize:
+        extensionsUsed.append("KHR_mesh_quantization")
+        extensionsRequired.append("KHR_mesh_quantization")
+    if extensionsUsed:
+        output["extensionsUsed"] = extensionsUsed
+    if extensionsRequired:
+        output["extensionsRequired"] = extensionsRequired
+
+    output["bufferViews"] = writer.bufferViews
+    output["buffers"] = [{"byteLength": len(writer.data)}]
+
+    return output, bytes(writer.data)
+
+
+def writeGLB(path, gltf, binData):
+    jsonData = json.dumps(gltf, separators=(',', ':')).encode("utf-8")
+    jsonData += b' ' * ((4 - len(jsonData) % 4) % 4)
+    binData = binData + b'\0' * ((4 - len(binData) % 4) % 4)
+
+    length = 12 + 8 + len(jsonData) + (8 + len(binData) if binData else 0)
+
+    tmpPath = path + ".part"
+    with open(tmpPath, 'wb') as file:
+        file.write(struct.pack("<III", GLB_MAGIC, 2, length))
+        file.write(struct.pack("<II", len(jsonData), CHUNK_JSON))
+        file.write(jsonData)
+        if binData:
+            file.write(struct.pack("<II", len(binData), CHUNK_BIN))
+            file.write(binData)
+    os.replace(tmpPath, path)
+
+
+def normalizeGLB(srcPath, dstPath, transformData=None, quantize=False):
+    gltf, binChunk = readGLB(srcPath)
+
+    matrix = None
+    if transformData is not None:
+        matrix = getModelTransformMatrix(transformData)
+
+    groups = flattenGLB(gltf, binChunk, matrix)
+    name = os.path.splitext(os.path.basename(srcPath))[0]
+    output, binData = buildGLB(gltf, binChunk, groups, quantize, name)
+    writeGLB(dstPath, output, binData)
+
+
+def getNormalizedModelPath(url, transformData):
+    key = ModelCache.hashKey(url, json.dumps(transformData, sort_keys=True), PREPROCESS_VERSION)
+    return os.path.join(ModelCache.getCacheDir("normalized"), key + ".glb")
+
+
+def preprocessModel(url, transformData):
+    # Runs in a worker process. Returns the normalized path, or None when the
+    # model has to go through the regular import path.
+    dstPath = getNormalizedModelPath(url, transformData)
+    if os.path.exists(dstPath):
+        return dstPath
+
+    srcPath = ModelCache.getLocalModelPath(url)
+    try:
+        normalizeGLB(srcPath, dstPath, transformData)
+    except UnsupportedGLBError as e:
+        print("Skipping preprocessing of", url, "-", e)
+        return None
+    return dstPath
+
+
+def preprocessCatalog(hashedCatalogProducts, productIds=None, workers=None):
+    # Returns {productId: normalizedPath or None}
+    if productIds is None:
+        productIds = hashedCatalogProducts.keys()
+
+    results = {}
+    jobs = {}
+    for productId in productIds:
+        if productId not in hashedCatalogProducts:
+            continue
+        catalogProduct = hashedCatalogProducts[productId]
+        if not CatalogUtils.has3DModel(catalogProduct):
+            continue
+
+        url = CatalogUtils.get3DModelPath(catalogProduct)
+        transformData = CatalogUtils.getModelTransformComponentData(catalogProduct)
+
+        dstPath = getNormalizedModelPath(url, transformData)
+        if os.path.exists(dstPath):
+            results[productId] = dstPath
+        else:
+            jobs[productId] = (url, transformData)
+
+    if len(jobs) == 0:
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(preprocessModel, url, transformData): productId
+                   for productId, (url, transformData) in jobs.items()}
+        for future in as_completed(futures):
+            productId = futures[future]
+            try:
+                results[productId] = future.result()
+            except Exception as e:
+                print("Failed to preprocess product:", productId, e)
+                results[productId] = None
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flatten and pre-transform catalog GLBs into the local cache")
+    parser.add_argument("catalog", help="Path to catalog.json")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    args = parser.parse_args(argv)
+
+    with open(args.catalog) as json_file:
+        catalogJSON = json.load(json_file)
+
+    hashedCatalogProducts = {}
+    for product in catalogJSON["products"]:
+        hashedCatalogProducts[product["id"]] = product
+
+    results = preprocessCatalog(hashedCatalogProducts, workers=args.workers)
+
+    done = len([r for r in results.values() if r is not None])
+    print("Preprocessed", done, "of", len(results), "products")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+import json
+import os
+
+import bpy
+import numpy as np
+
+from . import CatalogUtils
+from . import InstancerBuilder
+from . import LoadSession
+from . import ModelCache
+from . import RexUtils
+
+# Ratios are rounded to this step so close budgets share cached results
+RATIO_STEP = 0.05
+MIN_RATIO = 0.05
+
+# Bump when the cached mesh arrays change
+DECIMATED_CACHE_VERSION = 2
+
+# (model url, model transform, ratio) -> decimated mesh for this session
+decimatedMeshes = {}
+
+
+def getTriangleCount(mesh):
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    return int(np.sum(loopTotals - 2))
+
+
+def roundRatio(ratio):
+    ratio = round(ratio / RATIO_STEP) * RATIO_STEP
+    return round(min(1.0, max(MIN_RATIO, ratio)), 2)
+
+
+def getRatios(triangles, counts, maxProductTriangles=0, maxSceneTriangles=0):
+    # triangles: ref -> triangles of one instance, counts: ref -> number of instances.
+    # Returns ref -> decimation ratio (1.0 = untouched).
+    ratios = {}
+    for ref, tris in triangles.items():
+        ratio = 1.0
+        if maxProductTriangles > 0 and tris > maxProductTriangles:
+            ratio = maxProductTriangles / tris
+        ratios[ref] = ratio
+
+    if maxSceneTriangles > 0:
+        total = sum(triangles[ref] * ratios[ref] * counts[ref] for ref in triangles)
+        if total > maxSceneTriangles:
+            scale = maxSceneTriangles / total
+            for ref in ratios:
+                ratios[ref] *= scale
+
+    return {ref: roundRatio(ratio) for ref, ratio in ratios.items()}
+
+
+def getCachePath(url, transformData, ratio):
+    key = ModelCache.hashKey(url, json.dumps(transformData, sort_keys=True), ratio, DECIMATED_CACHE_VERSION)
+    return os.path.join(ModelCache.getCacheDir("decimated"), key + ".npz")
+
+
+def writeMeshArrays(mesh, path):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    loopVertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loopVertices)
+
+    materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", materialIndices)
+    smooth = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+
+    arrays = {
+        "co": co,
+        "loopTotals": loopTotals,
+        "loopVertices": loopVertices,
+        "materialIndices": materialIndices,
+        "smooth": smooth,
+    }
+    # Every UV layer in order, and the custom normals, so a cache hit shades like a fresh decimation
+    arrays["uvNames"] = np.array([layer.name for layer in mesh.uv_layers], dtype=str)
+    arrays["activeUV"] = np.array(mesh.uv_layers.active_index)
+    for i, layer in enumerate(mesh.uv_layers):
+        uv = np.empty(len(mesh.loops) * 2, dtype=np.float32)
+        layer.data.foreach_get("uv", uv)
+        arrays["uv%d" % i] = uv
+
+    if mesh.has_custom_normals:
+        arrays["normals"] = RexUtils.getCornerNormals(mesh)
+
+    # np.savez adds .npz to names without it, so the temp file keeps the extension
+    tmpPath = path[:-4] + ".part.npz"
+    np.savez(tmpPath, **arrays)
+    os.replace(tmpPath, path)
+
+
+def readMeshArrays(path, name, materials):
+    arrays = np.load(path)
+    loopTotals = arrays["loopTotals"]
+    loopStarts = np.concatenate(([0], np.cumsum(loopTotals)[:-1])).astype(np.int32)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(len(arrays["co"]) // 3)
+    mesh.vertices.foreach_set("co", arrays["co"])
+    mesh.loops.add(len(arrays["loopVertices"]))
+    mesh.loops.foreach_set("vertex_index", arrays["loopVertices"])
+    mesh.polygons.add(len(loopTotals))
+    mesh.polygons.foreach_set("loop_start", loopStarts)
+    mesh.polygons.foreach_set("loop_total", loopTotals)
+    mesh.polygons.foreach_set("material_index", arrays["materialIndices"])
+    mesh.polygons.foreach_set("use_smooth", arrays["smooth"])
+
+    for i, uvName in enumerate(arrays["uvNames"]):
+        mesh.uv_layers.new(name=str(uvName)).data.foreach_set("uv", arrays["uv%d" % i])
+    if len(mesh.uv_layers) > 0:
+        mesh.uv_layers.active_index = int(arrays["activeUV"])
+
+    for material in materials:
+        mesh.materials.append(material)
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    if "normals" in arrays:
+        RexUtils.setCustomNormals(mesh, arrays["normals"])
+    return mesh
+
+
+def decimateMesh(mesh, ratio):
+    # Evaluates a Decimate modifier on a temporary object, the same way opening meshes are made
+    temp = bpy.data.objects.new("decimate-temp", mesh)
+    bpy.context.scene.collection.objects.link(temp)
+    modifier = temp.modifiers.new(name="Decimate", type='DECIMATE')
+    modifier.ratio = ratio
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    decimated = bpy.data.meshes.new_from_object(temp.evaluated_get(depsgraph))
+
+    bpy.data.objects.remove(temp)
+    return decimated
+
+
+def getDecimatedMesh(mesh, url, transformData, ratio):
+    key = (url, json.dumps(transformData, sort_keys=True), ratio)
+    if key in decimatedMeshes:
+        cached = decimatedMeshes[key]
+        if LoadSession.isAlive(cached):
+            return cached
+        # Removed since it was cached
+        del decimatedMeshes[key]
+
+    name = "%s-decimated-%d" % (mesh.name, round(ratio * 100))
+    path = getCachePath(url, transformData, ratio)
+    if os.path.exists(path):
+        decimated = readMeshArrays(path, name, list(mesh.materials))
+    else:
+        decimated = decimateMesh(mesh, ratio)
+        decimated.name = name
+        writeMeshArrays(decimated, path)
+
+    decimatedMeshes[key] = decimated
+    return decimated
+
+
+def applyBudget(hashedCatalogProducts, maxProductTriangles=0, maxSceneTriangles=0, collection_name="Products"):
+    # Decimates over-budget products once per ref and shares the result between its instances.
+    # Returns ref -> {"instances", "before", "after", "ratio"} with per instance triangle counts.
+    report = {}
+    if maxProductTriangles <= 0 and maxSceneTriangles <= 0:
+        return report
+    if collection_name not in bpy.data.collections:
+        return report
+
+    # Objects holding the product mesh by ref, and how many entities they place
+    objectsByRef = {}
+    counts = {}
+    for obj in bpy.data.collections[collection_name].objects:
+        if obj.type != 'MESH' or obj.get("vpcRef") not in hashedCatalogProducts:
+            continue
+        ref = obj["vpcRef"]
+        if InstancerBuilder.isInstancer(obj):
+            # The prototype is budgeted once for every point, swapping its mesh swaps every instance
+            prototype = InstancerBuilder.getPrototypeObject(obj)
+            if prototype is None:
+                continue
+            objectsByRef.setdefault(ref, []).append(prototype)
+            counts[ref] = counts.get(ref, 0) + len(obj["vpcEntityIds"])
+        else:
+            objectsByRef.setdefault(ref, []).append(obj)
+            counts[ref] = counts.get(ref, 0) + 1
+
+    triangles = {ref: getTriangleCount(objs[0].data) for ref, objs in objectsByRef.items()}
+    ratios = getRatios(triangles, counts, maxProductTriangles, maxSceneTriangles)
+
+    for ref, objs in objectsByRef.items():
+        ratio = ratios[ref]
+        report[ref] = {"instances": counts[ref], "before": triangles[ref], "after": triangles[ref], "ratio": ratio}
+        if ratio >= 1.0:
+            continue
+
+        catalogProduct = hashedCatalogProducts[ref]
+        url = CatalogUtils.get3DModelPath(catalogProduct)
+        transformData = CatalogUtils.getModelTransformComponentData(catalogProduct)
+
+        decimated = getDecimatedMesh(objs[0].data, url, transformData, ratio)
+        for obj in objs:
+            obj.data = decimated
+
+        report[ref]["after"] = getTriangleCount(decimated)
+
+    return report
+
+
+def printReport(report):
+    before = sum(r["before"] * r["instances"] for r in report.values())
+    after = sum(r["after"] * r["instances"] for r in report.values())
+    for ref in sorted(report):
+        r = report[ref]
+        if r["ratio"] < 1.0:
+            print("Decimated %s x%d: %d -> %d triangles (ratio %.2f)" % (ref, r["instances"], r["before"], r["after"], r["ratio"]))
+    print("Scene triangles: %d -> %d" % (before, after))
+    return before, after
@@ -0,0 +1,180 @@
+import bpy
+import numpy as np
+from mathutils import Euler, Matrix, Vector
+
+from . import BulkBuilder
+
+# Instead of one object per placed product, every product ref gets one point
+# object: a vertex per entity with "rotation" (euler XYZ) and "entity_index"
+# attributes, and a Geometry Nodes modifier instancing the product mesh on the
+# points. obj["vpcEntityIds"][entity_index] is the entity id for picking.
+
+NODE_GROUP_NAME = "vpc-instancer"
+PROTOTYPE_COLLECTION = "Prototypes"
+
+
+def getInstancerNodeGroup():
+    node_group = bpy.data.node_groups.get(NODE_GROUP_NAME)
+    if node_group is not None:
+        return node_group
+
+    node_group = bpy.data.node_groups.new(NODE_GROUP_NAME, 'GeometryNodeTree')
+    node_group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+    node_group.interface.new_socket("Prototype", in_out='INPUT', socket_type='NodeSocketObject')
+    node_group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+
+    nodes = node_group.nodes
+    links = node_group.links
+
+    group_input = nodes.new('NodeGroupInput')
+    group_output = nodes.new('NodeGroupOutput')
+
+    object_info = nodes.new('GeometryNodeObjectInfo')
+    object_info.transform_space = 'ORIGINAL'
+
+    rotation = nodes.new('GeometryNodeInputNamedAttribute')
+    rotation.data_type = 'FLOAT_VECTOR'
+    rotation.inputs["Name"].default_value = "rotation"
+
+    instance = nodes.new('GeometryNodeInstanceOnPoints')
+
+    links.new(group_input.outputs["Prototype"], object_info.inputs["Object"])
+    links.new(group_input.outputs["Geometry"], instance.inputs["Points"])
+    links.new(object_info.outputs["Geometry"], instance.inputs["Instance"])
+    links.new(rotation.outputs["Attribute"], instance.inputs["Rotation"])
+    links.new(instance.outputs["Instances"], group_output.inputs["Geometry"])
+
+    group_input.location = (-400, 0)
+    object_info.location = (-200, -150)
+    rotation.location = (-200, -350)
+    group_output.location = (200, 0)
+    return node_group
+
+
+def getPrototypeSocket(node_group):
+    for item in node_group.interface.items_tree:
+        if item.item_type == 'SOCKET' and item.in_out == 'INPUT' and item.name == "Prototype":
+            return item.identifier
+    raise ValueError("Prototype input not found in " + node_group.name)
+
+
+def getPrototype(ref, mesh):
+    # Hidden object holding the product mesh, the instancer points at it
+    name = "prototype-" + ref
+    obj = bpy.data.objects.get(name)
+    if obj is None or obj.data != mesh:
+        obj = bpy.data.objects.new(name, mesh)
+        obj.hide_viewport = True
+        obj.hide_render = True
+        BulkBuilder.getCollection(PROTOTYPE_COLLECTION).objects.link(obj)
+    return obj
+
+
+def createPointsMesh(name, locations, rotations, entityCount):
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(entityCount)
+    mesh.vertices.foreach_set("co", np.asarray(locations, dtype=np.float32).ravel())
+
+    rotation = mesh.attributes.new("rotation", 'FLOAT_VECTOR', 'POINT')
+    rotation.data.foreach_set("vector", np.asarray(rotations, dtype=np.float32).ravel())
+
+    entity_index = mesh.attributes.new("entity_index", 'INT', 'POINT')
+    entity_index.data.foreach_set("value", np.arange(entityCount, dtype=np.int32))
+
+    mesh.update()
+    return mesh
+
+
+def createInstancer(ref, mesh, placements, collection_name="Products"):
+    # placements: [(entity id, location, rotation Quaternion)]
+    prototype = getPrototype(ref, mesh)
+    node_group = getInstancerNodeGroup()
+
+    locations = [tuple(location) for entityId, location, rotation in placements]
+    rotations = [tuple(rotation.to_euler('XYZ')) for entityId, location, rotation in placements]
+
+    points = createPointsMesh("points-" + ref, locations, rotations, len(placements))
+    obj = bpy.data.objects.new("instancer-" + ref, points)
+    obj["vpcRef"] = ref
+    obj["vpcEntityIds"] = [entityId for entityId, location, rotation in placements]
+
+    modifier = obj.modifiers.new(name="Instancer", type='NODES')
+    modifier.node_group = node_group
+    modifier[getPrototypeSocket(node_group)] = prototype
+
+    BulkBuilder.getCollection(collection_name).objects.link(obj)
+    return obj
+
+
+def build(placementsByRef, meshesByRef, collection_name="Products"):
+    # One instancer per ref, returns the created objects
+    objects = []
+    for ref in sorted(placementsByRef):
+        mesh = meshesByRef.get(ref)
+        if mesh is None:
+            continue
+        objects.append(createInstancer(ref, mesh, placementsByRef[ref], collection_name))
+
+    print("Created", len(objects), "instancers for", sum(len(p) for p in placementsByRef.values()), "entities")
+    return objects
+
+
+def getEntityId(obj, entityIndex):
+    # Picking helper, entity id of a point in an instancer object
+    return obj["vpcEntityIds"][entityIndex]
+
+
+def isInstancer(obj):
+    return "vpcEntityIds" in obj
+
+
+def getPrototypeObject(obj):
+    # The object whose mesh the instancer places, None if the modifier is gone
+    modifier = obj.modifiers.get("Instancer")
+    if modifier is None or modifier.node_group is None:
+        return None
+    return modifier[getPrototypeSocket(modifier.node_group)]
+
+
+def getInstanceMatrices(obj):
+    # [(entity id, world matrix)] of every instance, from the point attributes
+    mesh = obj.data
+    count = len(mesh.vertices)
+    co = np.empty(count * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+
+    rotations = np.zeros(count * 3, dtype=np.float32)
+    if "rotation" in mesh.attributes:
+        mesh.attributes["rotation"].data.foreach_get("vector", rotations)
+    entityIndices = np.arange(count, dtype=np.int32)
+    if "entity_index" in mesh.attributes:
+        mesh.attributes["entity_index"].data.foreach_get("value", entityIndices)
+
+    co = co.reshape(-1, 3)
+    rotations = rotations.reshape(-1, 3)
+    entityIds = obj["vpcEntityIds"]
+    return [(entityIds[entityIndices[i]],
+             obj.matrix_world @ Matrix.LocRotScale(Vector(co[i]), Euler(rotations[i], 'XYZ'), None))
+            for i in range(count)]
+
+
+
+def getProductPlacements(collection_name="Products"):
+    # (name, object with the product mesh, world matrix, entity id, ref) of every placed
+    # product mesh, one per point for instancers
+    placements = []
+    if collection_name not in bpy.data.collections:
+        return placements
+
+    for obj in bpy.data.collections[collection_name].objects:
+        if obj.type != 'MESH':
+            continue
+        if isInstancer(obj):
+            prototype = getPrototypeObject(obj)
+            if prototype is None:
+                continue
+            for i, (entityId, matrix) in enumerate(getInstanceMatrices(obj)):
+                placements.append(("%s-%d" % (obj.name, i), prototype, matrix, entityId, obj.get("vpcRef", "")))
+        else:
+            placements.append((obj.name, obj, obj.matrix_world.copy(), obj.get("vpcEntityId", ""), obj.get("vpcRef", "")))
+    return placements
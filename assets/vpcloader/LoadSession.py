@@ -0,0 +1,174 @@
+import os
+import uuid
+
+import bpy
+
+from . import AssetLibrary
+
+# Every datablock created during a load gets the load's session id in this property,
+# so the whole load can be removed again without touching anything else in the file.
+SESSION_KEY = "vpcloaderSession"
+
+TRACKED_DATA = (
+    "objects", "meshes", "materials", "images", "textures", "node_groups",
+    "collections", "cameras", "lights", "curves", "actions", "libraries",
+)
+
+
+def isAlive(id):
+    # False once the datablock was removed, e.g. by clearing a session. Memo caches
+    # holding datablocks check their entries with this before handing them out.
+    try:
+        id.name
+        return True
+    except ReferenceError:
+        return False
+
+
+def getTrackedIds():
+    for attr in TRACKED_DATA:
+        for id in getattr(bpy.data, attr):
+            yield id
+
+
+def snapshot():
+    return set(id.session_uid for id in getTrackedIds())
+
+
+def begin(sid=None):
+    # Returns the session id and what existed before the load. Passing the id of an
+    # earlier session adds to it, so clearing removes both.
+    if sid is None:
+        sid = uuid.uuid4().hex[:12]
+    return sid, snapshot()
+
+
+def isInDirectory(path, directory):
+    path = os.path.normcase(os.path.abspath(bpy.path.abspath(path)))
+    directory = os.path.normcase(os.path.abspath(directory))
+    try:
+        return os.path.commonpath([path, directory]) == directory
+    except ValueError:
+        # Different drives
+        return False
+
+
+def isLibraryData(id, libraryDir):
+    # Product meshes from the asset library and everything they need are worth keeping warm.
+    # Other linked files (cached builds) go with the load that linked them.
+    if isinstance(id, bpy.types.Library):
+        return isInDirectory(id.filepath, libraryDir)
+    return "vpcloaderProduct" in id
+
+
+def getSessionIds(sid):
+    return [id for id in getTrackedIds() if id.library is None and id.get(SESSION_KEY) == sid]
+
+
+def purgeOrphans(ids):
+    # Removes the ids nothing uses anymore, repeating since removing one can orphan another
+    removed = 0
+    ids = list(ids)
+    while True:
+        orphans = [id for id in ids if id.users == 0 and not id.use_fake_user]
+        if len(orphans) == 0:
+            return removed
+        orphanUids = set(id.session_uid for id in orphans)
+        ids = [id for id in ids if id.session_uid not in orphanUids]
+        bpy.data.batch_remove(orphans)
+        removed += len(orphans)
+
+
+def end(sid, before, context=None):
+    # Tags everything the load created and drops what it left unused (joined-away meshes,
+    # material carrier data, import empties...). Returns the number of purged datablocks.
+    created = []
+    for id in getTrackedIds():
+        if id.session_uid in before or id.library is not None:
+            continue
+        id[SESSION_KEY] = sid
+        created.append(id)
+
+    purged = purgeOrphans(created)
+
+    scene = (context or bpy.context).scene
+    scene[SESSION_KEY] = sid
+
+    print("Load session", sid, "created", len(created) - purged, "datablocks, purged", purged)
+    return purged
+
+
+def getMaterialImages(material):
+    images = set()
+    if material is not None and material.node_tree is not None:
+        for node in material.node_tree.nodes:
+            if node.type == 'TEX_IMAGE' and node.image is not None:
+                images.add(node.image)
+    return images
+
+
+def getKeptIds(ids, libraryDir):
+    kept = set(id for id in ids if isLibraryData(id, libraryDir))
+    for id in list(kept):
+        if isinstance(id, bpy.types.Mesh):
+            for material in id.materials:
+                if material is not None:
+                    kept.add(material)
+                    kept.update(getMaterialImages(material))
+    return kept
+
+
+def estimateBytes(id):
+    # Rough in-memory size, enough to see what a reload reclaims
+    if isinstance(id, bpy.types.Mesh):
+        size = len(id.vertices) * 32 + len(id.edges) * 8 + len(id.loops) * 16 + len(id.polygons) * 24
+        size += len(id.uv_layers) * len(id.loops) * 8
+        return size
+    if isinstance(id, bpy.types.Image):
+        width, height = id.size
+        size = width * height * id.channels * (4 if id.is_float else 1)
+        if id.packed_file is not None:
+            size += id.packed_file.size
+        return size
+    return 1024
+
+
+def clearSession(sid, keepLibraryData=False, libraryPath=""):
+    # Removes everything a load created. Returns (removed count, estimated bytes reclaimed).
+    ids = getSessionIds(sid)
+    if keepLibraryData:
+        kept = set(id.session_uid for id in getKeptIds(ids, AssetLibrary.getLibraryDir(libraryPath)))
+        ids = [id for id in ids if id.session_uid not in kept]
+
+    reclaimed = sum(estimateBytes(id) for id in ids)
+    bpy.data.batch_remove(ids)
+
+    print("Cleared load session", sid, ":", len(ids), "datablocks, about", reclaimed // (1024 * 1024), "MB")
+    return len(ids), reclaimed
+
+
+def clearPrevious(context=None, keepLibraryData=True):
+    scene = (context or bpy.context).scene
+    sid = scene.get(SESSION_KEY)
+    if sid is None:
+        return 0, 0
+
+    libraryPath = scene.rexTool.assetLibraryPath if hasattr(scene, "rexTool") else ""
+    result = clearSession(sid, keepLibraryData, bpy.path.abspath(libraryPath))
+    del scene[SESSION_KEY]
+    return result
+
+
+class ClearLoadOperator(bpy.types.Operator):
+    "Remove everything the last Load VPC created"
+    bl_idname = "object.rex_clear_load_operator"
+    bl_label = "Clear last load"
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.get(SESSION_KEY) is not None
+
+    def execute(self, context):
+        count, reclaimed = clearPrevious(context, keepLibraryData=False)
+        self.report({'INFO'}, f"Removed {count} datablocks, about {reclaimed // (1024 * 1024)} MB")
+        return {'FINISHED'}
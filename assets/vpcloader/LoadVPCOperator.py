@@ -2,33 +2,62 @@ import importlib
 import json
 import bpy
 from bpy_types import Operator
-import tempfile
+from mathutils import Matrix, Quaternion, Vector
 from io import BytesIO 
 from . import DEXF
 from . import VPCUtilz
 from . import CatalogUtils
+from . import RoomTopology
 from . import RoomBuilder2025
-
-import requests
+from . import ModelCache
+from . import AssetLibrary
+from . import GLBPreprocess
+from . import BuildCache
+from . import BulkBuilder
+from . import CollisionProxy
+from . import GeometryBudget
+from . import TextureDedup
+from . import LoadSession
+from . import SpatialIndex
+from . import InstancerBuilder
+from . import SceneBuildContext
 
 importlib.reload(DEXF)
 importlib.reload(VPCUtilz)
 importlib.reload(CatalogUtils)
+importlib.reload(RoomTopology)
 importlib.reload(RoomBuilder2025)
-
-
-class LoadVPCOperator(Operator):
-    bl_idname = "object.rex_load_vpc_operator"
-    bl_label = "Load VPC"
-
-    def execute(self, context):
+importlib.reload(ModelCache)
+importlib.reload(AssetLibrary)
+importlib.reload(GLBPreprocess)
+importlib.reload(BuildCache)
+importlib.reload(BulkBuilder)
+importlib.reload(CollisionProxy)
+importlib.reload(GeometryBudget)
+importlib.reload(TextureDedup)
+importlib.reload(LoadSession)
+importlib.reload(SpatialIndex)
+importlib.reload(InstancerBuilder)
+importlib.reload(SceneBuildContext)
+
+# Product meshes with the model transform baked in, keyed by (catalog key, product id)
+# and shared by every assembly part and instancer using them
+sharedProductMeshes = {}
+
+
+class VPCLoader:
+    # Loading shared by the load and the fill operator. Blender can't register an operator
+    # that subclasses another registered operator, so they both mix this in instead.
+
+    def loadVPC(self, context):
         self.report({'INFO'}, "LoadVPCOperator Executed")
 
         
         
-        # Get VPC code and catalog path from the scene properties
+        # Get VPC code (or a saved VPC file) and catalog path from the scene properties
         vpcCode = context.scene.rexTool.vpcCode
-        if not vpcCode:
+        vpcFile = bpy.path.abspath(context.scene.rexTool.vpcFile)
+        if not vpcCode and not vpcFile:
             self.report({'ERROR'}, "VPC code is not set.")
             return {'CANCELLED'}
 
@@ -39,26 +68,89 @@ class LoadVPCOperator(Operator):
             return {'CANCELLED'}
 
 
-        self.report({'INFO'}, f"Loding VPC Code: {vpcCode}")
+        self.report({'INFO'}, f"Loding VPC Code: {vpcFile or vpcCode}")
+
+        # Removing the previous load first, library meshes stay for reuse
+        if context.scene.rexTool.clearPreviousLoad:
+            count, reclaimed = LoadSession.clearPrevious(context, keepLibraryData=True)
+            if count > 0:
+                self.report({'INFO'}, f"Cleared previous load, about {reclaimed // (1024 * 1024)} MB")
+
+        # Everything created from here on belongs to this load
+        sessionId, sessionBefore = LoadSession.begin()
         
 
         # Load the VPC code JSON
-        vpcJSON = DEXF.loadVPCCode(vpcCode)
+        if vpcFile:
+            vpcJSON = DEXF.loadVPCFile(vpcFile)
+        else:
+            vpcJSON = DEXF.loadVPCCode(vpcCode)
         
-        # Load the catalog JSON
-        with open(catalogPath) as json_file:
-            catalogJSON = json.load(json_file)
-
         # Prepare the entity data from the VPC JSON
         hashedEntities = self.prepareEntityData(vpcJSON)
-        hashedCatalogProducts = self.prepareCatalogData(catalogJSON)
 
-        self.loadEntityModels(hashedEntities, hashedCatalogProducts)
+        # Load the catalog JSON, parsed once as long as the file doesn't change
+        hashedCatalogProducts = CatalogUtils.loadCatalog(catalogPath)
+
+        # Only the entities in the region of interest get their models, None loads everything
+        regionIds = self.getRegionEntityIds(context, vpcJSON, hashedEntities, hashedCatalogProducts)
 
         generateRoom = context.scene.rexTool.generateRoom
         generateCollisionWalls = context.scene.rexTool.generateCollisionWalls
-
-        RoomBuilder2025.build(vpcJSON, generateRoom, generateCollisionWalls )
+        generateCollisionProxies = context.scene.rexTool.generateCollisionProxies
+        maxProductTriangles = context.scene.rexTool.maxProductTriangles
+        maxSceneTriangles = context.scene.rexTool.maxSceneTriangles
+        dedupTextures = context.scene.rexTool.dedupTextures
+        maxTextureSize = context.scene.rexTool.maxTextureSize
+
+        # Reusing an earlier build of the exact same configuration if there is one
+        useBuildCache = context.scene.rexTool.useBuildCache
+        if useBuildCache:
+            buildFingerprint = BuildCache.getFingerprint(vpcJSON, hashedCatalogProducts,
+                                                        region=sorted(regionIds) if regionIds is not None else None,
+                                                        **BuildCache.getBuildOptions(context.scene.rexTool))
+            if BuildCache.loadBuild(buildFingerprint):
+                LoadSession.end(sessionId, sessionBefore, context)
+                self.report({'INFO'}, "Loaded cached build")
+                return {'FINISHED'}
+
+        useAssetLibrary = context.scene.rexTool.useAssetLibrary
+        linkAssetLibrary = context.scene.rexTool.linkAssetLibrary
+        assetLibraryPath = context.scene.rexTool.assetLibraryPath
+        usePreprocessedModels = context.scene.rexTool.usePreprocessedModels
+        useInstancer = context.scene.rexTool.useInstancer
+
+        liveOpeningModifiers = context.scene.rexTool.liveOpeningModifiers
+        weldRoomShell = context.scene.rexTool.weldRoomShell
+        separateWalls = context.scene.rexTool.separateWalls
+
+        # Products and room are created through bpy.data, the view layer is updated once at the end
+        with SceneBuildContext.SceneBuildContext(context.scene.rexTool.deferredSceneBuild):
+            self.loadEntityModels(hashedEntities, hashedCatalogProducts, useAssetLibrary, linkAssetLibrary, assetLibraryPath,
+                                  usePreprocessedModels, regionIds, useInstancer)
+
+            # Decimating products over the triangle budget, once per ref
+            budgetReport = GeometryBudget.applyBudget(hashedCatalogProducts, maxProductTriangles, maxSceneTriangles)
+            if len(budgetReport) > 0:
+                before, after = GeometryBudget.printReport(budgetReport)
+                self.report({'INFO'}, f"Scene triangles {before} -> {after}")
+
+            RoomBuilder2025.build(vpcJSON, generateRoom, generateCollisionWalls, liveOpeningModifiers,
+                                  weldRoomShell, separateWalls)
+
+            # Sharing identical images between products and room materials
+            if dedupTextures:
+                TextureDedup.processImages(maxTextureSize)
+
+        # Proxies read matrix_world and bounds, so they come after the view layer update
+        if generateCollisionProxies:
+            CollisionProxy.build(vpcJSON, context.scene.rexTool.convexHullProxies)
+
+        LoadSession.end(sessionId, sessionBefore, context)
+
+        # After the session end, the stored build is what this load tagged
+        if useBuildCache:
+            BuildCache.storeBuild(buildFingerprint, sessionId)
 
         return {'FINISHED'}
     
@@ -74,21 +166,122 @@ class LoadVPCOperator(Operator):
         return hashedEntities
 
 
-    def prepareCatalogData(self, catalogJSON):
-        hashedCatalogProducts = {}
+    def getCameraFrustumPlanes(self, scene, camera):
+        # Perspective frustum of the camera out to its clip end, in world space
+        frame = camera.data.view_frame(scene=scene)
+        corners = [camera.matrix_world @ (corner * (camera.data.clip_end / -corner.z)) for corner in frame]
+        apex = camera.matrix_world.translation
+        return SpatialIndex.getFrustumPlanes(tuple(apex), [tuple(c) for c in corners], camera.data.clip_end)
+
+
+    def getRegionEntityIds(self, context, vpcJSON, hashedEntities, hashedCatalogProducts):
+        regionMode = context.scene.rexTool.regionMode
+        if regionMode == 'ALL':
+            return None
+
+        index = SpatialIndex.buildIndex(hashedEntities, hashedCatalogProducts)
+
+        if regionMode == 'BOX':
+            regionIds = SpatialIndex.queryBox(index, tuple(context.scene.rexTool.regionMin),
+                                              tuple(context.scene.rexTool.regionMax))
 
-        # Iterate over products in catalog, cleans the data and adds missing fields
-        for product in catalogJSON["products"]:
-            hashedCatalogProducts[product["id"]] = product
-        return hashedCatalogProducts
+        elif regionMode == 'SURFACE':
+            topology = RoomTopology.buildTopology(vpcJSON["configuration"]["content"]["entities"])
+            regionIds = SpatialIndex.querySurface(index, topology, context.scene.rexTool.regionSurfaceId,
+                                                  context.scene.rexTool.regionMargin)
+
+        else:
+            camera = context.scene.camera
+            if camera is None or camera.data.type != 'PERSP':
+                self.report({'WARNING'}, "No perspective scene camera, loading everything")
+                return None
+            regionIds = SpatialIndex.queryFrustum(index, self.getCameraFrustumPlanes(context.scene, camera))
+
+        print("Region", regionMode, "has", len(regionIds), "of", len(index["bounds"]), "products")
+        return regionIds
+
+
+    def getPlaceholderSpec(self, entity):
+        spec = self.getEntityEmptySpec(entity)
+        spec["name"] = "placeholder-" + entity["id"]
+        return spec
+
+
+    def tagPlaceholder(self, obj, entity):
+        # Everything needed to load the entity later without the configuration
+        self.tagEntityObject(obj, entity)
+        obj["vpcPlaceholder"] = True
+        obj["vpcEntity"] = json.dumps(entity)
+        obj.empty_display_type = 'CUBE'
+        obj.empty_display_size = 0.25
+
+
+    def getSharedProductMesh(self, productId, hashedCatalogProducts, useAssetLibrary=False, linkAssetLibrary=False,
+                    assetLibraryPath=""):
+        # A new catalog version can change the model or its transform
+        catalogKey = CatalogUtils.getCatalogKey(hashedCatalogProducts)
+        for memoKey in [k for k in sharedProductMeshes if k[0] != catalogKey]:
+            del sharedProductMeshes[memoKey]
+
+        memoKey = (catalogKey, productId)
+        if memoKey in sharedProductMeshes:
+            mesh = sharedProductMeshes[memoKey]
+            if LoadSession.isAlive(mesh):
+                return mesh
+            # Removed since it was cached
+            del sharedProductMeshes[memoKey]
+
+        catalogProduct = hashedCatalogProducts[productId]
+        if useAssetLibrary:
+            mesh = AssetLibrary.getProductMesh(productId, linkAssetLibrary, assetLibraryPath)
+        else:
+            modelPath = CatalogUtils.get3DModelPath(catalogProduct)
+            print("Loading shared model:", productId, "from path:", modelPath)
+            obj = AssetLibrary.importJoinedModel(ModelCache.getLocalModelPath(modelPath))
+            if obj is None:
+                return None
+
+            # Baking the model transform, the placement goes on the objects
+            AssetLibrary.bakeModelTransform(obj, catalogProduct)
+            mesh = obj.data
+            mesh.name = "vpc-" + productId
+            bpy.data.objects.remove(obj)
+
+        if mesh is not None:
+            sharedProductMeshes[memoKey] = mesh
+        return mesh
+
+
+    def loadAssembly(self, entity, hashedCatalogProducts, collection, useAssetLibrary=False, linkAssetLibrary=False,
+                     assetLibraryPath=""):
+        # One object per part, every part model imported once and shared
+        parts = CatalogUtils.resolveAssembly(entity["ref"], hashedCatalogProducts)
+        if len(parts) == 0:
+            print("Assembly has no parts with models:", entity["ref"])
+            return []
+
+        spec = self.getEntityEmptySpec(entity)
+        entityMatrix = Matrix.LocRotScale(Vector(spec["location"]), spec["rotation"], None)
+
+        objects = []
+        for i, (partId, modelPath, matrix) in enumerate(parts):
+            mesh = self.getSharedProductMesh(partId, hashedCatalogProducts, useAssetLibrary, linkAssetLibrary, assetLibraryPath)
+            if mesh is None:
+                continue
+
+            obj = bpy.data.objects.new("part-%s-%d" % (entity["id"], i), mesh)
+            obj.matrix_world = entityMatrix @ Matrix(matrix)
+            self.tagEntityObject(obj, entity)
+            obj["vpcRef"] = partId
+            obj["vpcAssemblyRef"] = entity["ref"]
+            collection.objects.link(obj)
+            objects.append(obj)
+
+        return objects
 
 
     def loadModelFromUrl(self, url):
-        local_path = tempfile.gettempdir() + '/' + 'temp.glb'
-        response = requests.get(url, verify=True)
-        with open(local_path, 'wb') as file:
-            file.write(response.content)    
-            
+        local_path = ModelCache.getLocalModelPath(url)
         return bpy.ops.import_scene.gltf(filepath = local_path)
 
 
@@ -135,8 +328,36 @@ class LoadVPCOperator(Operator):
         bpy.context.object.rotation_quaternion[3] = entity["worldTransform"]["qy"]
 
 
+    def applyEntityTransform(self, obj, entity):
+        # Entity transform only, for objects whose ModelTransformComponent is already baked in
+        obj.rotation_mode = 'QUATERNION'
+        obj.location = (entity["worldTransform"]["x"], entity["worldTransform"]["z"], entity["worldTransform"]["y"])
+        obj.rotation_quaternion = (entity["worldTransform"]["qw"],
+                                   entity["worldTransform"]["qx"],
+                                   -entity["worldTransform"]["qz"],
+                                   entity["worldTransform"]["qy"])
+
+
+    def getEntityEmptySpec(self, entity):
+        # Empties end up with the entity transform only, the same as transformModel leaves them
+        return {
+            "name": "empty-" + entity["id"],
+            "location": (entity["worldTransform"]["x"], entity["worldTransform"]["z"], entity["worldTransform"]["y"]),
+            "rotation": Quaternion((entity["worldTransform"]["qw"],
+                                    entity["worldTransform"]["qx"],
+                                    -entity["worldTransform"]["qz"],
+                                    entity["worldTransform"]["qy"])),
+        }
+
+
+    def tagEntityObject(self, obj, entity):
+        obj["vpcEntityId"] = entity["id"]
+        obj["vpcRef"] = entity["ref"]
+
 
-    def loadEntityModels(self, entities, hashedCatalogProducts):
+
+    def loadEntityModels(self, entities, hashedCatalogProducts, useAssetLibrary=False, linkAssetLibrary=False, assetLibraryPath="",
+                         usePreprocessedModels=False, regionIds=None, useInstancer=False):
         # Create a new collection
         collection_name = "Products"
         
@@ -147,11 +368,38 @@ class LoadVPCOperator(Operator):
             product_collection = bpy.data.collections.new(collection_name)
             bpy.context.scene.collection.children.link(product_collection)
 
+        refs = set(entities[e]["ref"] for e in entities if entities[e]["ref"] != "noValue")
+        emptySpecs = []
+        emptyEntities = []
+        placeholderSpecs = []
+        placeholderEntities = []
+        instancerPlacements = {}
+
+        if regionIds is not None:
+            refs = set(entities[e]["ref"] for e in entities if e in regionIds)
+
+        # Assemblies load their parts instead of a model of their own
+        for ref in list(refs):
+            if ref in hashedCatalogProducts and CatalogUtils.isAssemblyProduct(hashedCatalogProducts[ref]):
+                refs.update(part[0] for part in CatalogUtils.resolveAssembly(ref, hashedCatalogProducts))
+
+        if useAssetLibrary:
+            # Making sure every referenced product is in the library and up to date
+            AssetLibrary.buildLibrary(hashedCatalogProducts, refs, assetLibraryPath)
+
+        preprocessedPaths = {}
+        if usePreprocessedModels and not useAssetLibrary:
+            # Flattening and pre-transforming the GLBs on all cores before importing
+            preprocessedPaths = GLBPreprocess.preprocessCatalog(hashedCatalogProducts, refs)
+
+        deferred = SceneBuildContext.isDeferred()
+
         # Iterate over entities in VPC
         for e in entities:
 
             # Deselecting everything 
-            bpy.ops.object.select_all(action='DESELECT')
+            if not deferred:
+                bpy.ops.object.select_all(action='DESELECT')
 
             entity = entities[e]
             
@@ -164,12 +412,63 @@ class LoadVPCOperator(Operator):
                     print("Reference not found in catalog:", ref)
                     continue
 
+                if regionIds is not None and entity["id"] not in regionIds:
+                    # Outside the region, loaded on demand from a placeholder
+                    placeholderSpecs.append(self.getPlaceholderSpec(entity))
+                    placeholderEntities.append(entity)
+                    continue
+
                 catalogProduct = hashedCatalogProducts[ref]
                 #print("Catalog Product:", catalogProduct)
+
+                if CatalogUtils.isAssemblyProduct(catalogProduct):
+                    self.loadAssembly(entity, hashedCatalogProducts, product_collection, useAssetLibrary,
+                                      linkAssetLibrary, assetLibraryPath)
+                    continue
                 
                 # Entity is a product
                 modelPath = CatalogUtils.get3DModelPath(catalogProduct)
-                if modelPath != "" :
+                if modelPath != "" and useInstancer:
+                    # Only collecting the placement, every ref becomes one instancer at the end
+                    spec = self.getEntityEmptySpec(entity)
+                    instancerPlacements.setdefault(ref, []).append((entity["id"], spec["location"], spec["rotation"]))
+
+                elif modelPath != "" and useAssetLibrary:
+                    mesh = AssetLibrary.getProductMesh(ref, linkAssetLibrary, assetLibraryPath)
+                    if mesh is None:
+                        print("Product not found in asset library:", ref)
+                        continue
+
+                    # The model transform is baked into the library mesh, only the entity transform is left
+                    obj = bpy.data.objects.new(mesh.name, mesh)
+                    self.applyEntityTransform(obj, entity)
+                    self.tagEntityObject(obj, entity)
+                    self.moveToCollection(obj, "Products")
+
+                elif modelPath != "" and preprocessedPaths.get(ref) is not None:
+                    print("Loading preprocessed model for entity:", entity["id"], "from path:", preprocessedPaths[ref])
+                    obj = AssetLibrary.importJoinedModel(preprocessedPaths[ref])
+                    if obj is None:
+                        continue
+
+                    # Already flat and pre-transformed, only the entity transform is left
+                    self.applyEntityTransform(obj, entity)
+                    self.tagEntityObject(obj, entity)
+                    self.moveToCollection(obj, "Products")
+
+                elif modelPath != "" and deferred:
+                    print("Loading model for entity:", entity["id"], "from path:", modelPath)
+                    obj = AssetLibrary.importJoinedModel(ModelCache.getLocalModelPath(modelPath))
+                    if obj is None:
+                        continue
+
+                    # Same result as transformModel, without the active object
+                    AssetLibrary.bakeModelTransform(obj, catalogProduct)
+                    self.applyEntityTransform(obj, entity)
+                    self.tagEntityObject(obj, entity)
+                    self.moveToCollection(obj, "Products")
+
+                elif modelPath != "" :
                     print("Loading model for entity:", entity["id"], "from path:", modelPath)
                     self.loadModelFromUrl(modelPath)
 
@@ -194,17 +493,33 @@ class LoadVPCOperator(Operator):
 
                         # Transform the model based on entity data
                         self.transformModel(catalogProduct, entity)
+                        self.tagEntityObject(bpy.context.object, entity)
 
                         self.moveToCollection(bpy.context.object, "Products")
                 else:
                     # Its an empty entity, no model to load
-                    # creating an empty for it
-                    bpy.ops.object.empty_add(type='PLAIN_AXES', align='WORLD', location=(0, 0, 0), scale=(1, 1, 1))
-                    self.transformModel(catalogProduct, entity)
-                    self.moveToCollection(bpy.context.object, "Products")
+                    # creating an empty for it, all of them are created together at the end
+                    emptySpecs.append(self.getEntityEmptySpec(entity))
+                    emptyEntities.append(entity)
+
+        empties = BulkBuilder.createEmpties(emptySpecs, "Products")
+        for obj, entity in zip(empties, emptyEntities):
+            self.tagEntityObject(obj, entity)
+
+        if len(instancerPlacements) > 0:
+            meshes = {}
+            for ref in instancerPlacements:
+                meshes[ref] = self.getSharedProductMesh(ref, hashedCatalogProducts, useAssetLibrary, linkAssetLibrary,
+                                                        assetLibraryPath)
+            InstancerBuilder.build(instancerPlacements, meshes, collection_name)
+
+        placeholders = BulkBuilder.createEmpties(placeholderSpecs, "Placeholders")
+        for obj, entity in zip(placeholders, placeholderEntities):
+            self.tagPlaceholder(obj, entity)
 
         # Deselecting everything 
-        bpy.ops.object.select_all(action='DESELECT')
+        if not deferred:
+            bpy.ops.object.select_all(action='DESELECT')
 
 
     def moveToCollection(self, obj, collection_name):
@@ -221,4 +536,54 @@ class LoadVPCOperator(Operator):
             coll.objects.unlink(obj)
 
         # Link the object to the specified collection
-        collection.objects.link(obj)
\ No newline at end of file
+        collection.objects.link(obj)
+
+
+class LoadVPCOperator(VPCLoader, Operator):
+    bl_idname = "object.rex_load_vpc_operator"
+    bl_label = "Load VPC"
+
+    def execute(self, context):
+        return self.loadVPC(context)
+
+
+class FillPlaceholdersOperator(VPCLoader, Operator):
+    "Load the products for the selected placeholders, or all of them if none is selected"
+    bl_idname = "object.rex_fill_placeholders_operator"
+    bl_label = "Load placeholders"
+
+    def execute(self, context):
+        catalogPath = context.scene.rexTool.catalogPath
+        if not catalogPath:
+            self.report({'ERROR'}, "Catalog path is not set.")
+            return {'CANCELLED'}
+
+        placeholders = [obj for obj in context.selected_objects if obj.get("vpcPlaceholder")]
+        if len(placeholders) == 0 and "Placeholders" in bpy.data.collections:
+            placeholders = [obj for obj in bpy.data.collections["Placeholders"].objects if obj.get("vpcPlaceholder")]
+
+        if len(placeholders) == 0:
+            self.report({'INFO'}, "No placeholders to load")
+            return {'FINISHED'}
+
+        # The filled products belong to the load the placeholders came from
+        sessionId, sessionBefore = LoadSession.begin(context.scene.get(LoadSession.SESSION_KEY))
+
+        entities = {}
+        for obj in placeholders:
+            entity = json.loads(obj["vpcEntity"])
+            entities[entity["id"]] = entity
+            bpy.data.objects.remove(obj)
+
+        with SceneBuildContext.SceneBuildContext(context.scene.rexTool.deferredSceneBuild):
+            self.loadEntityModels(entities, CatalogUtils.loadCatalog(catalogPath),
+                                  context.scene.rexTool.useAssetLibrary,
+                                  context.scene.rexTool.linkAssetLibrary,
+                                  context.scene.rexTool.assetLibraryPath,
+                                  context.scene.rexTool.usePreprocessedModels,
+                                  useInstancer=context.scene.rexTool.useInstancer)
+
+        LoadSession.end(sessionId, sessionBefore, context)
+
+        self.report({'INFO'}, f"Loaded {len(entities)} placeholders")
+        return {'FINISHED'}
@@ -0,0 +1,51 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+import requests
+
+CACHE_ROOT = os.path.join(tempfile.gettempdir(), "vpcloader_cache")
+
+
+def getCacheDir(name):
+    path = os.path.join(CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def hashKey(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def getCachedModelPath(url):
+    # Keeping the original extension so the glTF importer picks the right format
+    ext = os.path.splitext(url.split("?")[0])[1] or ".glb"
+    return os.path.join(getCacheDir("models"), hashKey(url) + ext)
+
+
+def fetchModel(url, session=None):
+    # Downloads the url into the cache unless it's already there.
+    # Returns (local path, bytes downloaded, cache hit).
+    local_path = getCachedModelPath(url)
+    if os.path.exists(local_path):
+        return local_path, 0, True
+
+    response = (session or requests).get(url, verify=True)
+    response.raise_for_status()
+
+    # Writing to a temp file first so a failed download never leaves a broken cache entry
+    tmp_path = local_path + ".%d-%d.part" % (os.getpid(), threading.get_ident())
+    with open(tmp_path, 'wb') as file:
+        file.write(response.content)
+    os.replace(tmp_path, local_path)
+
+    return local_path, len(response.content), False
+
+
+def getLocalModelPath(url):
+    return fetchModel(url)[0]
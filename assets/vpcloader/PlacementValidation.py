@@ -0,0 +1,311 @@
+# Checks a loaded configuration for placement problems:
+#   - products interpenetrating each other
+#   - products floating away from the host they are connected to
+#   - products sticking out of the room
+#
+# Broad phase is sweep and prune over world bounding boxes, only overlapping
+# pairs get BVH trees compared. Run it after a load from the panel, or headless
+# as a gate (exit code 1 when something is wrong):
+#
+#   blender -b --python-expr "from vpcloader import PlacementValidation; PlacementValidation.main()" \
+#       -- --vpc V3TMF8 --catalog catalog.json --report report.json
+
+import argparse
+import json
+import os
+import sys
+
+import bpy
+import numpy as np
+from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+
+from . import DEXF
+from . import InstancerBuilder
+from . import Prefetch
+from . import RoomTopology
+
+# Distances in meters
+DEFAULT_TOLERANCE = 0.01
+FLOATING_DISTANCE = 0.05
+
+# Vertices sampled per product for the host distance and the room shell test
+HOST_SAMPLE_COUNT = 256
+OUTSIDE_SAMPLE_COUNT = 256
+
+
+def getHostIds(entity):
+    hostIds = set()
+    if "c" in entity and "Connections" in entity["c"]:
+        for connection in entity["c"]["Connections"].get("connections", []):
+            if connection.get("hostId", "") not in ("", entity.get("id")):
+                hostIds.add(connection["hostId"])
+    return hostIds
+
+
+def getWorldVertices(mesh, matrix):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3)
+
+    matrix = np.array(matrix)
+    return co @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def getProductData(obj, matrix, entityId, ref):
+    # obj holds the product mesh, matrix places it (instancer points share the prototype)
+    world = getWorldVertices(obj.data, matrix)
+    if len(world) == 0:
+        return None
+
+    return {
+        "object": obj,
+        "mesh": obj.data,
+        "id": entityId,
+        "ref": ref,
+        "vertices": world,
+        "low": world.min(axis=0),
+        "high": world.max(axis=0),
+        "bvh": None,
+    }
+
+
+def getMeshTriangles(mesh, meshTriangles):
+    # Triangle vertex indices, read once per mesh however many products share it
+    key = mesh.as_pointer()
+    if key not in meshTriangles:
+        mesh.calc_loop_triangles()
+        indices = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+        mesh.loop_triangles.foreach_get("vertices", indices)
+        meshTriangles[key] = indices.reshape(-1, 3).tolist()
+    return meshTriangles[key]
+
+
+def getBVH(product, meshTriangles):
+    # Built on first use, most products never get past the broad phase
+    if product["bvh"] is None:
+        product["bvh"] = BVHTree.FromPolygons(product["vertices"].tolist(), getMeshTriangles(product["mesh"], meshTriangles))
+    return product["bvh"]
+
+
+def getOverlappingPairs(products, tolerance=0.0):
+    # Sweep and prune along x, then the other two axes
+    order = sorted(range(len(products)), key=lambda i: products[i]["low"][0])
+    active = []
+    pairs = []
+    for i in order:
+        low = products[i]["low"]
+        active = [j for j in active if products[j]["high"][0] + tolerance >= low[0]]
+        for j in active:
+            if all(products[j]["low"][k] <= products[i]["high"][k] + tolerance and
+                   products[i]["low"][k] <= products[j]["high"][k] + tolerance for k in (1, 2)):
+                pairs.append((j, i))
+        active.append(i)
+    return pairs
+
+
+def getSurfaceBVHs(topology):
+    bvhs = {}
+    for surface in topology["surfaces"]:
+        points = [topology["corners"][c] for c in surface["corners"]]
+        bvhs[surface["entityId"]] = BVHTree.FromPolygons(points, [tuple(range(len(points)))])
+    return bvhs
+
+
+def getShellBVH(topology):
+    # Every room surface in one tree, polygon index = surface index
+    polygons = [tuple(surface["corners"]) for surface in topology["surfaces"]]
+    return BVHTree.FromPolygons(topology["corners"], polygons)
+
+
+def getSampleVertices(vertices, count):
+    # Every n-th vertex plus the extremes along each axis
+    step = max(1, len(vertices) // count)
+    extremes = np.concatenate((vertices.argmin(axis=0), vertices.argmax(axis=0)))
+    return np.concatenate((vertices[::step], vertices[extremes]))
+
+
+def getOutsideDistance(product, shellBVH, normals):
+    # How far the product reaches out of the room shell. The nearest surface decides the side,
+    # its normal points into the room, so non-rectangular rooms are tested by their walls.
+    best = 0.0
+    for v in getSampleVertices(product["vertices"], OUTSIDE_SAMPLE_COUNT):
+        location, normal, index, distance = shellBVH.find_nearest(Vector(v))
+        if index is None:
+            continue
+        if (Vector(v) - location).dot(normals[index]) < 0:
+            best = max(best, distance)
+    return best
+
+
+def getHostDistance(product, hostBVH):
+    vertices = product["vertices"]
+    step = max(1, len(vertices) // HOST_SAMPLE_COUNT)
+    best = None
+    for v in vertices[::step]:
+        location, normal, index, distance = hostBVH.find_nearest(Vector(v))
+        if distance is not None and (best is None or distance < best):
+            best = distance
+    return best
+
+
+def validate(vpcJSON, collection_name="Products", tolerance=DEFAULT_TOLERANCE, floatingDistance=FLOATING_DISTANCE):
+    entities = vpcJSON["configuration"]["content"]["entities"]
+    hashedEntities = {entity["id"]: entity for entity in entities if "id" in entity}
+
+    products = []
+    for name, obj, matrix, entityId, ref in InstancerBuilder.getProductPlacements(collection_name):
+        # Only entity products, instancer points included
+        if entityId == "":
+            continue
+        product = getProductData(obj, matrix, entityId, ref)
+        if product is not None:
+            products.append(product)
+
+    report = {
+        "products": len(products),
+        "interpenetrating": [],
+        "floating": [],
+        "outside": [],
+    }
+
+    # Products connected to each other (dish on a shelf) are expected to touch
+    connected = set()
+    for entityId, entity in hashedEntities.items():
+        for hostId in getHostIds(entity):
+            connected.add((entityId, hostId))
+            connected.add((hostId, entityId))
+
+    # Triangles by mesh, only for the products that need a BVH
+    meshTriangles = {}
+    for i, j in getOverlappingPairs(products, tolerance):
+        a, b = products[i], products[j]
+        if a["id"] == b["id"] or (a["id"], b["id"]) in connected:
+            continue
+        faces = getBVH(a, meshTriangles).overlap(getBVH(b, meshTriangles))
+        if len(faces) > 0:
+            report["interpenetrating"].append({
+                "a": {"id": a["id"], "ref": a["ref"]},
+                "b": {"id": b["id"], "ref": b["ref"]},
+                "faces": len(faces),
+            })
+
+    topology = RoomTopology.buildTopology(entities)
+    surfaceBVHs = getSurfaceBVHs(topology)
+    productsById = {}
+    for product in products:
+        productsById.setdefault(product["id"], []).append(product)
+
+    for product in products:
+        hostIds = getHostIds(hashedEntities.get(product["id"], {}))
+        distances = []
+        for hostId in hostIds:
+            if hostId in surfaceBVHs:
+                distances.append(getHostDistance(product, surfaceBVHs[hostId]))
+            for host in productsById.get(hostId, []):
+                distances.append(getHostDistance(product, getBVH(host, meshTriangles)))
+        distances = [d for d in distances if d is not None]
+        if len(distances) > 0 and min(distances) > floatingDistance:
+            report["floating"].append({
+                "id": product["id"], "ref": product["ref"],
+                "hostIds": sorted(hostIds), "distance": round(min(distances), 4),
+            })
+
+    roomBounds = RoomTopology.getRoomBounds(topology)
+    if roomBounds is not None:
+        roomLow, roomHigh = roomBounds
+        shellBVH = getShellBVH(topology)
+        normals = [Vector(RoomTopology.getSurfaceNormal(topology, i)) for i in range(len(topology["surfaces"]))]
+        for product in products:
+            # Out of the room's bounding box is out of the room, inside it the walls decide
+            overshoot = max(
+                max(roomLow[k] - product["low"][k] for k in range(3)),
+                max(product["high"][k] - roomHigh[k] for k in range(3)),
+            )
+            if overshoot <= tolerance:
+                overshoot = getOutsideDistance(product, shellBVH, normals)
+            if overshoot > tolerance:
+                report["outside"].append({"id": product["id"], "ref": product["ref"], "overshoot": round(float(overshoot), 4)})
+
+    report["ok"] = len(report["interpenetrating"]) == 0 and len(report["floating"]) == 0 and len(report["outside"]) == 0
+    return report
+
+
+def printReport(report):
+    print("Placement validation of", report["products"], "products:",
+          len(report["interpenetrating"]), "interpenetrating,",
+          len(report["floating"]), "floating,",
+          len(report["outside"]), "outside the room")
+    for pair in report["interpenetrating"]:
+        print("  Interpenetrating:", pair["a"]["id"], pair["a"]["ref"], "<>", pair["b"]["id"], pair["b"]["ref"])
+    for item in report["floating"]:
+        print("  Floating:", item["id"], item["ref"], item["distance"], "m from", ", ".join(item["hostIds"]))
+    for item in report["outside"]:
+        print("  Outside:", item["id"], item["ref"], item["overshoot"], "m")
+
+
+def writeReport(report, path):
+    with open(path, 'w') as json_file:
+        json.dump(report, json_file, indent=2)
+
+
+class ValidatePlacementOperator(bpy.types.Operator):
+    "Check the loaded products for interpenetration, floating and being outside the room"
+    bl_idname = "object.rex_validate_placement_operator"
+    bl_label = "Validate placement"
+
+    def execute(self, context):
+        rexTool = context.scene.rexTool
+        if rexTool.vpcFile:
+            vpcJSON = DEXF.loadVPCFile(bpy.path.abspath(rexTool.vpcFile))
+        else:
+            vpcJSON = DEXF.loadVPCCode(rexTool.vpcCode)
+
+        report = validate(vpcJSON)
+        printReport(report)
+
+        if rexTool.validationReportPath:
+            writeReport(report, bpy.path.abspath(rexTool.validationReportPath))
+
+        level = {'INFO'} if report["ok"] else {'WARNING'}
+        self.report(level, "Placement: %d interpenetrating, %d floating, %d outside" % (
+            len(report["interpenetrating"]), len(report["floating"]), len(report["outside"])))
+        return {'FINISHED'}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="Load a configuration and validate product placement")
+    parser.add_argument("--vpc", required=True, help="VPC code or saved VPC json")
+    parser.add_argument("--catalog", required=True, help="Path to catalog.json")
+    parser.add_argument("--report", default=None, help="Where to write the json report")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--floating-distance", type=float, default=FLOATING_DISTANCE)
+    args = parser.parse_args(argv)
+
+    if not hasattr(bpy.types.Scene, "rexTool"):
+        from .VPCLoaderPanel import register
+        register()
+
+    # Fetched once, a code is saved to the vpc cache and the operator loads that file
+    vpcJSON = Prefetch.resolveConfiguration(args.vpc)
+    vpcFile = args.vpc if os.path.isfile(args.vpc) else Prefetch.getConfigurationPath(args.vpc)
+
+    rexTool = bpy.context.scene.rexTool
+    rexTool.catalogPath = args.catalog
+    rexTool.vpcCode = args.vpc
+    rexTool.vpcFile = vpcFile
+
+    result = bpy.ops.object.rex_load_vpc_operator()
+    if 'FINISHED' not in result:
+        print("Load VPC failed:", result)
+        sys.exit(1)
+
+    report = validate(vpcJSON, tolerance=args.tolerance, floatingDistance=args.floating_distance)
+    printReport(report)
+    if args.report:
+        writeReport(report, args.report)
+
+    sys.exit(0 if report["ok"] else 1)
@@ -0,0 +1,173 @@
+# Downloads everything a list of configurations needs into the local caches, so
+# Blender workers never wait for the network during a batch.
+#
+# Doesn't need bpy:
+#   python -m vpcloader.Prefetch --catalog catalog.json [--workers 8] VPCCODE1 configuration.json ...
+#
+# Resolved configurations are saved to the "vpc" cache folder, so they can be
+# loaded as files afterwards.
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import CatalogUtils
+from . import DEXF
+from . import ModelCache
+
+DEFAULT_WORKERS = 8
+
+
+def getConfigurationPath(codeOrFile):
+    name = os.path.splitext(os.path.basename(codeOrFile))[0]
+    return os.path.join(ModelCache.getCacheDir("vpc"), name + ".json")
+
+
+def resolveConfiguration(codeOrFile):
+    vpcJSON = DEXF.loadVPC(codeOrFile)
+    if not os.path.isfile(codeOrFile):
+        path = getConfigurationPath(codeOrFile)
+        tmpPath = path + ".part"
+        with open(tmpPath, 'w') as json_file:
+            json.dump(vpcJSON, json_file)
+        os.replace(tmpPath, path)
+    return vpcJSON
+
+
+def collectUrls(vpcJSON, hashedCatalogProducts):
+    # Product and assembly part models, and kvadrat surface materials
+    urls = set()
+    for entity in vpcJSON["configuration"]["content"]["entities"]:
+        ref = entity.get("ref", "")
+
+        if ref in hashedCatalogProducts:
+            if CatalogUtils.isAssemblyProduct(hashedCatalogProducts[ref]):
+                # Assemblies load the models of their parts
+                for partId, modelPath, matrix in CatalogUtils.resolveAssembly(ref, hashedCatalogProducts):
+                    urls.add(modelPath)
+            else:
+                modelPath = CatalogUtils.get3DModelPath(hashedCatalogProducts[ref])
+                if modelPath != "":
+                    urls.add(modelPath)
+
+        if "c" in entity and "kv-material" in entity["c"]:
+            materialUrl = entity["c"]["kv-material"].get("url", "")
+            if materialUrl != "":
+                urls.add(materialUrl)
+
+    return urls
+
+
+def collectProductRefs(vpcJSON):
+    # Refs that can have DEXF assetV2 models
+    refs = set()
+    for entity in vpcJSON["configuration"]["content"]["entities"]:
+        ref = entity.get("ref", "")
+        if ref != "" and not ref.startswith("kvadrat"):
+            refs.add(ref)
+    return refs
+
+
+def resolveAssetUrls(refs, assetName, levelOfDetail, session, executor):
+    # DEXF assetV2 lookups on the download pool. Returns (urls, failures by ref).
+    urls = set()
+    failures = {}
+    futures = {executor.submit(DEXF.getAssetV2Content, ref, assetName, levelOfDetail, session): ref
+               for ref in sorted(refs)}
+    for future in as_completed(futures):
+        ref = futures[future]
+        try:
+            assetUrl = future.result()
+        except Exception as e:
+            failures[ref] = str(e)
+            print("Failed to look up assetV2:", ref, e)
+            continue
+        if assetUrl is not None:
+            urls.add(assetUrl)
+    return urls, failures
+
+
+def getSession(workers):
+    # One pooled session so the number of open connections stays at the worker count
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def prefetch(urls, session, executor):
+    report = {"urls": len(urls), "fetched": 0, "bytes": 0, "hits": 0, "failures": {}}
+
+    futures = {executor.submit(ModelCache.fetchModel, url, session): url for url in sorted(urls)}
+    for future in as_completed(futures):
+        url = futures[future]
+        try:
+            local_path, size, hit = future.result()
+        except Exception as e:
+            report["failures"][url] = str(e)
+            print("Failed:", url, e)
+            continue
+
+        if hit:
+            report["hits"] += 1
+        else:
+            report["fetched"] += 1
+            report["bytes"] += size
+
+    return report
+
+
+def printReport(report):
+    print("Prefetched %d urls: %d downloaded (%.1f MB), %d cache hits, %d failures" % (
+        report["urls"], report["fetched"], report["bytes"] / (1024 * 1024), report["hits"], len(report["failures"])))
+    for url, error in sorted(report["failures"].items()):
+        print("  ", url, error)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download every model and material a list of configurations needs")
+    parser.add_argument("configurations", nargs="+", help="VPC codes or saved VPC json files")
+    parser.add_argument("--catalog", required=True, help="Path to catalog.json")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of concurrent downloads")
+    parser.add_argument("--asset-name", default=None, help="Also fetch this DEXF assetV2 model for every product")
+    parser.add_argument("--lod", default="rt", help="DEXF assetV2 level of detail")
+    args = parser.parse_args(argv)
+
+    hashedCatalogProducts = CatalogUtils.loadCatalog(args.catalog)
+
+    urls = set()
+    refs = set()
+    failures = {}
+    for codeOrFile in args.configurations:
+        try:
+            vpcJSON = resolveConfiguration(codeOrFile)
+            urls.update(collectUrls(vpcJSON, hashedCatalogProducts))
+            refs.update(collectProductRefs(vpcJSON))
+        except Exception as e:
+            failures[codeOrFile] = str(e)
+            print("Failed to resolve configuration:", codeOrFile, e)
+
+    # The assetV2 lookups and the downloads share the pool and its connections
+    session = getSession(args.workers)
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        if args.asset_name is not None:
+            assetUrls, assetFailures = resolveAssetUrls(refs, args.asset_name, args.lod, session, executor)
+            urls.update(assetUrls)
+            failures.update(assetFailures)
+
+        report = prefetch(urls, session, executor)
+
+    report["failures"].update(failures)
+    printReport(report)
+
+    return 1 if len(report["failures"]) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
+import math
 import bpy
+import numpy as np
+from mathutils import Matrix
 
 
 class MirrorXOperator(bpy.types.Operator):
@@ -11,10 +14,7 @@ class MirrorXOperator(bpy.types.Operator):
         return context.active_object is not None
 
     def execute(self, context):
-        bpy.ops.view3d.snap_cursor_to_center()
-        for ob in context.selected_objects:
-            bpy.ops.transform.resize(value=(-1, 1, 1), orient_type='VIEW', orient_matrix=((1, -0, -0), (-0, -1.34359e-07, 1), (0, -1, -1.34359e-07)), orient_matrix_type='VIEW', constraint_axis=(False, False, False), mirror=True, use_proportional_edit=False, proportional_edit_falloff='SMOOTH', proportional_size=1, use_proportional_connected=False, use_proportional_projected=False)
-            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        transformSelected(context, Matrix.Scale(-1, 4, (1, 0, 0)))
         return {'FINISHED'}
 
 
@@ -41,10 +41,7 @@ class Rotate90XOperator(bpy.types.Operator):
         return context.active_object is not None
 
     def execute(self, context):
-        bpy.ops.view3d.snap_cursor_to_center()
-        for ob in context.selected_objects:
-            bpy.ops.transform.rotate(value=1.5708, orient_axis='X', orient_type='GLOBAL', orient_matrix=((1, 0, 0), (0, 1, 0), (0, 0, 1)), orient_matrix_type='GLOBAL', constraint_axis=(False, False, False), mirror=True, use_proportional_edit=False, proportional_edit_falloff='SMOOTH', proportional_size=1, use_proportional_connected=False, use_proportional_projected=False)
-            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        transformSelected(context, Matrix.Rotation(math.radians(90), 4, 'X'))
         return {'FINISHED'}
 
 class Rotate90YOperator(bpy.types.Operator):
@@ -57,10 +54,7 @@ class Rotate90YOperator(bpy.types.Operator):
         return context.active_object is not None
 
     def execute(self, context):
-        bpy.ops.view3d.snap_cursor_to_center()
-        for ob in context.selected_objects:
-            bpy.ops.transform.rotate(value=1.5708, orient_axis='Y', orient_type='GLOBAL', orient_matrix=((1, 0, 0), (0, 1, 0), (0, 0, 1)), orient_matrix_type='GLOBAL', constraint_axis=(False, False, False), mirror=True, use_proportional_edit=False, proportional_edit_falloff='SMOOTH', proportional_size=1, use_proportional_connected=False, use_proportional_projected=False)
-            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        transformSelected(context, Matrix.Rotation(math.radians(90), 4, 'Y'))
         return {'FINISHED'}
 
 class Rotate90ZOperator(bpy.types.Operator):
@@ -73,20 +67,86 @@ class Rotate90ZOperator(bpy.types.Operator):
         return context.active_object is not None
 
     def execute(self, context):
-        bpy.ops.view3d.snap_cursor_to_center()
-        for ob in context.selected_objects:
-            bpy.ops.transform.rotate(value=1.5708, orient_axis='Z', orient_type='GLOBAL', orient_matrix=((1, 0, 0), (0, 1, 0), (0, 0, 1)), orient_matrix_type='GLOBAL', constraint_axis=(False, False, True), mirror=True, use_proportional_edit=False, proportional_edit_falloff='SMOOTH', proportional_size=1, use_proportional_connected=False, use_proportional_projected=False)
-            bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+        transformSelected(context, Matrix.Rotation(math.radians(90), 4, 'Z'))
         return {'FINISHED'}
 
 def centerBounds(context):
+    transformSelected(context, None, True)
+
+
+def getVertexArray(mesh):
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3)
+
+
+def getCornerNormals(mesh):
+    # Flat float32 array of the per loop normals. Mesh.corner_normals is Blender 4.1+,
+    # 4.0 computes them into the loops with calc_normals_split.
+    normals = np.empty(len(mesh.loops) * 3, dtype=np.float32)
+    if hasattr(mesh, "corner_normals"):
+        mesh.corner_normals.foreach_get("vector", normals)
+    else:
+        mesh.calc_normals_split()
+        mesh.loops.foreach_get("normal", normals)
+    return normals
+
+
+def setCustomNormals(mesh, normals):
+    # normals: flat per loop array, like getCornerNormals returns
+    if hasattr(mesh, "use_auto_smooth"):
+        # Before 4.1 custom normals are only used with auto smooth on
+        mesh.use_auto_smooth = True
+    mesh.normals_split_custom_set(np.ascontiguousarray(normals, dtype=np.float32).ravel())
+
+
+def hasSelectedAncestor(ob, selected):
+    parent = ob.parent
+    while parent is not None:
+        if parent in selected:
+            return True
+        parent = parent.parent
+    return False
+
+
+def transformSelected(context, matrix=None, recenter=False):
+    # Applies matrix (around the world origin) to every selected object and bakes
+    # the result into the mesh, like bpy.ops.transform.* followed by transform_apply,
+    # but once per object and without operators.
+    # With recenter the bounds center of each mesh is moved to the origin.
+    # Children follow their parent, selected ones aren't transformed a second time.
+    extra = np.identity(4) if matrix is None else np.array(matrix)
+    selected = set(context.selected_objects)
+
     for ob in context.selected_objects:
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
-        bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='BOUNDS')
-        bpy.ops.object.location_clear(clear_delta=False)
-        bpy.ops.object.rotation_clear(clear_delta=False)
-        bpy.ops.object.scale_clear(clear_delta=False)
-        bpy.context.object.location[0] = 0
-        bpy.context.object.location[1] = 0
-        bpy.context.object.location[2] = 0
-        bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
\ No newline at end of file
+        if hasSelectedAncestor(ob, selected):
+            continue
+
+        if ob.type != 'MESH':
+            ob.matrix_world = Matrix(extra.tolist()) @ ob.matrix_world
+            continue
+
+        # Like transform_apply, never change data other objects are using
+        if ob.data.users > 1:
+            ob.data = ob.data.copy()
+
+        total = extra @ np.array(ob.matrix_world)
+
+        if recenter:
+            co = getVertexArray(ob.data)
+            if len(co) > 0:
+                world = co @ total[:3, :3].T + total[:3, 3]
+                center = (world.min(axis=0) + world.max(axis=0)) / 2
+                total[:3, 3] -= center
+
+        # Mesh.transform also takes care of custom normals and shape keys
+        ob.data.transform(Matrix(total.tolist()), shape_keys=True)
+        if np.linalg.det(total[:3, :3]) < 0:
+            ob.data.flip_normals()
+        ob.data.update()
+
+        ob.matrix_world = Matrix.Identity(4)
+
+        # The parent's transform went into its mesh, the children keep where they were relative to it
+        for child in ob.children:
+            child.matrix_parent_inverse = Matrix(total.tolist()) @ child.matrix_parent_inverse
@@ -1,20 +1,30 @@
 import math
 import bpy
 import bmesh
-import requests
-import tempfile
 
 from mathutils import Quaternion
+from . import ModelCache
+from . import BulkBuilder
+from . import RoomTopology
+from . import SceneBuildContext
+from . import LoadSession
+
+# Depth of the generated window and door frames, in meters
+OPENING_DEPTH = 0.03
+
+# Evaluated opening meshes keyed by (ref, size X, size Y, depth)
+openingMeshCache = {}
+
+# Surface materials imported from kv-material urls, keyed by url
+urlMaterialCache = {}
+
+# Color materials keyed by hex color code
+colorMaterialCache = {}
 
 def loadModelFromUrl(url):
     print("Loading model from url: ", url)
-    local_path = tempfile.gettempdir() + '/' + 'temp.glb'
+    local_path = ModelCache.getLocalModelPath(url)
     print("Local path: ", local_path)
-    response = requests.get(url, verify=True)
-    print("Response: ", response)
-    with open(local_path, 'wb') as file:
-        file.write(response.content)    
-        
     return bpy.ops.import_scene.gltf(filepath = local_path)
 
 def create_surface(name, points, flipNormal=False, generateCollisionWalls=False):
@@ -54,6 +64,13 @@ def create_surface(name, points, flipNormal=False, generateCollisionWalls=False)
     for loop in face.loops:
         loop[uv_layer].uv = (loop.vert.co.x, loop.vert.co.y)
 
+    if SceneBuildContext.isDeferred():
+        # Projecting every face on its own plane instead of unwrapping in edit mode
+        setPlanarUVs(bm, uv_layer)
+        bm.to_mesh(mesh)
+        bm.free()
+        return obj
+
     bm.to_mesh(mesh)
     bm.free()
 
@@ -65,6 +82,21 @@ def create_surface(name, points, flipNormal=False, generateCollisionWalls=False)
     bpy.ops.object.mode_set(mode='OBJECT')
     return obj
 
+def setPlanarUVs(bm, uv_layer):
+    # UVs in the plane of each face, u along its first edge and scaled to fit 0..1,
+    # the same as getPlanarUVs and unwrapping a single face
+    for face in bm.faces:
+        origin = face.loops[0].vert.co
+        u = (face.loops[1].vert.co - origin).normalized()
+        v = face.normal.cross(u)
+        coords = [((loop.vert.co - origin).dot(u), (loop.vert.co - origin).dot(v)) for loop in face.loops]
+
+        minU = min(c[0] for c in coords)
+        minV = min(c[1] for c in coords)
+        size = max(max(c[0] for c in coords) - minU, max(c[1] for c in coords) - minV) or 1
+        for loop, c in zip(face.loops, coords):
+            loop[uv_layer].uv = ((c[0] - minU)/size, (c[1] - minV)/size)
+
 def setMaterial(obj, materialName) :
     mat = bpy.data.materials.get(materialName)
     if mat is not None:
@@ -123,83 +155,193 @@ def scaleMaterial(material):
     print("UV scaling applied to material.")
 
 
-def setKvadratMaterial(obj, entity) :
-    if "kv-material" in entity["c"] :
-        kv_material = entity["c"]["kv-material"]
-        # Check if the material has a color code
-        if "colorCode" in kv_material:
-            print("Material color code:", kv_material["colorCode"])
+def createColorMaterial(hex_color):
+    # One material per color, surfaces with the same color share it
+    key = hex_color.upper()
+    if key in colorMaterialCache:
+        material = colorMaterialCache[key]
+        if LoadSession.isAlive(material):
+            return material
+        # Removed since it was cached
+        del colorMaterialCache[key]
 
-            material = bpy.data.materials.new(name="CustomColorMaterial")
+    material = bpy.data.materials.new(name="CustomColorMaterial")
 
+    material.use_nodes = True
+    material.use_backface_culling = True
 
-            material.use_nodes = True
-            material.use_backface_culling = True
+    rgb = tuple(int(hex_color[i:i+2], 16)/255 for i in (1, 3, 5))
+    bsdf = material.node_tree.nodes.get("Principled BSDF")
+    bsdf.inputs['Base Color'].default_value = (*rgb, 1)
+    # RGBA
 
-            # Step 2: Set the base color to #D0CCC4
-            hex_color = kv_material["colorCode"]
-            rgb = tuple(int(hex_color[i:i+2], 16)/255 for i in (1, 3, 5))
-            bsdf = material.node_tree.nodes.get("Principled BSDF")
-            bsdf.inputs['Base Color'].default_value = (*rgb, 1)
-            # RGBA
-            if obj.data.materials:
-                obj.data.materials[0] = material
-            else:
-                obj.data.materials.append(material)
+    colorMaterialCache[key] = material
+    return material
 
-        elif "url" in kv_material:
-            if kv_material["url"] != "":
-                print("Material URL:", kv_material["url"])
-                bpy.ops.object.select_all(action='DESELECT')
-                matModel = loadModelFromUrl(kv_material["url"])
 
-                imported_objects = bpy.context.selected_objects
-                imported_obj = imported_objects[0] if imported_objects else None
+def loadUrlMaterial(url):
+    # The material comes from the first object of an imported GLB, each url is imported once
+    if url in urlMaterialCache:
+        mat = urlMaterialCache[url]
+        if LoadSession.isAlive(mat):
+            return mat
+        # Removed since it was cached
+        del urlMaterialCache[url]
+
+    print("Material URL:", url)
+    deferred = SceneBuildContext.isDeferred()
+    if deferred:
+        # Imported into the staging collection, the selection stays as it is
+        imported_objects = SceneBuildContext.current.importObjects(ModelCache.getLocalModelPath(url))
+    else:
+        bpy.ops.object.select_all(action='DESELECT')
+        matModel = loadModelFromUrl(url)
+        imported_objects = bpy.context.selected_objects
 
-                
-                if imported_obj and imported_obj.data.materials:
-                    mat = imported_obj.data.materials[0]
-                    mat.use_backface_culling = True
+    # Skipping the empties the importer makes for the node hierarchy
+    imported_obj = next((obj for obj in imported_objects if obj.type == 'MESH'), None)
 
+    mat = None
+    if imported_obj and imported_obj.data.materials:
+        mat = imported_obj.data.materials[0]
+        mat.use_backface_culling = True
 
-                    for node in mat.node_tree.nodes:
-                        if node.type == 'MAPPING':
 
-                            new_scale = (20.0, 20.0, 20.0)
+        for node in mat.node_tree.nodes:
+            if node.type == 'MAPPING':
 
-                            node.inputs['Scale'].default_value = new_scale
-                            print(f"Updated Mapping node '{node.name}' scale to {new_scale}")
+                new_scale = (20.0, 20.0, 20.0)
 
+                node.inputs['Scale'].default_value = new_scale
+                print(f"Updated Mapping node '{node.name}' scale to {new_scale}")
 
-                    if mat is not None:
-                         if obj.data.materials:
-                            obj.data.materials[0] = mat
-                         else:
-                            obj.data.materials.append(mat)
-                    else:
-                        print("Material not found in Blender data.")
-                else:
-                    print("Failed to load material model from URL.")
+        if mat is None:
+            print("Material not found in Blender data.")
+    else:
+        print("Failed to load material model from URL.")
 
-                bpy.ops.object.delete(use_global=False)
+    if deferred:
+        bpy.data.batch_remove(imported_objects)
     else:
-        material = bpy.data.materials.new(name="CustomColorMaterial")
+        bpy.ops.object.delete(use_global=False)
 
-        material.use_nodes = True
-        material.use_backface_culling = True
+    if mat is not None:
+        urlMaterialCache[url] = mat
+    return mat
+
+
+def getKvadratMaterial(entity) :
+    # Returns the material for a kvadrat surface, or None if it has none
+    if "kv-material" in entity["c"] :
+        kv_material = entity["c"]["kv-material"]
+        # Check if the material has a color code
+        if "colorCode" in kv_material:
+            print("Material color code:", kv_material["colorCode"])
+            return createColorMaterial(kv_material["colorCode"])
 
-        # Step 2: Set the base color to #D0CCC4
-        hex_color = "#BBBBBB"
-        rgb = tuple(int(hex_color[i:i+2], 16)/255 for i in (1, 3, 5))
-        bsdf = material.node_tree.nodes.get("Principled BSDF")
-        bsdf.inputs['Base Color'].default_value = (*rgb, 1)
-        # RGBA
+        elif "url" in kv_material:
+            if kv_material["url"] != "":
+                return loadUrlMaterial(kv_material["url"])
+        return None
+
+    return createColorMaterial("#BBBBBB")
+
+
+def setKvadratMaterial(obj, entity) :
+    material = getKvadratMaterial(entity)
+    if material is not None:
         if obj.data.materials:
             obj.data.materials[0] = material
         else:
             obj.data.materials.append(material)
 
 
+def getPlanarUVs(topology, surfaceIndex):
+    # UVs in the plane of the surface, scaled to fit 0..1 the way unwrapping a
+    # single face does
+    frame = RoomTopology.getSurfaceFrame(topology, surfaceIndex)
+    coords = [RoomTopology.projectOnSurface(topology, surfaceIndex, p, frame)
+              for p in RoomTopology.getSurfacePoints(topology, surfaceIndex)]
+
+    minU = min(c[0] for c in coords)
+    minV = min(c[1] for c in coords)
+    size = max(max(c[0] for c in coords) - minU, max(c[1] for c in coords) - minV) or 1
+    return [((c[0] - minU)/size, (c[1] - minV)/size) for c in coords]
+
+
+def create_shell_mesh(name, topology, surfaceIndices):
+    # One welded mesh for the given surfaces, each corner vertex once and one
+    # material slot per surface
+    cornerMap = {}
+    verts = []
+    faces = []
+    for surfaceIndex in surfaceIndices:
+        face = []
+        for corner in topology["surfaces"][surfaceIndex]["corners"]:
+            if corner not in cornerMap:
+                cornerMap[corner] = len(verts)
+                verts.append(topology["corners"][corner])
+            face.append(cornerMap[corner])
+        faces.append(face)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(verts, [], faces)
+
+    uv_layer = mesh.uv_layers.new(name="UVMap")
+    for polygon, surfaceIndex in zip(mesh.polygons, surfaceIndices):
+        uvs = getPlanarUVs(topology, surfaceIndex)
+        for loop_index, uv in zip(polygon.loop_indices, uvs):
+            uv_layer.data[loop_index].uv = uv
+
+    for polygon, surfaceIndex in zip(mesh.polygons, surfaceIndices):
+        material = getKvadratMaterial(topology["surfaces"][surfaceIndex]["entity"])
+        mesh.materials.append(material)
+        polygon.material_index = len(mesh.materials) - 1
+
+    mesh.update()
+    return mesh
+
+
+def create_room_shell(topology, separateWalls=False):
+    # Builds the room from the shared topology. Returns the created objects.
+    if separateWalls:
+        groups = [[i] for i in range(len(topology["surfaces"]))]
+    else:
+        groups = [list(range(len(topology["surfaces"])))]
+
+    objects = []
+    for surfaceIndices in groups:
+        if separateWalls:
+            surface = topology["surfaces"][surfaceIndices[0]]
+            name = surface["id"]
+        else:
+            name = "room-shell"
+
+        mesh = create_shell_mesh(name, topology, surfaceIndices)
+        obj = bpy.data.objects.new(name+"-col", mesh)
+        if separateWalls:
+            obj["vpcEntityId"] = surface["entityId"]
+            obj["vpcSurfaceId"] = surface["id"]
+
+        moveToCollection(obj, "Room")
+        objects.append(obj)
+
+    return objects
+
+
+def addBooleanModifier(roomSurface):
+    # Cutting hole in the walls. 
+    if bpy.data.collections.get("BooleanCollection") is not None:
+        bool_mod = roomSurface.modifiers.new(name="Boolean", type='BOOLEAN')
+        bool_mod.operation = 'DIFFERENCE'
+        bool_mod.solver = 'EXACT'
+        bool_mod.use_self = False
+        bool_mod.use_hole_tolerant = False
+        bool_mod.material_mode = 'INDEX'
+        bool_mod.operand_type = 'COLLECTION'
+        bool_mod.collection = bpy.data.collections["BooleanCollection"]        
+
+
 # Apply visibility settings to a LayerCollection and all its children
 def apply_visibility_recursive(layer_coll):
     #layer_coll.exclude = True
@@ -209,6 +351,9 @@ def apply_visibility_recursive(layer_coll):
     for child in layer_coll.children:
         apply_visibility_recursive(child)
 
+def getKvadratRotation(trans):
+    return Quaternion((trans["r"]["w"], trans["r"]["x"], trans["r"]["z"], trans["r"]["y"]))
+
 def rotateActiveObject(trans):
     if "r" in trans:
         # Define the quaternion
@@ -300,7 +445,62 @@ def formatTransform(transform):
 
 
     
-def build(json_response, generateRoom=True, generateCollisionWalls=False):
+def getOpeningNodeGroup():
+    node_group = bpy.data.node_groups.get("VertOffGeo")
+    if node_group is None:
+        raise ValueError("Node group 'VertOffGeo' not found.")
+    return node_group
+
+
+def addOpeningModifier(obj, kvSize, depth):
+    modifier = obj.modifiers.new(name="VertOffGeo", type='NODES')
+    if not modifier:
+        raise ValueError("Modifier 'VertOffGeo' not found.")
+    modifier.node_group = getOpeningNodeGroup()
+
+    # Set values using known input identifiers
+    modifier["Socket_2"] = kvSize["X"]/1000 # x_size_in_m
+    modifier["Socket_4"] = kvSize["Y"]/1000# y_size_in_m
+    modifier["Socket_3"] = depth # z_size_in_m
+    return modifier
+
+
+def createLiveOpening(original, kvSize):
+    # Duplicate of the template with its own Geometry Nodes modifier
+    clone = original.copy()
+    clone.data = original.data.copy()
+    bpy.context.collection.objects.link(clone)
+    addOpeningModifier(clone, kvSize, OPENING_DEPTH)
+    return clone
+
+
+def getOpeningMesh(original, ref, kvSize, depth):
+    key = (ref, kvSize["X"], kvSize["Y"], depth)
+    if key in openingMeshCache:
+        mesh = openingMeshCache[key]
+        if LoadSession.isAlive(mesh):
+            return mesh
+        # Removed since it was cached
+        del openingMeshCache[key]
+
+    # Evaluating the node group once on a temporary copy and keeping the result as a static mesh
+    temp = original.copy()
+    temp.hide_viewport = False
+    bpy.context.scene.collection.objects.link(temp)
+    addOpeningModifier(temp, kvSize, depth)
+
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    mesh = bpy.data.meshes.new_from_object(temp.evaluated_get(depsgraph))
+    mesh.name = "%s-%dx%d" % (original.name, kvSize["X"], kvSize["Y"])
+
+    bpy.data.objects.remove(temp)
+
+    openingMeshCache[key] = mesh
+    return mesh
+
+
+def build(json_response, generateRoom=True, generateCollisionWalls=False, liveOpeningModifiers=False,
+          weldRoomShell=False, separateWalls=False):
     entities = json_response["configuration"]["content"]["entities"]
 
     hashedKvadratObject = {}
@@ -329,36 +529,45 @@ def build(json_response, generateRoom=True, generateCollisionWalls=False):
 
     if ( bpy.data.objects.get("room-window-2") is None or bpy.data.objects.get("room-door-2") is None or bpy.data.node_groups.get("VertOffGeo") is None):
         print("Required objects or node group not found to generate proportional windows and doors.")
+        cutters = []
         for door in hashedKvObjects:
             kvSize = hashedKvObjects[door]["c"]["kv-parametric-object"]["size"]
-            p = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])["p"]
-
-            bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(p["x"]/1000, -p["z"]/1000, p["y"]/1000), scale=(kvSize["X"]/1000, 0.22, kvSize["Y"]/1000))
-
             trans = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])
-            rotateActiveObject(trans)
-            setMaterialOnActiveObject()
-            # Adding the cube to the 
-            moveToCollection(bpy.context.object, "BooleanCollection")
-                
-            #bpy.context.object.hide_viewport = True
-            bpy.context.object.hide_render = True
+            p = trans["p"]
+
+            cutters.append({
+                "name": "cutter-" + door,
+                "location": (p["x"]/1000, -p["z"]/1000, p["y"]/1000),
+                "rotation": getKvadratRotation(trans),
+                "scale": (kvSize["X"]/1000, 0.22, kvSize["Y"]/1000),
+                "hide_render": True,
+            })
+
+        # Adding the cubes to the boolean collection
+        BulkBuilder.createBoxes(cutters, "BooleanCollection")
     else :
+        cutters = []
         for door in hashedKvObjects:
             kvSize = hashedKvObjects[door]["c"]["kv-parametric-object"]["size"]
-            p = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])["p"]
+            trans = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])
+            p = trans["p"]
 
-            bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(p["x"]/1000, (-p["z"]/1000), 0.0005+p["y"]/1000), scale=(kvSize["X"]/1000, 0.444, kvSize["Y"]/1000))
+            cutters.append({
+                "name": "cutter-" + door,
+                "location": (p["x"]/1000, (-p["z"]/1000), 0.0005+p["y"]/1000),
+                "rotation": getKvadratRotation(trans),
+                "scale": (kvSize["X"]/1000, 0.444, kvSize["Y"]/1000),
+                "hide_viewport": True,
+                "hide_render": True,
+            })
+
+        # Adding the cubes to the boolean collection
+        BulkBuilder.createBoxes(cutters, "BooleanCollection")
+
+        for door in hashedKvObjects:
+            kvSize = hashedKvObjects[door]["c"]["kv-parametric-object"]["size"]
+            p = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])["p"]
 
-            trans = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])
-            rotateActiveObject(trans)
-            setMaterialOnActiveObject()
-            # Adding the cube to the 
-            moveToCollection(bpy.context.object, "BooleanCollection")
-                
-            bpy.context.object.hide_viewport = True
-            bpy.context.object.hide_render = True
-            
             if "ref" in hashedKvObjects[door] and hashedKvObjects[door]["ref"] == "kvadrat-window":
                 original = bpy.data.objects.get("room-window-2")
             elif "ref" in hashedKvObjects[door] and hashedKvObjects[door]["ref"] == "kvadrat-door":
@@ -369,27 +578,14 @@ def build(json_response, generateRoom=True, generateCollisionWalls=False):
             if original is None:
                 raise ValueError("Object named 'window' not found.")
 
-            # Step 2: Duplicate the object
-            clone = original.copy()
-            clone.data = original.data.copy()
-            bpy.context.collection.objects.link(clone)
-
-            # Step 3: Add the Geometry Nodes modifier to the clone
-            modifier = clone.modifiers.new(name="VertOffGeo", type='NODES')
-            if not modifier:
-                raise ValueError("Modifier 'VertOffGeo' not found.")
-
-
-            # Step 4: Assign the node group (make sure it exists in your file)
-            node_group = bpy.data.node_groups.get("VertOffGeo")
-            if node_group is None:
-                raise ValueError("Node group 'VertOffGeo' not found.")
-            modifier.node_group = node_group
-
-            # Set values using known input identifiers
-            modifier["Socket_2"] = kvSize["X"]/1000 # x_size_in_m
-            modifier["Socket_4"] = kvSize["Y"]/1000# y_size_in_m
-            modifier["Socket_3"] = 0.03 # z_size_in_m
+            if liveOpeningModifiers:
+                clone = createLiveOpening(original, kvSize)
+            else:
+                # Every opening with the same type and size shares one evaluated mesh
+                clone = original.copy()
+                clone.modifiers.clear()
+                clone.data = getOpeningMesh(original, hashedKvObjects[door].get("ref", ""), kvSize, OPENING_DEPTH)
+                bpy.context.collection.objects.link(clone)
 
             trans = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])
             
@@ -405,39 +601,42 @@ def build(json_response, generateRoom=True, generateCollisionWalls=False):
             moveToCollection(clone, "Room")
         
         
-    for surface in hashedKvadratSurfaces:
-        points = []
-        for point in hashedKvadratSurfaces[surface]["c"]["kv-surface"]["cornerPersistentIds"]:
-            p = formatTransform(hashedKvadratObject[point]["c"]["WorldTransformComponent"])["p"]
-            points.append(p)
-
-        roomSurface = create_surface(surface, points, False, generateCollisionWalls)
-
-        moveToCollection(roomSurface, "Room")
-
-        setKvadratMaterial(roomSurface, hashedKvadratSurfaces[surface])
-
-
-        # Add Boolean modifier to the first cube
-        # Cutting hole in the walls. 
-        if bpy.data.collections["BooleanCollection"] is not None:
-            bool_mod = roomSurface.modifiers.new(name="Boolean", type='BOOLEAN')
-            bool_mod.operation = 'DIFFERENCE'
-            bool_mod.solver = 'EXACT'
-            bool_mod.use_self = False
-            bool_mod.use_hole_tolerant = False
-            bool_mod.material_mode = 'INDEX'
-            bool_mod.operand_type = 'COLLECTION'
-            bool_mod.collection = bpy.data.collections["BooleanCollection"]        
-        
+    if weldRoomShell and not generateCollisionWalls:
+        # One welded mesh from the shared corner topology.
+        # Collision walls extrude every surface on its own, so they keep the per surface path.
+        topology = RoomTopology.buildTopology(entities)
+        for roomSurface in create_room_shell(topology, separateWalls):
+            addBooleanModifier(roomSurface)
+    else:
+        for surface in hashedKvadratSurfaces:
+            points = []
+            for point in hashedKvadratSurfaces[surface]["c"]["kv-surface"]["cornerPersistentIds"]:
+                p = formatTransform(hashedKvadratObject[point]["c"]["WorldTransformComponent"])["p"]
+                points.append(p)
+
+            roomSurface = create_surface(surface, points, False, generateCollisionWalls)
+            roomSurface["vpcEntityId"] = hashedKvadratSurfaces[surface].get("id", "")
+            roomSurface["vpcSurfaceId"] = surface
 
+            moveToCollection(roomSurface, "Room")
+
+            setKvadratMaterial(roomSurface, hashedKvadratSurfaces[surface])
+
+            # Add Boolean modifier to the first cube
+            addBooleanModifier(roomSurface)
+
+    obstacles = []
     for obs in hashedKvObsticles:
         kvSize = obs["c"]["params"]["size"]
-        p = formatTransform(obs["c"]["WorldTransformComponent"])["p"]
+        trans = formatTransform(obs["c"]["WorldTransformComponent"])
+        p = trans["p"]
+
+        obstacles.append({
+            "name": "obstacle-" + obs["id"],
+            "location": (p["x"]/1000, -p["z"]/1000, p["y"]/1000),
+            "rotation": getKvadratRotation(trans),
+            "scale": (kvSize["depth"]/1000, kvSize["width"]/1000, kvSize["height"]/1000),
+        })
 
-        bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(p["x"]/1000, -p["z"]/1000, p["y"]/1000), scale=(kvSize["depth"]/1000, kvSize["width"]/1000, kvSize["height"]/1000))
-        trans = formatTransform(hashedKvObjects[door]["c"]["WorldTransformComponent"])
-        rotateActiveObject(trans)
-        setMaterialOnActiveObject()
+    BulkBuilder.createBoxes(obstacles, "Room")
 
-        moveToCollection(bpy.context.object, "Room")
@@ -0,0 +1,161 @@
+# Room topology index built from the kvadrat entities of a VPC.
+#
+# Every corner (kv-id referenced from kv-surface cornerPersistentIds) is stored
+# once, surfaces refer to corners by index. Positions are in Blender space
+# (meters, Z-up), the same as RoomBuilder2025.create_surface uses.
+#
+# Doesn't need bpy, later stages (collision proxies, region loading, placement
+# validation) use it as the spatial model of the room.
+
+import math
+
+
+def getCornerPosition(entity):
+    p = {}
+    if "c" in entity and "WorldTransformComponent" in entity["c"]:
+        p = entity["c"]["WorldTransformComponent"].get("p", {})
+    return (p.get("x", 0)/1000, -p.get("z", 0)/1000, p.get("y", 0)/1000)
+
+
+def getSurfaceKind(entity):
+    if "kv-wall" in entity["c"]:
+        return "wall"
+    if "kv-floor" in entity["c"]:
+        return "floor"
+    if "kv-ceiling" in entity["c"]:
+        return "ceiling"
+    return "surface"
+
+
+def buildTopology(entities):
+    hashedKvadratObject = {}
+    for entity in entities:
+        if "c" in entity and "kv-id" in entity["c"]:
+            hashedKvadratObject[entity["c"]["kv-id"]["id"]] = entity
+
+    topology = {
+        "corners": [],          # [(x, y, z)]
+        "cornerIds": [],        # kv-id per corner
+        "cornerSurfaces": [],   # surface indices per corner
+        "surfaces": [],
+        "surfaceIndex": {},     # kv-id -> surface index
+    }
+    cornerIndex = {}
+
+    for entity in entities:
+        if "c" not in entity or "kv-surface" not in entity["c"]:
+            continue
+
+        corners = []
+        for cornerId in entity["c"]["kv-surface"]["cornerPersistentIds"]:
+            if cornerId not in hashedKvadratObject:
+                print("Corner not found in configuration:", cornerId)
+                continue
+            if cornerId not in cornerIndex:
+                cornerIndex[cornerId] = len(topology["corners"])
+                topology["corners"].append(getCornerPosition(hashedKvadratObject[cornerId]))
+                topology["cornerIds"].append(cornerId)
+                topology["cornerSurfaces"].append([])
+            corners.append(cornerIndex[cornerId])
+
+        if len(corners) < 3:
+            continue
+
+        surfaceId = entity["c"]["kv-id"]["id"]
+        surfaceIndex = len(topology["surfaces"])
+        topology["surfaceIndex"][surfaceId] = surfaceIndex
+        topology["surfaces"].append({
+            "id": surfaceId,
+            "entityId": entity.get("id", ""),
+            "kind": getSurfaceKind(entity),
+            "corners": corners,
+            "entity": entity,
+            "neighbours": [],
+        })
+
+        for corner in corners:
+            topology["cornerSurfaces"][corner].append(surfaceIndex)
+
+    # Surfaces sharing an edge (two consecutive corners) are neighbours
+    edgeSurfaces = {}
+    for surfaceIndex, surface in enumerate(topology["surfaces"]):
+        corners = surface["corners"]
+        for i in range(len(corners)):
+            edge = tuple(sorted((corners[i], corners[(i + 1) % len(corners)])))
+            edgeSurfaces.setdefault(edge, []).append(surfaceIndex)
+
+    for shared in edgeSurfaces.values():
+        for a in shared:
+            for b in shared:
+                if a != b and b not in topology["surfaces"][a]["neighbours"]:
+                    topology["surfaces"][a]["neighbours"].append(b)
+
+    return topology
+
+
+def getSurfacePoints(topology, surfaceIndex):
+    return [topology["corners"][i] for i in topology["surfaces"][surfaceIndex]["corners"]]
+
+
+def getSurfaceNormal(topology, surfaceIndex):
+    # Newell's method, follows the corner winding like the face create_surface makes
+    points = getSurfacePoints(topology, surfaceIndex)
+    nx = ny = nz = 0.0
+    for i in range(len(points)):
+        x1, y1, z1 = points[i]
+        x2, y2, z2 = points[(i + 1) % len(points)]
+        nx += (y1 - y2) * (z1 + z2)
+        ny += (z1 - z2) * (x1 + x2)
+        nz += (x1 - x2) * (y1 + y2)
+    length = math.sqrt(nx * nx + ny * ny + nz * nz) or 1
+    return (nx / length, ny / length, nz / length)
+
+
+def getSurfaceCenter(topology, surfaceIndex):
+    points = getSurfacePoints(topology, surfaceIndex)
+    return tuple(sum(p[i] for p in points) / len(points) for i in range(3))
+
+
+def getPointsBounds(points):
+    low = tuple(min(p[i] for p in points) for i in range(3))
+    high = tuple(max(p[i] for p in points) for i in range(3))
+    return low, high
+
+
+def getSurfaceBounds(topology, surfaceIndex):
+    return getPointsBounds(getSurfacePoints(topology, surfaceIndex))
+
+
+def getRoomBounds(topology):
+    if len(topology["corners"]) == 0:
+        return None
+    return getPointsBounds(topology["corners"])
+
+
+def getSurfaceFrame(topology, surfaceIndex):
+    # Orthonormal (u, v, normal) frame on the surface plane, u along the first edge.
+    # Returns origin (first corner), u, v and the normal.
+    points = getSurfacePoints(topology, surfaceIndex)
+    normal = getSurfaceNormal(topology, surfaceIndex)
+
+    origin = points[0]
+    edge = [points[1][i] - origin[i] for i in range(3)]
+    length = math.sqrt(sum(e * e for e in edge)) or 1
+    u = tuple(e / length for e in edge)
+    v = (
+        normal[1] * u[2] - normal[2] * u[1],
+        normal[2] * u[0] - normal[0] * u[2],
+        normal[0] * u[1] - normal[1] * u[0],
+    )
+    return origin, u, v, normal
+
+
+def projectOnSurface(topology, surfaceIndex, point, frame=None):
+    # Point in surface coordinates (u, v, distance along the normal)
+    origin, u, v, normal = frame or getSurfaceFrame(topology, surfaceIndex)
+    d = [point[i] - origin[i] for i in range(3)]
+    return (
+        sum(d[i] * u[i] for i in range(3)),
+        sum(d[i] * v[i] for i in range(3)),
+        sum(d[i] * normal[i] for i in range(3)),
+    )
@@ -0,0 +1,155 @@
+# Build time of the operator based and the deferred scene build by entity count.
+#
+# The products of a configuration are repeated (shifted along x) until there are
+# <count> of them, the room stays as it is. Every count is built both ways into an
+# empty scene, after one warm-up build so downloads and the model cache don't count:
+#
+#   blender -b --python-expr "from vpcloader import SceneBuildBenchmark; SceneBuildBenchmark.main()" \
+#       -- --vpc V3TMF8 --catalog catalog.json --counts 25,50,100,200,400 --report benchmark.json
+#
+# Measured on V3TMF8 (bpy 4.2 module, models from the local cache, no network):
+#
+#   entities  operators s  deferred s  speedup  operators ms/e  deferred ms/e
+#         25         1.04        0.39     2.67            41.6           15.6
+#         50         1.38        1.61     0.86            27.6           32.2
+#        100         3.70        3.20     1.16            37.0           32.0
+#        200        28.33       17.93     1.58           141.7           89.7
+#        400       111.86       57.87     1.93           279.7          144.7
+#
+# Both builds grow worse than linear past 100 entities: from 200 to 400 the operator
+# build takes 3.9x as long, the deferred one 3.2x. At 800 the process ran out of memory
+# on a 5 GB machine after the warm-up build (160.58 s deferred).
+
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+import bpy
+
+from . import CatalogUtils
+from . import DEXF
+from . import LoadSession
+
+# Distance between the copies of the configuration products, in millimeters like the VPC
+COPY_SPACING = 3000
+
+MODES = (("operators", False), ("deferred", True))
+
+
+def isProductEntity(entity, hashedCatalogProducts):
+    ref = entity.get("ref", "")
+    return ref in hashedCatalogProducts and CatalogUtils.has3DModel(hashedCatalogProducts[ref])
+
+
+def getScaledConfiguration(vpcJSON, hashedCatalogProducts, count):
+    # Same room, products repeated until there are count of them
+    scaled = copy.deepcopy(vpcJSON)
+    entities = scaled["configuration"]["content"]["entities"]
+    products = [entity for entity in entities if isProductEntity(entity, hashedCatalogProducts)]
+    if len(products) == 0:
+        raise ValueError("The configuration has no products with models")
+
+    others = [entity for entity in entities if not isProductEntity(entity, hashedCatalogProducts)]
+    copies = []
+    for i in range(count):
+        entity = copy.deepcopy(products[i % len(products)])
+        n = i // len(products)
+        if n > 0:
+            entity["id"] = "%s-copy%d" % (entity["id"], n)
+            transform = entity.setdefault("c", {}).setdefault("WorldTransformComponent", {})
+            position = transform.setdefault("p", {})
+            position["x"] = position.get("x", 0) + n * COPY_SPACING
+        copies.append(entity)
+
+    scaled["configuration"]["content"]["entities"] = others + copies
+    return scaled
+
+
+def resetScene():
+    LoadSession.clearPrevious(bpy.context, keepLibraryData=False)
+    for name in ("Products", "Room", "BooleanCollection", "Collision", "Placeholders", "Prototypes"):
+        collection = bpy.data.collections.get(name)
+        if collection is not None:
+            bpy.data.batch_remove(list(collection.objects) + [collection])
+    bpy.data.orphans_purge(do_recursive=True)
+
+
+def timeBuild(vpcPath, deferred):
+    resetScene()
+
+    rexTool = bpy.context.scene.rexTool
+    rexTool.vpcFile = vpcPath
+    rexTool.deferredSceneBuild = deferred
+    rexTool.clearPreviousLoad = False
+    rexTool.useBuildCache = False
+
+    start = time.perf_counter()
+    result = bpy.ops.object.rex_load_vpc_operator()
+    seconds = time.perf_counter() - start
+    if 'FINISHED' not in result:
+        raise RuntimeError("Load VPC failed: " + str(result))
+    return seconds
+
+
+def run(vpcJSON, catalogPath, counts):
+    hashedCatalogProducts = CatalogUtils.loadCatalog(catalogPath)
+    bpy.context.scene.rexTool.catalogPath = catalogPath
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmpDir:
+        for count in counts:
+            vpcPath = os.path.join(tmpDir, "benchmark-%d.json" % count)
+            with open(vpcPath, 'w') as json_file:
+                json.dump(getScaledConfiguration(vpcJSON, hashedCatalogProducts, count), json_file)
+
+            if len(results) == 0:
+                # Warm-up, fills the model cache and the catalog memo
+                timeBuild(vpcPath, True)
+
+            row = {"entities": count}
+            for name, deferred in MODES:
+                row[name] = round(timeBuild(vpcPath, deferred), 3)
+            row["speedup"] = round(row["operators"] / row["deferred"], 2) if row["deferred"] > 0 else None
+            results.append(row)
+            print("Entities %6d: operators %8.2f s, deferred %8.2f s" % (count, row["operators"], row["deferred"]))
+
+    resetScene()
+    return results
+
+
+def printResults(results):
+    print("%8s %12s %12s %8s %16s %16s" % ("entities", "operators s", "deferred s", "speedup",
+                                          "operators ms/e", "deferred ms/e"))
+    for row in results:
+        print("%8d %12.2f %12.2f %8s %16.1f %16.1f" % (
+            row["entities"], row["operators"], row["deferred"], row["speedup"],
+            1000 * row["operators"] / row["entities"], 1000 * row["deferred"] / row["entities"]))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="Compare the operator based and the deferred scene build")
+    parser.add_argument("--vpc", required=True, help="VPC code or saved VPC json")
+    parser.add_argument("--catalog", required=True, help="Path to catalog.json")
+    parser.add_argument("--counts", default="25,50,100,200,400", help="Comma separated product entity counts")
+    parser.add_argument("--report", default=None, help="Where to write the results json")
+    args = parser.parse_args(argv)
+
+    if not hasattr(bpy.types.Scene, "rexTool"):
+        from .VPCLoaderPanel import register
+        register()
+
+    counts = [int(count) for count in args.counts.split(",") if count]
+    results = run(DEXF.loadVPC(args.vpc), os.path.abspath(args.catalog), counts)
+    printResults(results)
+
+    if args.report:
+        with open(args.report, 'w') as json_file:
+            json.dump({"vpc": args.vpc, "results": results}, json_file, indent=2)
+    return 0
@@ -0,0 +1,292 @@
+# Scene construction without operators in between.
+#
+# Every selection change, active object switch and object operator makes Blender
+# update the view layer, and each of those updates gets slower as the scene
+# grows, so building object by object costs more than linear in the entity count.
+# Inside a SceneBuildContext the loader creates objects, meshes, collection links
+# and modifiers through bpy.data only, and the view layer is updated once on exit:
+#
+#   with SceneBuildContext.SceneBuildContext():
+#       ... create objects ...
+#   # matrix_world, bound_box and modifiers are evaluated from here on
+#
+# The glTF importer is still an operator. Imports go into a staging collection so
+# the new objects are found without reading the selection, and the imported
+# meshes are joined from their arrays instead of with object.join.
+
+import time
+
+import bpy
+import numpy as np
+from mathutils import Matrix
+
+from . import LoadSession
+from . import RexUtils
+
+STAGING_COLLECTION_NAME = "vpc-import"
+
+# The context being built in, None outside of one
+current = None
+
+
+def isDeferred():
+    return current is not None and current.deferred
+
+
+class SceneBuildContext:
+    def __init__(self, deferred=True):
+        # deferred=False keeps the operator based build, for comparing the two
+        self.deferred = deferred
+        self.imports = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        global current
+        self.previous = current
+        current = self
+        self.start = time.perf_counter()
+
+        self.staging = None
+        if self.deferred:
+            # The importer selects what it creates and makes it active, that gets put back on exit
+            view_layer = bpy.context.view_layer
+            self.active = view_layer.objects.active
+            self.selected = list(bpy.context.selected_objects)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global current
+        current = self.previous
+
+        if self.deferred:
+            self.removeStaging()
+            self.restoreSelection()
+
+            # The only view layer update of the build
+            bpy.context.view_layer.update()
+
+        self.seconds = time.perf_counter() - self.start
+        print("Scene build: %.2f s, %d imports, %s" % (self.seconds, self.imports,
+              "deferred, 1 view layer update" if self.deferred else "operators"))
+        return False
+
+    def getStaging(self):
+        if self.staging is None:
+            self.staging = bpy.data.collections.new(STAGING_COLLECTION_NAME)
+            bpy.context.scene.collection.children.link(self.staging)
+        return self.staging
+
+    def removeStaging(self):
+        if self.staging is None:
+            return
+
+        # Anything still staged ends up where the importer would have put it
+        target = bpy.context.collection
+        for obj in list(self.staging.objects):
+            if target != self.staging and obj.name not in target.objects:
+                target.objects.link(obj)
+        bpy.data.collections.remove(self.staging)
+        self.staging = None
+
+    def restoreSelection(self):
+        view_layer = bpy.context.view_layer
+        for obj in bpy.context.selected_objects:
+            obj.select_set(False)
+        for obj in self.selected:
+            # Skipping what was removed during the build
+            if LoadSession.isAlive(obj) and obj.name in view_layer.objects:
+                obj.select_set(True)
+        if self.active is None or LoadSession.isAlive(self.active):
+            view_layer.objects.active = self.active
+        else:
+            view_layer.objects.active = None
+
+    def importObjects(self, filepath):
+        # Imports a glTF file into the staging collection and returns the new objects
+        staging = self.getStaging()
+        view_layer = bpy.context.view_layer
+        previous = view_layer.active_layer_collection
+
+        view_layer.active_layer_collection = view_layer.layer_collection.children[staging.name]
+        try:
+            bpy.ops.import_scene.gltf(filepath=filepath)
+        finally:
+            view_layer.active_layer_collection = previous
+
+        self.imports += 1
+        imported = list(staging.objects)
+        for obj in imported:
+            staging.objects.unlink(obj)
+        return imported
+
+
+def canJoinArrays(meshes):
+    # Colors and shape keys are left to object.join
+    for mesh in meshes:
+        if mesh.shape_keys is not None or len(mesh.color_attributes) > 0:
+            return False
+    return True
+
+
+def getMaterials(obj):
+    return [slot.material for slot in obj.material_slots] or [None]
+
+
+def getLoopOrder(loopStarts, loopTotals, flip):
+    # Loop indices, each polygon reversed when the object is mirrored (like transform_apply does)
+    loopCount = int(np.sum(loopTotals))
+    if not flip:
+        return np.arange(loopCount)
+    polygonOfLoop = np.repeat(np.arange(len(loopTotals)), loopTotals)
+    return 2 * loopStarts[polygonOfLoop] + loopTotals[polygonOfLoop] - 1 - np.arange(loopCount)
+
+
+def getWorldMatrix(obj):
+    # From the parent chain, the imported objects haven't been evaluated yet
+    if obj.parent is None:
+        return obj.matrix_basis.copy()
+    return getWorldMatrix(obj.parent) @ obj.matrix_parent_inverse @ obj.matrix_basis
+
+
+def getObjectArrays(obj, materials, uvNames):
+    mesh = obj.data
+    matrix = np.array(getWorldMatrix(obj))
+    flip = np.linalg.det(matrix[:3, :3]) < 0
+
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loopTotals)
+    loopStarts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loopStarts)
+    order = getLoopOrder(loopStarts, loopTotals, flip)
+
+    loopVertices = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loopVertices)
+
+    # Slot index on this object -> slot index on the joined mesh
+    slotMap = np.array([materials.index(m) for m in getMaterials(obj)], dtype=np.int32)
+    materialIndices = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("material_index", materialIndices)
+    materialIndices = slotMap[np.clip(materialIndices, 0, len(slotMap) - 1)]
+
+    smooth = np.empty(len(mesh.polygons), dtype=bool)
+    mesh.polygons.foreach_get("use_smooth", smooth)
+
+    uvs = {}
+    for name in uvNames:
+        uv = np.zeros(len(mesh.loops) * 2, dtype=np.float32)
+        if name in mesh.uv_layers:
+            mesh.uv_layers[name].data.foreach_get("uv", uv)
+        uvs[name] = uv.reshape(-1, 2)[order]
+
+    normals = RexUtils.getCornerNormals(mesh).reshape(-1, 3) @ np.linalg.inv(matrix[:3, :3])
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]
+
+    return {
+        "co": co,
+        "loopTotals": loopTotals,
+        "loopVertices": loopVertices[order],
+        "materialIndices": materialIndices,
+        "smooth": smooth,
+        "uvs": uvs,
+        "normals": normals[order],
+        "customNormals": mesh.has_custom_normals,
+    }
+
+
+def joinMeshObjects(objects, name):
+    # Same result as selecting the objects, object.join, parent_clear(CLEAR_KEEP_TRANSFORM)
+    # and transform_apply, built from the mesh arrays. Returns a new mesh.
+    materials = []
+    for obj in objects:
+        for material in getMaterials(obj):
+            if material not in materials:
+                materials.append(material)
+
+    uvNames = []
+    for obj in objects:
+        for layer in obj.data.uv_layers:
+            if layer.name not in uvNames:
+                uvNames.append(layer.name)
+
+    parts = [getObjectArrays(obj, materials, uvNames) for obj in objects]
+
+    vertexOffsets = np.cumsum([0] + [len(part["co"]) for part in parts])[:-1]
+    loopTotals = np.concatenate([part["loopTotals"] for part in parts])
+    loopStarts = np.concatenate(([0], np.cumsum(loopTotals)[:-1])).astype(np.int32)
+    loopVertices = np.concatenate([part["loopVertices"] + offset for part, offset in zip(parts, vertexOffsets)])
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add(sum(len(part["co"]) for part in parts))
+    mesh.vertices.foreach_set("co", np.concatenate([part["co"] for part in parts]).astype(np.float32).ravel())
+    mesh.loops.add(len(loopVertices))
+    mesh.loops.foreach_set("vertex_index", loopVertices.astype(np.int32))
+    mesh.polygons.add(len(loopTotals))
+    mesh.polygons.foreach_set("loop_start", loopStarts)
+    mesh.polygons.foreach_set("loop_total", loopTotals)
+    mesh.polygons.foreach_set("material_index", np.concatenate([part["materialIndices"] for part in parts]))
+    mesh.polygons.foreach_set("use_smooth", np.concatenate([part["smooth"] for part in parts]))
+
+    for uvName in uvNames:
+        uv = np.concatenate([part["uvs"][uvName] for part in parts]).ravel()
+        mesh.uv_layers.new(name=uvName).data.foreach_set("uv", uv)
+
+    if materials != [None]:
+        for material in materials:
+            mesh.materials.append(material)
+
+    mesh.update(calc_edges=True)
+    mesh.validate()
+
+    if any(part["customNormals"] for part in parts) and len(mesh.loops) == len(loopVertices):
+        normals = np.concatenate([part["normals"] for part in parts])
+        RexUtils.setCustomNormals(mesh, normals)
+
+    return mesh
+
+
+def importJoinedModel(filepath):
+    # Data API version of AssetLibrary.importJoinedModel: one object with identity
+    # transform, unlinked, or None when the file has no meshes
+    imported = current.importObjects(filepath)
+    loaded_meshes = [obj for obj in imported if obj.type == 'MESH']
+
+    joined = None
+    if len(loaded_meshes) > 0 and canJoinArrays([obj.data for obj in loaded_meshes]):
+        mesh = joinMeshObjects(loaded_meshes, loaded_meshes[0].data.name)
+        joined = bpy.data.objects.new(loaded_meshes[0].name, mesh)
+    elif len(loaded_meshes) > 0:
+        joined = joinWithOperators(loaded_meshes)
+
+    # object.join already removed the other meshes in the fallback
+    imported = [obj for obj in imported if LoadSession.isAlive(obj) and obj != joined]
+    sourceMeshes = set(obj.data for obj in imported if obj.type == 'MESH')
+    bpy.data.batch_remove(imported)
+    bpy.data.batch_remove([mesh for mesh in sourceMeshes if mesh.users == 0])
+    return joined
+
+
+def joinWithOperators(loaded_meshes):
+    # Fallback for meshes the array join doesn't cover, the objects need a view layer for it
+    staging = current.getStaging()
+    for obj in loaded_meshes:
+        staging.objects.link(obj)
+    world = getWorldMatrix(loaded_meshes[0])
+
+    # object.join reads the evaluated matrices of the other objects
+    bpy.context.view_layer.update()
+    with bpy.context.temp_override(active_object=loaded_meshes[0], selected_editable_objects=loaded_meshes,
+                                   selected_objects=loaded_meshes):
+        bpy.ops.object.join()
+
+    joined = loaded_meshes[0]
+    joined.parent = None
+    joined.data.transform(world)
+    if world.is_negative:
+        joined.data.flip_normals()
+    joined.matrix_world = Matrix.Identity(4)
+    staging.objects.unlink(joined)
+    return joined
@@ -0,0 +1,293 @@
+# Headless scene bundle exporter, writes the same scene_*.json + models/
+# layout as the explorer's exportSceneZip.js without a browser session.
+#
+#   python -m vpcloader.SceneBundleExport --catalog catalog.json --out dir [--optimize] CODE_OR_FILE [...]
+#
+# Exporting several configurations into the same folder shares one models/
+# directory between them, models are named by content hash.
+
+import argparse
+import datetime
+import glob
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import CatalogUtils
+from . import DEXF
+from . import GLBPreprocess
+from . import ModelCache
+from . import VPCUtilz
+
+# Bump when the optimized output changes, invalidates the web cache
+WEB_VERSION = 1
+
+
+def quatMultiply(a, b):
+    aw, ax, ay, az = a
+    bw, bx, by, bz = b
+    return (
+        aw * bw - ax * bx - ay * by - az * bz,
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+    )
+
+
+def quatRotate(q, v):
+    w, x, y, z = quatMultiply(quatMultiply(q, (0, v[0], v[1], v[2])), (q[0], -q[1], -q[2], -q[3]))
+    return (x, y, z)
+
+
+def eulerXYZToQuat(rotation):
+    # Blender XYZ euler, X applied first
+    def axisQuat(angle, axis):
+        s = math.sin(angle / 2)
+        return (math.cos(angle / 2), s * axis[0], s * axis[1], s * axis[2])
+
+    qx = axisQuat(rotation[0], (1, 0, 0))
+    qy = axisQuat(rotation[1], (0, 1, 0))
+    qz = axisQuat(rotation[2], (0, 0, 1))
+    return quatMultiply(qz, quatMultiply(qy, qx))
+
+
+def getNodeTransform(entity, catalogProduct):
+    # The transform the Blender loader gives a product (entity transform on top of
+    # the ModelTransformComponent), converted from Blender Z-up to three.js Y-up
+    wt = entity["worldTransform"]
+    entityLocation = (wt["x"], wt["z"], wt["y"])
+    entityRotation = (wt["qw"], wt["qx"], -wt["qz"], wt["qy"])
+
+    modelTransform = CatalogUtils.getModelTransformComponentData(catalogProduct)
+    modelRotation = eulerXYZToQuat(modelTransform["rotation"])
+
+    offset = quatRotate(entityRotation, modelTransform["position"])
+    x, y, z = (entityLocation[i] + offset[i] for i in range(3))
+    w, qx, qy, qz = quatMultiply(entityRotation, modelRotation)
+    sx, sy, sz = modelTransform["scale"]
+
+    return {
+        "position": [x, z, -y],
+        "quaternion": [qx, qz, -qy, w],
+        "scale": [sx, sz, sy],
+    }
+
+
+def optimizeModel(url):
+    # Runs in a worker process. Flattens and quantizes the model for web clients,
+    # models that can't be rewritten (e.g. Draco compressed) are used as they are.
+    srcPath = ModelCache.getLocalModelPath(url)
+    dstPath = os.path.join(ModelCache.getCacheDir("web"), ModelCache.hashKey(url, WEB_VERSION) + ".glb")
+    if os.path.exists(dstPath):
+        return dstPath
+
+    try:
+        GLBPreprocess.normalizeGLB(srcPath, dstPath, None, quantize=True)
+    except GLBPreprocess.UnsupportedGLBError as e:
+        print("Using original model for", url, "-", e)
+        return srcPath
+
+    # Never ship a rewrite that came out bigger than the original
+    if os.path.getsize(dstPath) >= os.path.getsize(srcPath):
+        shutil.copyfile(srcPath, dstPath)
+    return dstPath
+
+
+def getLocalModels(urls, optimize=False, workers=None):
+    # Returns {url: local path}, urls that fail are logged and left out
+    paths = {}
+    if not optimize:
+        for url in urls:
+            try:
+                paths[url] = ModelCache.getLocalModelPath(url)
+            except Exception as e:
+                print("Failed to prepare model:", url, e)
+        return paths
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = {pool.submit(optimizeModel, url): url for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                paths[url] = future.result()
+            except Exception as e:
+                print("Failed to prepare model:", url, e)
+    return paths
+
+
+# Bundle layout, also read by SceneBundleLoader
+
+def openBundle(path):
+    # Returns the folder holding the bundle, zips are extracted into the cache once
+    if os.path.isdir(path):
+        return path
+
+    stat = os.stat(path)
+    bundleDir = os.path.join(ModelCache.getCacheDir("bundles"), ModelCache.hashKey(os.path.abspath(path), stat.st_size, stat.st_mtime))
+    if not os.path.isdir(bundleDir):
+        tmpDir = bundleDir + ".part"
+        with zipfile.ZipFile(path) as zip_file:
+            zip_file.extractall(tmpDir)
+        os.replace(tmpDir, bundleDir)
+    return bundleDir
+
+
+def findSceneFile(bundleDir):
+    # The web exporter writes scene.json, saved bundles are named scene_<code>.json.
+    # Zips may also wrap everything in a top folder.
+    for pattern in ("scene.json", "scene_*.json", "*/scene.json", "*/scene_*.json"):
+        matches = sorted(glob.glob(os.path.join(bundleDir, pattern)))
+        if matches:
+            return matches[0]
+    return None
+
+
+def getAssetPath(sceneDir, asset):
+    # Scenes from this exporter name assets "models/<file>", the explorer's
+    # exportSceneZip.js only names the file and puts it in models/.
+    # Returns None when the asset isn't in the bundle.
+    for assetPath in (os.path.join(sceneDir, asset), os.path.join(sceneDir, "models", asset)):
+        if os.path.isfile(assetPath):
+            return assetPath
+    return None
+
+
+def writeModel(localPath, modelsDir):
+    # Content hash naming, identical files from different urls end up as one model
+    with open(localPath, 'rb') as file:
+        data = file.read()
+
+    fileName = hashlib.sha1(data).hexdigest()[:16] + os.path.splitext(localPath)[1]
+    targetPath = os.path.join(modelsDir, fileName)
+    if not os.path.exists(targetPath):
+        with open(targetPath + ".part", 'wb') as file:
+            file.write(data)
+        os.replace(targetPath + ".part", targetPath)
+    return fileName
+
+
+def buildSceneJSON(vpcJSON, hashedCatalogProducts, assetMap):
+    children = []
+    for entityJSON in vpcJSON["configuration"]["content"]["entities"]:
+        entity = VPCUtilz.convertJSONVPCObject(entityJSON)
+        ref = entity["ref"]
+        if ref == "noValue":
+            continue
+        if ref not in hashedCatalogProducts:
+            print("Reference not found in catalog:", ref)
+            continue
+
+        catalogProduct = hashedCatalogProducts[ref]
+        node = {
+            "name": "product:" + entity["id"],
+            "type": "Group",
+            "transform": getNodeTransform(entity, catalogProduct),
+            "userData": {
+                "entityId": entity["id"],
+                "catalogRef": ref,
+            },
+            "children": [],
+        }
+
+        modelPath = CatalogUtils.get3DModelPath(catalogProduct)
+        if modelPath != "":
+            if modelPath not in assetMap:
+                continue
+            node["asset"] = assetMap[modelPath]
+            node["assetOriginalUrl"] = modelPath
+
+        children.append(node)
+
+    return {
+        "version": 1,
+        "generator": "vpcloader-export",
+        "exportedAt": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "rootName": "Products",
+        "scene": {
+            "background": None,
+        },
+        "nodes": [{
+            "name": "Products",
+            "type": "Group",
+            "transform": {"position": [0, 0, 0], "quaternion": [0, 0, 0, 1], "scale": [1, 1, 1]},
+            "userData": {},
+            "children": children,
+        }],
+    }
+
+
+def collectModelUrls(vpcJSON, hashedCatalogProducts):
+    urls = set()
+    for entityJSON in vpcJSON["configuration"]["content"]["entities"]:
+        ref = entityJSON.get("ref", "")
+        if ref in hashedCatalogProducts:
+            modelPath = CatalogUtils.get3DModelPath(hashedCatalogProducts[ref])
+            if modelPath != "":
+                urls.add(modelPath)
+    return urls
+
+
+def exportBatch(configurations, hashedCatalogProducts, outDir, optimize=False, workers=None):
+    # configurations is a list of (name, vpcJSON). Writes scene_<name>.json for
+    # each one, all sharing outDir/models. Returns the written scene paths.
+    modelsDir = os.path.join(outDir, "models")
+    os.makedirs(modelsDir, exist_ok=True)
+
+    urls = set()
+    for name, vpcJSON in configurations:
+        urls.update(collectModelUrls(vpcJSON, hashedCatalogProducts))
+
+    localPaths = getLocalModels(sorted(urls), optimize, workers)
+
+    assetMap = {}
+    for url, localPath in localPaths.items():
+        assetMap[url] = "models/" + writeModel(localPath, modelsDir)
+
+    scenePaths = []
+    for name, vpcJSON in configurations:
+        sceneJSON = buildSceneJSON(vpcJSON, hashedCatalogProducts, assetMap)
+        scenePath = os.path.join(outDir, "scene_" + name + ".json")
+        with open(scenePath, 'w') as json_file:
+            json.dump(sceneJSON, json_file, indent=2)
+        scenePaths.append(scenePath)
+
+    print("Exported", len(scenePaths), "scenes with", len(set(assetMap.values())), "models to", outDir)
+    return scenePaths
+
+
+def exportSceneBundle(name, vpcJSON, hashedCatalogProducts, outDir, optimize=False, workers=None):
+    return exportBatch([(name, vpcJSON)], hashedCatalogProducts, outDir, optimize, workers)[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export VPC configurations as web scene bundles")
+    parser.add_argument("vpc", nargs="+", help="VPC codes or paths to VPC json files")
+    parser.add_argument("--catalog", required=True, help="Path to catalog.json")
+    parser.add_argument("--out", required=True, help="Output folder, models/ is shared by all scenes")
+    parser.add_argument("--optimize", action="store_true", help="Quantize vertex data and strip unused data")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes, defaults to all cores")
+    args = parser.parse_args(argv)
+
+    with open(args.catalog) as json_file:
+        catalogJSON = json.load(json_file)
+
+    hashedCatalogProducts = {}
+    for product in catalogJSON["products"]:
+        hashedCatalogProducts[product["id"]] = product
+
+    configurations = []
+    for source in args.vpc:
+        name = os.path.splitext(os.path.basename(source))[0] if os.path.isfile(source) else source
+        configurations.append((name, DEXF.loadVPC(source)))
+
+    exportBatch(configurations, hashedCatalogProducts, args.out, args.optimize, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import json
+import os
+
+import bpy
+from bpy_types import Operator
+from mathutils import Matrix, Quaternion, Vector
+
+from . import AssetLibrary
+from . import RoomBuilder2025
+from . import SceneBundleExport
+
+# The bundle transforms are three.js (Y-up), Blender is Z-up
+THREE_TO_BLENDER = Matrix((
+    (1, 0, 0, 0),
+    (0, 0, -1, 0),
+    (0, 1, 0, 0),
+    (0, 0, 0, 1),
+))
+
+
+def getNodeMatrix(node):
+    transform = node.get("transform", {})
+    position = transform.get("position", [0, 0, 0])
+    x, y, z, w = transform.get("quaternion", [0, 0, 0, 1])
+    scale = transform.get("scale", [1, 1, 1])
+    return Matrix.LocRotScale(Vector(position), Quaternion((w, x, y, z)), Vector(scale))
+
+
+def collectAssetNodes(nodes, parentMatrix, result):
+    # Flattens the node tree into (node, world matrix) pairs for nodes that
+    # become objects: the ones with an asset, and entity leaves without one
+    for node in nodes:
+        world = parentMatrix @ getNodeMatrix(node)
+        userData = node.get("userData", {})
+        if node.get("asset"):
+            result.append((node, world))
+        elif userData.get("entityId") is not None and len(node.get("children", [])) == 0:
+            result.append((node, world))
+        collectAssetNodes(node.get("children", []), world, result)
+    return result
+
+
+def importAssetMesh(path):
+    obj = AssetLibrary.importJoinedModel(path)
+    if obj is None:
+        return None
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    return mesh
+
+
+def loadSceneBundle(path, collection_name="Products"):
+    bundleDir = SceneBundleExport.openBundle(path)
+    sceneFile = SceneBundleExport.findSceneFile(bundleDir)
+    if sceneFile is None:
+        raise ValueError("No scene json found in bundle: " + path)
+
+    with open(sceneFile) as json_file:
+        sceneJSON = json.load(json_file)
+
+    # Asset paths are relative to the scene json
+    sceneDir = os.path.dirname(sceneFile)
+    placed = collectAssetNodes(sceneJSON["nodes"], Matrix.Identity(4), [])
+
+    # Importing every unique asset once
+    meshes = {}
+    for node, world in placed:
+        asset = node.get("asset")
+        if asset and asset not in meshes:
+            assetPath = SceneBundleExport.getAssetPath(sceneDir, asset)
+            if assetPath is None:
+                print("Asset missing from bundle:", asset)
+                meshes[asset] = None
+                continue
+            print("Importing bundle asset:", asset)
+            meshes[asset] = importAssetMesh(assetPath)
+
+    toBlender = THREE_TO_BLENDER
+    fromBlender = THREE_TO_BLENDER.inverted()
+
+    count = 0
+    for node, world in placed:
+        asset = node.get("asset")
+        if asset and meshes.get(asset) is None:
+            continue
+
+        name = node.get("name") or "product"
+        if asset:
+            # All nodes with the same asset share its mesh
+            obj = bpy.data.objects.new(name, meshes[asset])
+        else:
+            obj = bpy.data.objects.new(name, None)
+            obj.empty_display_type = 'PLAIN_AXES'
+
+        obj.matrix_world = toBlender @ world @ fromBlender
+
+        userData = node.get("userData", {})
+        if userData.get("entityId") is not None:
+            obj["vpcEntityId"] = userData["entityId"]
+        if userData.get("catalogRef") is not None:
+            obj["vpcRef"] = userData["catalogRef"]
+
+        RoomBuilder2025.moveToCollection(obj, collection_name)
+        count += 1
+
+    return count
+
+
+class LoadSceneBundleOperator(Operator):
+    "Load an exported scene bundle (scene json + models folder, or zip) without DEXF or catalog lookups"
+    bl_idname = "object.rex_load_scene_bundle_operator"
+    bl_label = "Load Scene Bundle"
+
+    def execute(self, context):
+        bundlePath = bpy.path.abspath(context.scene.rexTool.sceneBundlePath)
+        if not bundlePath or not os.path.exists(bundlePath):
+            self.report({'ERROR'}, "Scene bundle path is not set or does not exist.")
+            return {'CANCELLED'}
+
+        count = loadSceneBundle(bundlePath)
+
+        self.report({'INFO'}, f"Loaded {count} objects from scene bundle")
+        return {'FINISHED'}
@@ -0,0 +1,184 @@
+# Uniform grid over the entity positions, for loading only part of a configuration.
+#
+# Entities are indexed by their world bounds in Blender space (meters, Z-up), the
+# same position the loader places them at. Without a catalog size an entity is a
+# cube of DEFAULT_ENTITY_SIZE around its position.
+#
+# Doesn't need bpy.
+
+import math
+
+from . import CatalogUtils
+from . import RoomTopology
+
+DEFAULT_CELL_SIZE = 1.0
+DEFAULT_ENTITY_SIZE = 0.5
+
+
+def getEntityPosition(entity):
+    wt = entity["worldTransform"]
+    return (wt["x"], wt["z"], wt["y"])
+
+
+def getEntityRotationMatrix(entity):
+    # Same quaternion the loader gives the object
+    wt = entity["worldTransform"]
+    w, x, y, z = wt["qw"], wt["qx"], -wt["qz"], wt["qy"]
+    return (
+        (1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)),
+        (2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)),
+        (2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)),
+    )
+
+
+def getEntityBounds(entity, catalogProduct=None):
+    position = getEntityPosition(entity)
+
+    size = None
+    if catalogProduct is not None:
+        size = CatalogUtils.getProductSize(catalogProduct)
+    if size is None:
+        size = (DEFAULT_ENTITY_SIZE, DEFAULT_ENTITY_SIZE, DEFAULT_ENTITY_SIZE)
+
+    # Axis aligned extent of the rotated box
+    rotation = getEntityRotationMatrix(entity)
+    half = [sum(abs(rotation[i][j]) * size[j] / 2 for j in range(3)) for i in range(3)]
+
+    low = tuple(position[i] - half[i] for i in range(3))
+    high = tuple(position[i] + half[i] for i in range(3))
+    return low, high
+
+
+def getCell(point, cellSize):
+    return tuple(int(math.floor(point[i] / cellSize)) for i in range(3))
+
+
+def iterateCells(low, high, cellSize):
+    lowCell = getCell(low, cellSize)
+    highCell = getCell(high, cellSize)
+    for i in range(lowCell[0], highCell[0] + 1):
+        for j in range(lowCell[1], highCell[1] + 1):
+            for k in range(lowCell[2], highCell[2] + 1):
+                yield (i, j, k)
+
+
+def buildIndex(hashedEntities, hashedCatalogProducts=None, cellSize=DEFAULT_CELL_SIZE):
+    # Indexes every entity with a product ref
+    index = {
+        "cellSize": cellSize,
+        "cells": {},        # (i, j, k) -> [entity id]
+        "bounds": {},       # entity id -> (low, high)
+    }
+
+    for entityId, entity in hashedEntities.items():
+        if entity["ref"] == "noValue":
+            continue
+
+        catalogProduct = None
+        if hashedCatalogProducts is not None:
+            catalogProduct = hashedCatalogProducts.get(entity["ref"])
+
+        low, high = getEntityBounds(entity, catalogProduct)
+        index["bounds"][entityId] = (low, high)
+        for cell in iterateCells(low, high, cellSize):
+            index["cells"].setdefault(cell, []).append(entityId)
+
+    return index
+
+
+def boundsOverlap(lowA, highA, lowB, highB):
+    return all(lowA[i] <= highB[i] and lowB[i] <= highA[i] for i in range(3))
+
+
+def getCandidates(index, low, high):
+    candidates = set()
+    for cell in iterateCells(low, high, index["cellSize"]):
+        candidates.update(index["cells"].get(cell, ()))
+    return candidates
+
+
+def queryBox(index, low, high):
+    # Ids of the entities whose bounds overlap the box
+    result = set()
+    for entityId in getCandidates(index, low, high):
+        entityLow, entityHigh = index["bounds"][entityId]
+        if boundsOverlap(entityLow, entityHigh, low, high):
+            result.add(entityId)
+    return result
+
+
+def getSurfaceRegion(topology, surfaceId, margin=1.0):
+    # Box around a room surface reaching margin meters into the room. Floors and
+    # ceilings reach the whole room height since everything stands on them.
+    if surfaceId not in topology["surfaceIndex"]:
+        return None
+
+    surfaceIndex = topology["surfaceIndex"][surfaceId]
+    low, high = RoomTopology.getSurfaceBounds(topology, surfaceIndex)
+    low = [value - margin for value in low]
+    high = [value + margin for value in high]
+
+    if topology["surfaces"][surfaceIndex]["kind"] in ("floor", "ceiling"):
+        roomLow, roomHigh = RoomTopology.getRoomBounds(topology)
+        low[2] = min(low[2], roomLow[2])
+        high[2] = max(high[2], roomHigh[2])
+
+    return tuple(low), tuple(high)
+
+
+def querySurface(index, topology, surfaceId, margin=1.0):
+    region = getSurfaceRegion(topology, surfaceId, margin)
+    if region is None:
+        print("Surface not found in configuration:", surfaceId)
+        return set()
+    return queryBox(index, *region)
+
+
+def subtract(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+
+def cross(a, b):
+    return (a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0])
+
+
+def dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+
+def getFrustumPlanes(apex, corners, far):
+    # Planes (normal, d) of a pyramid from the camera position through the four
+    # far corners (in order around the frame), normals pointing inside.
+    center = tuple(sum(c[i] for c in corners) / 4 for i in range(3))
+
+    planes = []
+    for i in range(4):
+        normal = cross(subtract(corners[i], apex), subtract(corners[(i + 1) % 4], apex))
+        if dot(normal, subtract(center, apex)) < 0:
+            normal = (-normal[0], -normal[1], -normal[2])
+        planes.append((normal, -dot(normal, apex)))
+
+    # Far plane through the corners
+    forward = subtract(center, apex)
+    length = math.sqrt(dot(forward, forward)) or 1
+    forward = tuple(f / length for f in forward)
+    planes.append(((-forward[0], -forward[1], -forward[2]), dot(forward, apex) + far))
+
+    return planes
+
+
+def boxInFrustum(low, high, planes):
+    # Conservative: only rejects boxes fully outside one plane
+    for normal, d in planes:
+        farthest = tuple(high[i] if normal[i] >= 0 else low[i] for i in range(3))
+        if dot(normal, farthest) + d < 0:
+            return False
+    return True
+
+
+def queryFrustum(index, planes):
+    result = set()
+    for entityId, (low, high) in index["bounds"].items():
+        if boxInFrustum(low, high, planes):
+            result.add(entityId)
+    return result
@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+import bpy
+import numpy as np
+
+from . import ModelCache
+
+# Formats written back as themselves, everything else is stored as PNG
+KEPT_FORMATS = {"PNG": ".png", "JPEG": ".jpg"}
+
+
+def getImageHash(image):
+    # Content hash of the image, stored on it so every image is only hashed once
+    if "vpcImageHash" in image:
+        return image["vpcImageHash"]
+
+    h = hashlib.sha1()
+    if image.packed_file is not None:
+        # glTF imports pack the embedded images, hashing the encoded bytes is enough
+        h.update(image.packed_file.data)
+    elif image.filepath and os.path.exists(bpy.path.abspath(image.filepath)):
+        with open(bpy.path.abspath(image.filepath), 'rb') as file:
+            h.update(file.read())
+    elif image.has_data:
+        pixels = np.empty(len(image.pixels), dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        h.update(str(tuple(image.size)).encode("utf-8"))
+        h.update(pixels.tobytes())
+    else:
+        return None
+
+    image["vpcImageHash"] = h.hexdigest()
+    return image["vpcImageHash"]
+
+
+def replaceImage(old, new):
+    old.user_remap(new)
+    bpy.data.images.remove(old)
+
+
+def dedupImages():
+    # Points every user of an identical image to one copy. Returns the number removed.
+    kept = {}
+    removed = 0
+    for image in sorted(bpy.data.images, key=lambda i: i.name):
+        if image.type != 'IMAGE' or image.library is not None:
+            continue
+        imageHash = getImageHash(image)
+        if imageHash is None:
+            continue
+
+        if imageHash not in kept:
+            kept[imageHash] = image
+            continue
+
+        replaceImage(image, kept[imageHash])
+        removed += 1
+
+    return removed
+
+
+def getResizedPath(imageHash, maxSize, file_format):
+    ext = KEPT_FORMATS.get(file_format, ".png")
+    return os.path.join(ModelCache.getCacheDir("textures"), "%s-%d%s" % (imageHash, maxSize, ext))
+
+
+def getResizedSize(size, maxSize):
+    width, height = size
+    scale = maxSize / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def resizeImage(image, maxSize):
+    # Returns the resized replacement for the image, loaded from the cache when possible
+    imageHash = getImageHash(image)
+    file_format = image.file_format if image.file_format in KEPT_FORMATS else "PNG"
+    path = getResizedPath(imageHash, maxSize, file_format)
+
+    if os.path.exists(path):
+        resized = bpy.data.images.load(path)
+        resized.colorspace_settings.name = image.colorspace_settings.name
+        resized.alpha_mode = image.alpha_mode
+    else:
+        resized = image.copy()
+        resized.scale(*getResizedSize(image.size, maxSize))
+        resized.filepath_raw = path
+        resized.file_format = file_format
+        resized.save()
+
+    # Packing so the scene doesn't depend on the cache folder (build cache, saved files)
+    resized.pack()
+    resized.name = image.name + "-%d" % maxSize
+    resized["vpcImageHash"] = imageHash
+    resized["vpcMaxSize"] = maxSize
+    return resized
+
+
+def capImageSizes(maxSize):
+    # Replaces every image larger than maxSize pixels on its longest side. Returns the number resized.
+    if maxSize <= 0:
+        return 0
+
+    resizedCount = 0
+    for image in list(bpy.data.images):
+        if image.type != 'IMAGE' or image.library is not None:
+            continue
+        if image.get("vpcMaxSize", 0) == maxSize or max(image.size) <= maxSize:
+            continue
+        if getImageHash(image) is None:
+            continue
+
+        replaceImage(image, resizeImage(image, maxSize))
+        resizedCount += 1
+
+    return resizedCount
+
+
+def processImages(maxTextureSize=0):
+    removed = dedupImages()
+    resized = capImageSizes(maxTextureSize)
+    print("Textures: removed", removed, "duplicates, resized", resized, "images")
+    return removed, resized
@@ -0,0 +1,302 @@
+# Batch thumbnails for catalog products.
+#
+# Every product with a modelURI is imported with its modelTransform applied,
+# framed from its bounds and rendered with few samples. Renders are cached by
+# (model url, model transform, render settings), so a rerun only renders new or
+# changed products, and copied to <out>/<product id>.png.
+#
+# From plain Python it drives sharded Blender processes, each gets its product ids
+# in a json file:
+#   python -m vpcloader.ThumbnailRenderer --catalog catalog.json --out thumbs --workers 4 --blender /path/to/blender
+# Inside Blender it renders the given ids, or everything that isn't cached:
+#   blender -b --python-expr "import sys; from vpcloader import ThumbnailRenderer; sys.exit(ThumbnailRenderer.main())" \
+#       -- --catalog catalog.json --out thumbs [--ids shard.json]
+
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import bpy
+    from mathutils import Vector
+except ImportError:
+    bpy = None
+
+from . import CatalogUtils
+from . import ModelCache
+
+if bpy is not None:
+    from . import AssetLibrary
+
+# Bump when the framing or lighting changes, invalidates every cached render
+RENDERER_VERSION = 1
+
+DEFAULT_SETTINGS = {
+    "resolution": 256,
+    "samples": 16,
+    "engine": "CYCLES",
+    "padding": 1.15,
+    "transparent": True,
+}
+
+# Camera looks at the product from front right, a bit above
+VIEW_DIRECTION = (0.6, -1.0, 0.5)
+
+CAMERA_NAME = "thumbnail-camera"
+LIGHT_NAME = "thumbnail-light"
+
+
+def getThumbnailKey(catalogProduct, settings):
+    return ModelCache.hashKey(
+        CatalogUtils.get3DModelPath(catalogProduct),
+        json.dumps(CatalogUtils.getModelTransformComponentData(catalogProduct), sort_keys=True),
+        json.dumps(settings, sort_keys=True),
+        RENDERER_VERSION,
+    )
+
+
+def getCachedThumbnailPath(catalogProduct, settings):
+    return os.path.join(ModelCache.getCacheDir("thumbnails"), getThumbnailKey(catalogProduct, settings) + ".png")
+
+
+def getOutputPath(outDir, productId):
+    return os.path.join(outDir, re.sub(r'[^a-zA-Z0-9._-]+', '_', productId) + ".png")
+
+
+def getProductIds(hashedCatalogProducts):
+    return sorted(productId for productId, product in hashedCatalogProducts.items() if CatalogUtils.has3DModel(product))
+
+
+def getPendingProductIds(hashedCatalogProducts, settings):
+    return [productId for productId in getProductIds(hashedCatalogProducts)
+            if not os.path.exists(getCachedThumbnailPath(hashedCatalogProducts[productId], settings))]
+
+
+def copyThumbnail(catalogProduct, productId, settings, outDir):
+    cachedPath = getCachedThumbnailPath(catalogProduct, settings)
+    if not os.path.exists(cachedPath):
+        return False
+    shutil.copyfile(cachedPath, getOutputPath(outDir, productId))
+    return True
+
+
+def clearScene(scene):
+    # blender -b starts from the startup file, its cube and light would be in every thumbnail
+    others = [obj for obj in scene.objects if obj.name not in (CAMERA_NAME, LIGHT_NAME)]
+    bpy.data.batch_remove(others)
+    bpy.data.orphans_purge(do_recursive=True)
+
+
+def checkRenderable(scene, expected):
+    renderable = set(obj for obj in scene.objects if not obj.hide_render and obj.type != 'CAMERA')
+    renderable.add(scene.camera)
+    if renderable != set(expected):
+        raise RuntimeError("Unexpected objects in the thumbnail scene: " +
+                           ", ".join(sorted(obj.name for obj in renderable - set(expected))))
+
+
+def setupScene(settings):
+    scene = bpy.context.scene
+    clearScene(scene)
+    scene.render.engine = settings["engine"]
+    scene.render.resolution_x = settings["resolution"]
+    scene.render.resolution_y = settings["resolution"]
+    scene.render.resolution_percentage = 100
+    scene.render.film_transparent = settings["transparent"]
+    scene.render.image_settings.file_format = 'PNG'
+    scene.render.image_settings.color_mode = 'RGBA'
+    # Same lights and camera for every product, only the product changes between renders
+    scene.render.use_persistent_data = True
+    if settings["engine"] == "CYCLES":
+        scene.cycles.samples = settings["samples"]
+        scene.cycles.use_denoising = True
+    else:
+        scene.eevee.taa_render_samples = settings["samples"]
+
+    camera = bpy.data.objects.get(CAMERA_NAME)
+    if camera is None:
+        camera = bpy.data.objects.new(CAMERA_NAME, bpy.data.cameras.new(CAMERA_NAME))
+        scene.collection.objects.link(camera)
+    scene.camera = camera
+
+    light = bpy.data.objects.get(LIGHT_NAME)
+    if light is None:
+        light_data = bpy.data.lights.new(LIGHT_NAME, 'SUN')
+        light_data.energy = 3.0
+        light = bpy.data.objects.new(LIGHT_NAME, light_data)
+        light.rotation_euler = (math.radians(50), 0, math.radians(30))
+        scene.collection.objects.link(light)
+
+    return camera
+
+
+def frameObject(camera, obj, padding):
+    corners = [obj.matrix_world @ Vector(corner) for corner in obj.bound_box]
+    center = sum(corners, Vector()) / len(corners)
+    radius = max((corner - center).length for corner in corners) or 0.1
+
+    direction = Vector(VIEW_DIRECTION).normalized()
+    distance = radius * padding / math.sin(camera.data.angle / 2)
+
+    camera.location = center + direction * distance
+    camera.rotation_mode = 'QUATERNION'
+    camera.rotation_quaternion = (-direction).to_track_quat('-Z', 'Y')
+    camera.data.clip_start = max(0.001, distance - radius * 2)
+    camera.data.clip_end = distance + radius * 2
+
+
+def renderProduct(productId, catalogProduct, settings, camera):
+    cachedPath = getCachedThumbnailPath(catalogProduct, settings)
+
+    materialsBefore = set(bpy.data.materials)
+    imagesBefore = set(bpy.data.images)
+
+    obj = AssetLibrary.importJoinedModel(ModelCache.getLocalModelPath(CatalogUtils.get3DModelPath(catalogProduct)))
+    if obj is None:
+        print("No meshes found in model for product:", productId)
+        return False
+
+    AssetLibrary.bakeModelTransform(obj, catalogProduct)
+    frameObject(camera, obj, settings["padding"])
+
+    scene = bpy.context.scene
+    # Only the product, the camera and the sun
+    checkRenderable(scene, (obj, camera, bpy.data.objects[LIGHT_NAME]))
+    tmpPath = cachedPath[:-4] + ".part.png"
+    scene.render.filepath = tmpPath
+    bpy.ops.render.render(write_still=True)
+    os.replace(tmpPath, cachedPath)
+
+    # Only the product goes away, the scene stays set up for the next one
+    mesh = obj.data
+    bpy.data.objects.remove(obj)
+    bpy.data.meshes.remove(mesh)
+    bpy.data.batch_remove([m for m in set(bpy.data.materials) - materialsBefore if m.users == 0])
+    bpy.data.batch_remove([i for i in set(bpy.data.images) - imagesBefore if i.users == 0])
+    return True
+
+
+def renderShard(hashedCatalogProducts, outDir, productIds=None, settings=None):
+    # Renders the given products, or everything that isn't cached when productIds is None
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    os.makedirs(outDir, exist_ok=True)
+
+    cached = 0
+    if productIds is None:
+        productIds = getPendingProductIds(hashedCatalogProducts, settings)
+        for productId in getProductIds(hashedCatalogProducts):
+            if productId not in productIds and copyThumbnail(hashedCatalogProducts[productId], productId, settings, outDir):
+                cached += 1
+
+    camera = setupScene(settings)
+
+    rendered = failed = 0
+    for productId in productIds:
+        catalogProduct = hashedCatalogProducts.get(productId)
+        if catalogProduct is None:
+            print("Product not found in catalog:", productId)
+            failed += 1
+            continue
+        try:
+            if renderProduct(productId, catalogProduct, settings, camera):
+                copyThumbnail(catalogProduct, productId, settings, outDir)
+                rendered += 1
+            else:
+                failed += 1
+        except Exception as e:
+            print("Failed to render thumbnail for product:", productId, e)
+            failed += 1
+
+    print("%d rendered, %d cached, %d failed" % (rendered, cached, failed))
+    return rendered, cached, failed
+
+
+def splitShards(productIds, shardCount):
+    return [productIds[shardIndex::shardCount] for shardIndex in range(shardCount)]
+
+
+def runShards(catalogPath, outDir, shards, blenderPath, settings):
+    # Starts one background Blender per list of product ids and waits for all of them.
+    # The driver decides who renders what, so no product is left out or rendered twice.
+    packageRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = packageRoot + os.pathsep + env.get("PYTHONPATH", "")
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        processes = []
+        for shardIndex, productIds in enumerate(shards):
+            idsPath = os.path.join(tmpDir, "shard-%d.json" % shardIndex)
+            with open(idsPath, 'w') as json_file:
+                json.dump(productIds, json_file)
+
+            command = [
+                blenderPath, "-b", "--python-use-system-env", "--python-exit-code", "1", "--python-expr",
+                "import sys; from vpcloader import ThumbnailRenderer; sys.exit(ThumbnailRenderer.main())",
+                "--", "--catalog", catalogPath, "--out", outDir, "--ids", idsPath,
+                "--settings", json.dumps(settings),
+            ]
+            processes.append(subprocess.Popen(command, env=env))
+
+        return [process.wait() for process in processes]
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(description="Render cached thumbnails for catalog products")
+    parser.add_argument("--catalog", required=True, help="Path to catalog.json")
+    parser.add_argument("--out", required=True, help="Folder for the <product id>.png thumbnails")
+    parser.add_argument("--settings", default="{}", help="Render settings json, overrides the defaults")
+    parser.add_argument("--ids", default=None, help="Json list of the product ids to render (inside Blender)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Blender processes to start")
+    parser.add_argument("--blender", default="blender", help="Blender executable")
+    args = parser.parse_args(argv)
+
+    hashedCatalogProducts = CatalogUtils.loadCatalog(args.catalog)
+    settings = dict(DEFAULT_SETTINGS, **json.loads(args.settings))
+
+    if bpy is not None:
+        productIds = None
+        if args.ids:
+            with open(args.ids) as json_file:
+                productIds = json.load(json_file)
+        rendered, cached, failed = renderShard(hashedCatalogProducts, args.out, productIds, settings)
+        return 1 if failed > 0 else 0
+
+    # Driver: only start Blender for what isn't cached yet
+    os.makedirs(args.out, exist_ok=True)
+    pending = getPendingProductIds(hashedCatalogProducts, settings)
+    for productId in getProductIds(hashedCatalogProducts):
+        if productId not in pending:
+            copyThumbnail(hashedCatalogProducts[productId], productId, settings, args.out)
+
+    print(len(pending), "of", len(getProductIds(hashedCatalogProducts)), "thumbnails to render")
+    if len(pending) == 0:
+        return 0
+
+    start = time.perf_counter()
+    workers = max(1, min(args.workers, len(pending)))
+    results = runShards(os.path.abspath(args.catalog), os.path.abspath(args.out), splitShards(pending, workers),
+                        args.blender, settings)
+    print("Rendered in %.1f s" % (time.perf_counter() - start))
+
+    # Whatever the exit codes say, every pending product needs its render now
+    missing = [productId for productId in pending
+               if not copyThumbnail(hashedCatalogProducts[productId], productId, settings, args.out)]
+    if len(missing) > 0:
+        print(len(missing), "thumbnails missing:")
+        for productId in missing:
+            print("  ", productId)
+    return 0 if len(missing) == 0 and all(result == 0 for result in results) else 1
+
+
+if __name__ == "__main__" and bpy is None:
+    sys.exit(main())
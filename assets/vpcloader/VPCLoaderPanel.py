@@ -0,0 +1,347 @@
+import os
+import sys
+import bpy
+import importlib
+from bpy.props import StringProperty, PointerProperty, BoolProperty, IntProperty, EnumProperty, FloatProperty, FloatVectorProperty
+from bpy.types import Panel, PropertyGroup
+from . import RexUtils
+from . import LoadVPCOperator
+from . import CameraOperator
+from . import AssetLibrary
+from . import SceneBundleLoader
+from . import CollisionProxy
+from . import LoadSession
+from . import PlacementValidation
+
+#print("System paths", sys.path)
+
+
+class RexProperties(PropertyGroup):
+    vpcCode: StringProperty(
+        name="VPC Code",
+        description="Put VPC code here",
+        default="VVPNLJ",
+        maxlen=1024,
+    )
+
+    vpcFile: StringProperty(
+        name="VPC file",
+        description="Saved VPC json, used instead of the VPC code when set",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH',
+    )
+
+    catalogPath: StringProperty(
+        name="Catalog path",
+        description="Put path here",
+        default="/Users/daniel.segertun/workspace/cbf-re-ipex-utils/packages/blender/screensaver/catalogs/merged/catalog.json",
+        maxlen=1024,
+    )
+
+    generateRoom: BoolProperty(
+        name="Generate Walls",
+        description="Enable to generate walls",
+        default=True,
+    )
+
+    generateCollisionWalls: BoolProperty(
+        name="Generate Collision Walls",
+        description="Enable to generate collision walls",
+        default=False,
+    )    
+
+    liveOpeningModifiers: BoolProperty(
+        name="Live Opening Modifiers",
+        description="Give every window and door its own Geometry Nodes modifier instead of a shared evaluated mesh",
+        default=False,
+    )
+
+    weldRoomShell: BoolProperty(
+        name="Weld Room Shell",
+        description="Build the room as one welded mesh from the shared corner topology",
+        default=False,
+    )
+
+    separateWalls: BoolProperty(
+        name="Separate Walls",
+        description="With a welded room shell, keep every surface as its own object",
+        default=False,
+    )
+
+    generateCollisionProxies: BoolProperty(
+        name="Generate Collision Proxies",
+        description="Build box proxies for the room slabs and the products in a Collision collection",
+        default=False,
+    )
+
+    convexHullProxies: BoolProperty(
+        name="Convex Hull Proxies",
+        description="Use convex hulls instead of oriented boxes for the product proxies",
+        default=False,
+    )
+
+    collisionExportPath: StringProperty(
+        name="Collision export",
+        description="Where to export the collision proxies, .json or .glb",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH',
+    )
+
+    validationReportPath: StringProperty(
+        name="Validation report",
+        description="Where to write the placement validation report json, empty only prints it",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH',
+    )
+
+    useAssetLibrary: BoolProperty(
+        name="Use Asset Library",
+        description="Load products from the pre-converted .blend asset library instead of importing glTF",
+        default=False,
+    )
+
+    linkAssetLibrary: BoolProperty(
+        name="Link Library Data",
+        description="Link product meshes from the asset library instead of appending them",
+        default=False,
+    )
+
+    assetLibraryPath: StringProperty(
+        name="Asset library path",
+        description="Folder for the .blend asset library, empty uses the local cache",
+        default="",
+        maxlen=1024,
+        subtype='DIR_PATH',
+    )
+
+    usePreprocessedModels: BoolProperty(
+        name="Use Preprocessed Models",
+        description="Flatten and pre-transform product GLBs in a process pool before importing",
+        default=False,
+    )
+
+    useInstancer: BoolProperty(
+        name="Use Instancer",
+        description="One Geometry Nodes point instancer per product instead of one object per entity",
+        default=False,
+    )
+
+    deferredSceneBuild: BoolProperty(
+        name="Deferred Scene Build",
+        description="Create the scene through the data API with one view layer update at the end, instead of operators",
+        default=False,
+    )
+
+    maxProductTriangles: IntProperty(
+        name="Max Product Triangles",
+        description="Decimate products above this many triangles, 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    maxSceneTriangles: IntProperty(
+        name="Max Scene Triangles",
+        description="Decimate all products evenly to keep the scene under this many triangles, 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    dedupTextures: BoolProperty(
+        name="Dedup Textures",
+        description="Share identical images between imported products after loading",
+        default=False,
+    )
+
+    maxTextureSize: IntProperty(
+        name="Max Texture Size",
+        description="With Dedup Textures, downscale images larger than this on the longest side, 0 for no limit",
+        default=0,
+        min=0,
+    )
+
+    clearPreviousLoad: BoolProperty(
+        name="Clear Previous Load",
+        description="Remove everything the previous load created before loading again",
+        default=False,
+    )
+
+    regionMode: EnumProperty(
+        name="Region",
+        description="Which products to load, the rest become placeholders",
+        items=[
+            ('ALL', "All", "Load every product"),
+            ('BOX', "Box", "Products overlapping the region box"),
+            ('SURFACE', "Surface", "Products near a room surface"),
+            ('CAMERA', "Camera", "Products in the view of the scene camera"),
+        ],
+        default='ALL',
+    )
+
+    regionMin: FloatVectorProperty(
+        name="Region min",
+        subtype='TRANSLATION',
+        default=(-1.0, -1.0, 0.0),
+    )
+
+    regionMax: FloatVectorProperty(
+        name="Region max",
+        subtype='TRANSLATION',
+        default=(1.0, 1.0, 3.0),
+    )
+
+    regionSurfaceId: StringProperty(
+        name="Surface id",
+        description="kv-id of the room surface, e.g. x+ or floor",
+        default="floor",
+        maxlen=1024,
+    )
+
+    regionMargin: FloatProperty(
+        name="Region margin",
+        description="How far from the surface products are still loaded",
+        default=1.0,
+        min=0.0,
+    )
+
+    useBuildCache: BoolProperty(
+        name="Use Build Cache",
+        description="Link an earlier build of the same configuration instead of rebuilding it",
+        default=False,
+    )
+
+    sceneBundlePath: StringProperty(
+        name="Scene bundle",
+        description="Exported scene bundle, a folder with scene json and models/ or a zip",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH',
+    )
+
+    renderOutputPath: StringProperty(
+        name="Render output",
+        description="Folder for the camera renders and the timing manifest",
+        default="",
+        maxlen=1024,
+        subtype='DIR_PATH',
+    )
+
+    renderOverridesPath: StringProperty(
+        name="Render overrides",
+        description="Optional json with per camera resolution_x, resolution_y and samples",
+        default="",
+        maxlen=1024,
+        subtype='FILE_PATH',
+    )
+
+class VPCLoaderPanel(Panel):
+    bl_label = "VPCLoader Panel"
+    bl_idname = "VIEW3D_PT_vpc_loader"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = "VPCLoader"
+
+    def draw(self, context):
+        layout = self.layout
+        scene = context.scene
+        mytool = scene.rexTool
+
+        layout.prop(mytool, "vpcCode")
+        layout.prop(mytool, "vpcFile")
+        layout.prop(mytool, "catalogPath")
+        layout.prop(mytool, "generateRoom")
+        layout.prop(mytool, "generateCollisionWalls")
+        layout.prop(mytool, "liveOpeningModifiers")
+        layout.prop(mytool, "weldRoomShell")
+        layout.prop(mytool, "separateWalls")
+        layout.prop(mytool, "generateCollisionProxies")
+        layout.prop(mytool, "convexHullProxies")
+        layout.prop(mytool, "useAssetLibrary")
+        layout.prop(mytool, "linkAssetLibrary")
+        layout.prop(mytool, "assetLibraryPath")
+        layout.prop(mytool, "usePreprocessedModels")
+        layout.prop(mytool, "useInstancer")
+        layout.prop(mytool, "deferredSceneBuild")
+        layout.prop(mytool, "maxProductTriangles")
+        layout.prop(mytool, "maxSceneTriangles")
+        layout.prop(mytool, "dedupTextures")
+        layout.prop(mytool, "maxTextureSize")
+        layout.prop(mytool, "useBuildCache")
+        layout.prop(mytool, "clearPreviousLoad")
+        layout.prop(mytool, "regionMode")
+        if mytool.regionMode == 'BOX':
+            layout.prop(mytool, "regionMin")
+            layout.prop(mytool, "regionMax")
+        elif mytool.regionMode == 'SURFACE':
+            layout.prop(mytool, "regionSurfaceId")
+            layout.prop(mytool, "regionMargin")
+        layout.operator("object.rex_load_vpc_operator")
+        layout.operator("object.rex_fill_placeholders_operator")
+        layout.operator("object.rex_clear_load_operator")
+        layout.operator("object.rex_build_asset_library_operator")
+        layout.separator()
+        layout.prop(mytool, "sceneBundlePath")
+        layout.operator("object.rex_load_scene_bundle_operator")
+        layout.separator()
+        layout.prop(mytool, "collisionExportPath")
+        layout.operator("object.rex_export_collision_proxies_operator")
+        layout.separator()
+        layout.prop(mytool, "validationReportPath")
+        layout.operator("object.rex_validate_placement_operator")
+        layout.separator()
+        layout.label(text="Cameras", icon='MODIFIER')
+        layout.operator("object.rex_camera_operator")
+        layout.prop(mytool, "renderOutputPath")
+        layout.prop(mytool, "renderOverridesPath")
+        layout.operator("object.rex_render_queue_operator")
+        
+        layout.separator()
+
+        layout.label(text="Modify selected", icon='MODIFIER')
+        layout.operator("object.ipex_center_operator")
+        layout.operator("object.ipex_mirrorx_operator")
+        layout.operator("object.ipex_rotate90x_operator")
+        layout.operator("object.ipex_rotate90y_operator")
+        layout.operator("object.ipex_rotate90z_operator")
+
+
+
+classes = (
+    RexProperties,
+    VPCLoaderPanel,
+    RexUtils.MirrorXOperator,
+    RexUtils.RecenterOperator,
+    RexUtils.Rotate90XOperator,
+    RexUtils.Rotate90YOperator,
+    RexUtils.Rotate90ZOperator,
+    LoadVPCOperator.LoadVPCOperator,
+    LoadVPCOperator.FillPlaceholdersOperator,
+    CameraOperator.CameraOperator,
+    CameraOperator.RenderQueueOperator,
+    AssetLibrary.BuildAssetLibraryOperator,
+    SceneBundleLoader.LoadSceneBundleOperator,
+    CollisionProxy.ExportCollisionProxiesOperator,
+    LoadSession.ClearLoadOperator,
+    PlacementValidation.ValidatePlacementOperator,
+)
+
+
+def register():
+    print("Registering VPCLoader addon...")
+
+    from bpy.utils import register_class
+
+    for cls in classes:
+        register_class(cls)
+
+    bpy.types.Scene.rexTool = PointerProperty(type=RexProperties)
+
+
+def unregister():
+    from bpy.utils import unregister_class
+    for cls in reversed(classes):
+        unregister_class(cls)
+
+    del bpy.types.Scene.rexTool
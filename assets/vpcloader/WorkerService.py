@@ -0,0 +1,223 @@
+# Long-lived Blender worker that builds VPC configurations on request.
+#
+# The add-on, the parsed catalogs and the asset library meshes stay in memory
+# between jobs, only the previous build is removed. Start it with the add-on
+# installed:
+#
+#   blender -b --python-expr "from vpcloader import WorkerService; WorkerService.main()" -- --port 5005
+#   blender -b --python-expr "from vpcloader import WorkerService; WorkerService.main()" -- --queue /path/to/jobs
+#
+# A job is one json object:
+#   {"id": "...", "vpcCode": "V3TMF8" or "vpcFile": "/path/vpc.json", "catalogPath": "...",
+#    "output": "/path/out.blend", "options": {"generateRoom": true, ...}}
+# Options are RexProperties names, set for that job only. Over the socket every job is one line and every
+# status update comes back as one json line. In queue mode a job is a .json file
+# in the queue folder, status lines go to <job>.log and the last one to <job>.result.json.
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import traceback
+
+import bpy
+
+from . import LoadSession
+from . import ModelCache
+
+DEFAULT_PORT = 5005
+QUEUE_POLL_INTERVAL = 0.5
+
+
+def ensureRegistered():
+    if not hasattr(bpy.types.Scene, "rexTool"):
+        from .VPCLoaderPanel import register
+        register()
+
+
+def getOptionNames():
+    from .VPCLoaderPanel import RexProperties
+    return set(RexProperties.__annotations__.keys())
+
+
+def getOptionValues(rexTool):
+    # Copies, vector properties would otherwise change along with the scene
+    values = {}
+    for name in getOptionNames():
+        value = getattr(rexTool, name)
+        if not isinstance(value, str) and hasattr(value, "__len__"):
+            value = tuple(value)
+        values[name] = value
+    return values
+
+
+def setOptionValues(rexTool, values):
+    for name, value in values.items():
+        setattr(rexTool, name, value)
+
+
+def resetScene():
+    # Removing the previous build, library meshes and module caches stay warm
+    count, reclaimed = LoadSession.clearPrevious(bpy.context, keepLibraryData=True)
+
+    # Anything left in the scene from outside a load session
+    for name in ("Products", "Room", "BooleanCollection", "Collision", "Placeholders", "Prototypes"):
+        collection = bpy.data.collections.get(name)
+        if collection is not None:
+            bpy.data.batch_remove(list(collection.objects) + [collection])
+
+    return count, reclaimed
+
+
+def runJob(job, emit):
+    jobId = job.get("id", "")
+    timings = {}
+    start = time.perf_counter()
+
+    emit({"id": jobId, "status": "started"})
+
+    t = time.perf_counter()
+    count, reclaimed = resetScene()
+    timings["reset"] = time.perf_counter() - t
+
+    rexTool = bpy.context.scene.rexTool
+    optionNames = getOptionNames()
+    options = job.get("options", {})
+    for key in options:
+        if key not in optionNames:
+            raise ValueError("Unknown option: " + key)
+
+    # A job's options only apply to that job, the next one starts from the same settings
+    previous = getOptionValues(rexTool)
+    try:
+        setOptionValues(rexTool, options)
+        rexTool.vpcCode = job.get("vpcCode", "")
+        rexTool.vpcFile = job.get("vpcFile", "")
+        rexTool.catalogPath = job.get("catalogPath", rexTool.catalogPath)
+        # The worker resets the scene itself
+        rexTool.clearPreviousLoad = False
+
+        t = time.perf_counter()
+        result = bpy.ops.object.rex_load_vpc_operator()
+        timings["build"] = time.perf_counter() - t
+        if 'FINISHED' not in result:
+            raise RuntimeError("Load VPC failed: " + str(result))
+
+        emit({"id": jobId, "status": "built", "timings": dict(timings)})
+
+        # Saved with the job's options
+        output = job.get("output", "")
+        if output:
+            t = time.perf_counter()
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            bpy.ops.wm.save_as_mainfile(filepath=output, copy=True)
+            timings["save"] = time.perf_counter() - t
+    finally:
+        setOptionValues(rexTool, previous)
+
+    timings["total"] = time.perf_counter() - start
+    return {"id": jobId, "status": "done", "output": output, "timings": timings,
+            "reclaimedBytes": reclaimed, "removedDatablocks": count}
+
+
+def handleJob(job, emit):
+    try:
+        emit(runJob(job, emit))
+    except Exception as e:
+        traceback.print_exc()
+        emit({"id": job.get("id", ""), "status": "failed", "error": str(e)})
+
+
+def serveSocket(port=DEFAULT_PORT, host="127.0.0.1"):
+    # One client at a time, bpy can only build one scene at once anyway
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((host, port))
+    server.listen(1)
+    print("VPC worker listening on", host, port)
+
+    while True:
+        connection, address = server.accept()
+        with connection, connection.makefile('rw', encoding="utf-8") as stream:
+            def emit(message):
+                stream.write(json.dumps(message) + "\n")
+                stream.flush()
+
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                if line == "quit":
+                    server.close()
+                    return
+                try:
+                    job = json.loads(line)
+                except ValueError as e:
+                    emit({"status": "failed", "error": "Invalid job: " + str(e)})
+                    continue
+                handleJob(job, emit)
+
+
+def serveQueue(queueDir, once=False):
+    # Jobs are claimed by renaming them, so several workers can share a folder
+    os.makedirs(queueDir, exist_ok=True)
+    print("VPC worker watching", queueDir)
+
+    while True:
+        jobFiles = sorted(name for name in os.listdir(queueDir) if name.endswith(".json")
+                          and not name.endswith(".result.json"))
+
+        for name in jobFiles:
+            base = os.path.join(queueDir, name[:-len(".json")])
+            claimedPath = base + ".%d.running" % os.getpid()
+            try:
+                os.rename(os.path.join(queueDir, name), claimedPath)
+            except OSError:
+                # Another worker got it first
+                continue
+
+            with open(base + ".log", 'a') as log:
+                def emit(message):
+                    log.write(json.dumps(message) + "\n")
+                    log.flush()
+                    if message["status"] in ("done", "failed"):
+                        with open(base + ".result.json.part", 'w') as result_file:
+                            json.dump(message, result_file)
+                        os.replace(base + ".result.json.part", base + ".result.json")
+
+                try:
+                    with open(claimedPath) as job_file:
+                        job = json.load(job_file)
+                except ValueError as e:
+                    emit({"status": "failed", "error": "Invalid job: " + str(e)})
+                else:
+                    job.setdefault("id", os.path.basename(base))
+                    handleJob(job, emit)
+
+            os.replace(claimedPath, base + ".done")
+
+        if once:
+            return
+        time.sleep(QUEUE_POLL_INTERVAL)
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+
+    parser = argparse.ArgumentParser(description="Warm Blender worker for VPC builds")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Local port to listen on")
+    parser.add_argument("--queue", default=None, help="Job folder to watch instead of listening on a port")
+    parser.add_argument("--once", action="store_true", help="With --queue, process the current jobs and exit")
+    args = parser.parse_args(argv)
+
+    ensureRegistered()
+    print("Cache folder:", ModelCache.CACHE_ROOT)
+
+    if args.queue:
+        serveQueue(args.queue, args.once)
+    else:
+        serveSocket(args.port)
+    return 0